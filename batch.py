@@ -0,0 +1,18 @@
+import argparse
+
+import constants
+from reports.report_config import ReportConfig
+from reports.scenarios import create_scenario_configs, load_scenarios, run_scenarios
+
+parser = argparse.ArgumentParser(description='Create the reports of every scenario of a scenario file from one read of the positions file.')
+parser.add_argument('--pl', type=str, help='File name of the positions to process')
+parser.add_argument('--scenarios', type=str, required=True, help='YAML/JSON file with the list of scenario settings')
+parser.add_argument('--no_cache', action='store_true', help='Always parse the positions file instead of reading its cached copy')
+parser.add_argument('--workers', type=int, default=1, help='Number of scenario groups to run in parallel')
+
+args = parser.parse_args()
+
+positions_cache_dir = None if args.no_cache else constants.positions_cache_dir
+scenario_configs = create_scenario_configs(load_scenarios(args.scenarios), ReportConfig(positions_cache_dir=positions_cache_dir))
+
+run_scenarios(constants.get_positions_file_name(args.pl), scenario_configs, workers=max(args.workers, 1), positions_cache_dir=positions_cache_dir)
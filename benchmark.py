@@ -0,0 +1,48 @@
+import argparse
+import json
+import os
+import tempfile
+
+from benchmarks.stage_benchmarks import calc_scaling_exponents, format_comparison_table, format_scaling_table, get_run_metadata, run_size_benchmark
+from reports.report_config import ReportConfig
+
+parser = argparse.ArgumentParser(description='Benchmark every report stage on synthetic positions of increasing sizes.')
+parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000, 10_000_000], help='Numbers of positions to benchmark')
+parser.add_argument('--pairs', type=int, default=200, help='Number of pairs the positions are spread over')
+parser.add_argument('--span_days', type=int, default=730, help='Number of days the entry times are spread over')
+parser.add_argument('--long_share', type=float, default=0.5, help='Share of long positions')
+parser.add_argument('--input_format', type=str, default='csv', choices=['csv', 'parquet', 'xlsx'], help='File type of the positions file to read')
+parser.add_argument('--workers', type=int, default=1, help='Number of processes to calculate the report metrics with')
+parser.add_argument('--no_memory', action='store_true', help="Don't trace the allocations of the stages, for slightly more accurate timings")
+parser.add_argument('--output', type=str, help='JSON file to store the results in, benchmarks/results/<commit>.json by default')
+parser.add_argument('--compare', type=str, help='JSON results of an earlier run to compare the timings with')
+
+args = parser.parse_args()
+
+results = {"metadata": get_run_metadata(), "parameters": vars(args), "results": []}
+
+for position_count in sorted(args.sizes):
+    print(f"Benchmarking {position_count:,} positions")
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        results["results"].append(run_size_benchmark(position_count, args.pairs, work_dir, input_format=args.input_format,
+                                                     config=ReportConfig(workers=max(args.workers, 1)), track_memory=not args.no_memory,
+                                                     span_days=args.span_days, long_share=args.long_share))
+
+results["scaling_exponents"] = calc_scaling_exponents(results["results"])
+
+output_file = args.output if args.output else f"benchmarks/results/{results['metadata']['commit'] or 'latest'}.json"
+os.makedirs(os.path.dirname(output_file) or ".", exist_ok=True)
+with open(output_file, "w") as file:
+    json.dump(results, file, indent=2)
+
+print()
+print(format_scaling_table(results["results"], results["scaling_exponents"]))
+
+if args.compare:
+    with open(args.compare) as file:
+        print()
+        print(format_comparison_table(json.load(file), results))
+
+print()
+print('Results written to', output_file)
@@ -0,0 +1,201 @@
+import os
+import platform
+import subprocess
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic_positions import generate_positions
+from reports.gp_report import Report
+from reports.instrumentation import calc_max_rss_mb
+from reports.positions_io import load_positions
+from reports.report_config import ReportConfig
+
+# The largest sheet Excel can hold, including the header row
+excel_max_rows = 1_048_575
+
+# The stages in the order they run, the names used in the results
+stage_names = ["ingestion", "ingestion_cached", "prepare", "base_report", "ranking_stability", "final_report", "monthly_report", "combined_report",
+               "excel_output"]
+
+
+def measure_stage(function, track_memory: bool = True) -> (object, dict):
+    """
+    Run function once and measure it.
+
+    Args:
+        function: The stage, called without arguments.
+        track_memory (bool): Whether to trace the Python and numpy allocations of the stage, which slows it down somewhat.
+
+    Returns:
+        (object, dict): The result of function, and its wall and CPU time, the peak memory traced during it and the peak RSS of the process after it.
+    """
+    if track_memory:
+        tracemalloc.start()
+
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    result = function()
+    cpu_seconds = time.process_time() - cpu_start
+    wall_seconds = time.perf_counter() - wall_start
+
+    peak_traced_mb = None
+    if track_memory:
+        peak_traced_mb = tracemalloc.get_traced_memory()[1] / 1024 ** 2
+        tracemalloc.stop()
+
+    return result, {"wall_seconds": wall_seconds, "cpu_seconds": cpu_seconds, "peak_traced_mb": peak_traced_mb, "max_rss_mb": calc_max_rss_mb()}
+
+
+def write_positions_file(positions_df: pd.DataFrame, file_path: str):
+    extension = os.path.splitext(file_path)[1].lower()
+
+    if extension == ".xlsx":
+        if len(positions_df) > excel_max_rows:
+            raise ValueError(f"{len(positions_df)} positions don't fit in an Excel sheet, use a CSV or Parquet input file instead")
+        positions_df.to_excel(file_path, index=False)
+    elif extension == ".csv":
+        positions_df.to_csv(file_path, index=False)
+    elif extension == ".parquet":
+        positions_df.to_parquet(file_path, index=False)
+    else:
+        raise ValueError(f"Unsupported positions file type: {file_path}")
+
+
+def run_size_benchmark(position_count: int, pair_count: int, work_dir: str, input_format: str = "csv", config: ReportConfig | None = None,
+                       track_memory: bool = True, seed: int | None = 0, **generator_kwargs) -> dict:
+    """
+    Benchmark every stage of a report run on a synthetic positions file of the given size. The file is written to work_dir first, which isn't measured,
+    then read without and with the positions cache, after which the reports are created one at a time and written to Excel.
+
+    Args:
+        position_count (int): The number of positions, spread evenly over the pairs.
+        pair_count (int): The number of pairs.
+        work_dir (str): The folder for the positions file, its cache and the report outputs.
+        input_format (str): The extension of the positions file, csv, parquet or xlsx.
+        config (ReportConfig | None): The report settings. The output folder and cache folder are replaced with ones in work_dir.
+        track_memory (bool): Whether to trace the allocations of every stage, see measure_stage.
+        seed (int | None): The seed of the positions generator.
+        **generator_kwargs: Other arguments of generate_positions, e.g. span_days, long_share or status_mix.
+
+    Returns:
+        dict: The size of the run and the measurements of every stage, by stage name.
+    """
+    config = (config if config is not None else ReportConfig()).updated({"output_dir": os.path.join(work_dir, "outputs"),
+                                                                        "positions_cache_dir": os.path.join(work_dir, "cache")})
+
+    positions_df = generate_positions(pair_count=pair_count, positions_per_pair=max(position_count // pair_count, 1), seed=seed, **generator_kwargs)
+    positions_file = os.path.join(work_dir, f"positions_{len(positions_df)}.{input_format}")
+    write_positions_file(positions_df, positions_file)
+    del positions_df
+
+    stages = {}
+
+    # The first read parses the file and stores the cached copy, the second one reads the cached copy
+    positions_df, stages["ingestion"] = measure_stage(lambda: load_positions(positions_file, cache_dir=config.positions_cache_dir), track_memory)
+    _, stages["ingestion_cached"] = measure_stage(lambda: load_positions(positions_file, cache_dir=config.positions_cache_dir), track_memory)
+
+    report = Report(positions_file, config=config, positions_df=positions_df, create_reports=False)
+
+    # The report steps are evaluated lazily, so each stage measures the steps it's the first to need
+    _, stages["prepare"] = measure_stage(lambda: (report.positions_store, report.pair_list, report.month_coverage), track_memory)
+    _, stages["base_report"] = measure_stage(lambda: report.base_report_df, track_memory)
+    _, stages["ranking_stability"] = measure_stage(lambda: report.ranking_stability_df, track_memory)
+    _, stages["final_report"] = measure_stage(lambda: report.final_report_df, track_memory)
+    _, stages["monthly_report"] = measure_stage(lambda: report.monthly_report_df, track_memory)
+    _, stages["combined_report"] = measure_stage(lambda: report.combined_report_df, track_memory)
+    _, stages["excel_output"] = measure_stage(report.write_reports, track_memory)
+
+    # The number of rows every stage works on or produces
+    stages["ingestion"]["rows"] = stages["ingestion_cached"]["rows"] = len(positions_df)
+    stages["prepare"]["rows"] = len(report.positions_store)
+    stages["base_report"]["rows"] = len(report.base_report_df)
+    stages["ranking_stability"]["rows"] = len(report.ranking_stability_df) if report.ranking_stability_df is not None else 0
+    stages["final_report"]["rows"] = len(report.final_report_df)
+    stages["monthly_report"]["rows"] = len(report.monthly_report_df)
+    stages["combined_report"]["rows"] = stages["excel_output"]["rows"] = len(report.combined_report_df)
+
+    return {"positions": len(positions_df), "pairs": pair_count, "input_format": input_format, "stages": stages}
+
+
+def calc_scaling_exponents(size_results: list[dict]) -> dict:
+    """
+    Estimate how every stage's wall time grows with the number of positions, as the slope of a least squares line through log(time) against
+    log(positions). 1 means linear, 2 quadratic, and values near 0 mean the stage depends on something else, e.g. the number of pairs.
+
+    Args:
+        size_results (list[dict]): The results of run_size_benchmark at different sizes.
+
+    Returns:
+        dict: The exponent of every stage, None if it was measured at fewer than two sizes.
+    """
+    scaling_exponents = {}
+
+    for stage_name in stage_names:
+        measurements = [(size_result["positions"], size_result["stages"][stage_name]["wall_seconds"]) for size_result in size_results
+                        if stage_name in size_result["stages"] and size_result["stages"][stage_name]["wall_seconds"] > 0]
+
+        if len({position_count for position_count, _ in measurements}) < 2:
+            scaling_exponents[stage_name] = None
+            continue
+
+        log_sizes, log_times = np.log(np.array(measurements, dtype=float)).T
+        scaling_exponents[stage_name] = float(np.polyfit(log_sizes, log_times, 1)[0])
+
+    return scaling_exponents
+
+
+def format_scaling_table(size_results: list[dict], scaling_exponents: dict) -> str:
+    # A markdown table with the wall time of every stage at every size, and its scaling exponent
+    header = ["Stage"] + [f"{size_result['positions']:,} positions (s)" for size_result in size_results] + ["Exponent"]
+    rows = []
+
+    for stage_name in stage_names:
+        stage_times = [size_result["stages"].get(stage_name, {}).get("wall_seconds") for size_result in size_results]
+        exponent = scaling_exponents.get(stage_name)
+
+        rows.append([stage_name] + [f"{stage_time:.3f}" if stage_time is not None else "-" for stage_time in stage_times] +
+                    [f"{exponent:.2f}" if exponent is not None else "-"])
+
+    return "\n".join("| " + " | ".join(row) + " |" for row in [header, ["---"] * len(header)] + rows)
+
+
+def format_comparison_table(previous_results: dict, results: dict) -> str:
+    # A markdown table with the ratio of every stage's wall time to the one in previous_results at the same size, above 1 meaning slower
+    previous_sizes = {size_result["positions"]: size_result for size_result in previous_results["results"]}
+    compared_results = [size_result for size_result in results["results"] if size_result["positions"] in previous_sizes]
+
+    header = ["Stage"] + [f"{size_result['positions']:,} positions" for size_result in compared_results]
+    rows = []
+
+    for stage_name in stage_names:
+        ratios = []
+        for size_result in compared_results:
+            previous_stage = previous_sizes[size_result["positions"]]["stages"].get(stage_name)
+            stage = size_result["stages"].get(stage_name)
+            ratios.append(f"{stage['wall_seconds'] / previous_stage['wall_seconds']:.2f}x"
+                          if stage and previous_stage and previous_stage["wall_seconds"] > 0 else "-")
+
+        rows.append([stage_name] + ratios)
+
+    return "\n".join("| " + " | ".join(row) + " |" for row in [header, ["---"] * len(header)] + rows)
+
+
+def get_run_metadata() -> dict:
+    # Where and on which commit the benchmarks ran, so that result files can be told apart and compared
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    return {
+        "commit": commit,
+        "time": pd.Timestamp.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count()
+    }
@@ -0,0 +1,56 @@
+import numpy as np
+import pandas as pd
+
+# The share of each status among the generated positions, the open ones (ACTIVE, ENTERED) are left out of the reports
+default_status_mix = {"CLOSED": 0.75, "STOPPED": 0.21, "ACTIVE": 0.02, "ENTERED": 0.02}
+
+
+def generate_positions(pair_count: int = 100, positions_per_pair: int = 100, start: str = "2022-01-01", span_days: int = 730,
+                       long_share: float = 0.5, status_mix: dict | None = None, capital_per_trade: float = 50.0, seed: int | None = 0) -> pd.DataFrame:
+    """
+    Generate a positions sheet with the columns that Report reads, for benchmarks. Every pair gets its own profit drift and volatility, and its positions
+    are spread over a random part of the span, so that the pairs have different scores, missing months and drawdowns.
+
+    Args:
+        pair_count (int): The number of pairs.
+        positions_per_pair (int): The number of positions of every pair.
+        start (str): The earliest entry time.
+        span_days (int): The number of days the entry times are spread over.
+        long_share (float): The share of long positions, the rest are short.
+        status_mix (dict | None): The share of each status, default_status_mix if not given.
+        capital_per_trade (float): The "Capital used" of every position.
+        seed (int | None): The seed of the random generator.
+
+    Returns:
+        pd.DataFrame: pair_count * positions_per_pair positions, in random order.
+    """
+    status_mix = status_mix if status_mix is not None else default_status_mix
+    random_generator = np.random.default_rng(seed)
+    position_count = pair_count * positions_per_pair
+
+    pair_codes = np.repeat(np.arange(pair_count), positions_per_pair)
+    pair_names = np.array([f"PAIR{pair_code}USDT" for pair_code in range(pair_count)], dtype=object)
+
+    # Every pair trades in its own window of at least a quarter of the span, with entries on a 15 minute grid
+    span_minutes = span_days * 24 * 60
+    window_starts = random_generator.uniform(0, 0.75, pair_count) * span_minutes
+    window_lengths = random_generator.uniform(0.25, 1, pair_count) * (span_minutes - window_starts)
+    entry_minutes = window_starts[pair_codes] + random_generator.random(position_count) * window_lengths[pair_codes]
+    entry_times = pd.Timestamp(start) + pd.to_timedelta(entry_minutes // 15 * 15, unit="min")
+    exit_times = entry_times + pd.to_timedelta(random_generator.integers(1, 400, position_count) * 15, unit="min")
+
+    drifts = random_generator.normal(0.2, 0.5, pair_count)
+    volatilities = random_generator.uniform(1, 5, pair_count)
+    net_profits = np.round(drifts[pair_codes] + volatilities[pair_codes] * random_generator.standard_normal(position_count), 4)
+
+    positions_df = pd.DataFrame({
+        "Pair name": pair_names[pair_codes],
+        "Type": np.where(random_generator.random(position_count) < long_share, "long", "short"),
+        "Status": random_generator.choice(list(status_mix.keys()), position_count, p=np.array(list(status_mix.values())) / sum(status_mix.values())),
+        "Entry time": entry_times,
+        "Exit time": exit_times,
+        "Net profit": net_profits,
+        "Capital used": np.full(position_count, capital_per_trade)
+    })
+
+    return positions_df.iloc[random_generator.permutation(position_count)].reset_index(drop=True)
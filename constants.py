@@ -1,17 +1,9 @@
 import argparse
 import os
+import re
 
 from dotenv import dotenv_values
 
-# Set up argument parser
-parser = argparse.ArgumentParser(description='Process some integers.')
-parser.add_argument('--pl', type=str, help='File name of the positions to process')
-parser.add_argument('--position_type', type=str, help='Filter boxes by type (Short/long)')
-parser.add_argument('--output_dir', type=str, help='Set the output folder name.')
-
-# Parse arguments
-args = parser.parse_args()
-
 params = dotenv_values(".env.params")
 
 excluded_pairs = [""]
@@ -19,17 +11,107 @@ excluded_pairs = [""]
 max_final_report_pairs = 30
 capital_per_trade = 100
 
-# Set the positions file name from the argument
-positions_file_name = f'./{args.pl}' if args.pl else "./all_positions.xlsx"
-position_type = args.position_type if args.position_type else None
+# Resolution of the equity curves used for drawdowns. None builds them from the exact exit times, a fixed frequency such as "15min" samples them on a
+# grid, which reproduces the numbers of the older grid-based reports.
+equity_curve_timeframe = None
+
+# FinalReport shows the percentage of the time spent with more than this many concurrent trades
+concurrent_positions_threshold = 10
+
+# Number of weight vectors sampled around the score weights for the RankingStabilityReport, and the largest relative change of a weight. 0 samples skips
+# the report.
+weight_sweep_samples = 0
+weight_sweep_spread = 0.5
+
+# Number of resampled trade sequences of every FinalReport pair count for the RobustnessReport, and how they're resampled, "bootstrap" or "shuffle". 0
+# paths skips the report.
+monte_carlo_paths = 0
+monte_carlo_method = "bootstrap"
+
+# Length of the time buckets the DiversifiedReport's pair search merges equity curves on, None skips the report, and how much a unit of max drawdown
+# costs against a unit of net profit in its objective
+diversified_bucket = None
+diversified_drawdown_weight = 1.0
+
+# Number of most correlated neighbours of every pair in the PairCorrelationReport, 0 for all of them and None to skip the report, and the length of
+# the time buckets its exposure overlaps are measured on
+pair_correlation_top_k = None
+pair_overlap_bucket = "1h"
+
+# The train and test window lengths of the WalkForwardReport and the number of months the windows move by. 0 train months skips the report.
+walk_forward_train_months = 0
+walk_forward_test_months = 1
+walk_forward_step_months = 1
+
+# Default positions file and the folder holding the parsed copies of the positions files, so they aren't re-parsed on every run
+positions_file_name = "./all_positions.xlsx"
+positions_cache_dir = ".positions_cache"
+
+# Folder holding the per-pair state of the --incremental runs
+incremental_state_dir = ".report_state"
+
+# Address of the report service of serve.py, and the number of computed reports it keeps
+service_host = "127.0.0.1"
+service_port = 8765
+service_cache_size = 128
+
+# Folder the output folders of the reports are created in
+output_root_dir = "report_outputs"
+
+# The reports a run can create
+report_names = ("BaseReport", "RankingStabilityReport", "FinalReport", "MonthlyReport", "CombinedReport", "WalkForwardReport",
+                "RobustnessReport", "DiversifiedReport",
+                "PairCorrelationReport")
+
+# Number of report files written at the same time
+output_threads = 4
+
+
+def create_arg_parser() -> argparse.ArgumentParser:
+    # Set up argument parser
+    parser = argparse.ArgumentParser(description='Process some integers.')
+    parser.add_argument('--pl', type=str, help='File name of the positions to process')
+    parser.add_argument('--position_type', type=str, help='Filter boxes by type (Short/long)')
+    parser.add_argument('--output_dir', type=str, help='Set the output folder name.')
+    parser.add_argument('--no_cache', action='store_true', help='Always parse the positions file instead of reading its cached copy')
+    parser.add_argument('--workers', type=int, default=1, help='Number of processes to calculate the report metrics with')
+    parser.add_argument('--stream', action='store_true', help='Read a CSV/Parquet positions file in chunks and only create the BaseReport')
+    parser.add_argument('--incremental', action='store_true', help='Only ingest the positions appended since the last --incremental run')
+    parser.add_argument('--walk_forward', type=int, nargs=3, metavar=('TRAIN', 'TEST', 'STEP'),
+                        help='Create the WalkForwardReport with train and test windows of these many months, moving by STEP months')
+    parser.add_argument('--weight_sweep', type=int, nargs='?', const=1000, metavar='SAMPLES',
+                        help='Create the RankingStabilityReport, ranking the pairs under SAMPLES weight vectors (1000 by default)')
+    parser.add_argument('--monte_carlo', type=int, metavar='PATHS',
+                        help='Create the RobustnessReport from this many resampled trade sequences of every FinalReport pair count')
+    parser.add_argument('--monte_carlo_method', type=str, default=monte_carlo_method, choices=['bootstrap', 'shuffle'],
+                        help='Resample the trades with replacement (bootstrap) or shuffle their order')
+    parser.add_argument('--diversified', type=str, nargs='?', const='1D', metavar='BUCKET',
+                        help='Create the DiversifiedReport, merging the equity curves on time buckets of this length (1D by default)')
+    parser.add_argument('--pair_correlation', type=int, nargs='?', const=0, metavar='TOP_K',
+                        help='Create the PairCorrelationReport, with the TOP_K most correlated neighbours of every pair or all of them by default')
+    parser.add_argument('--float32', action='store_true', help='Keep the net profits and capital of the positions as float32 to save memory')
+    parser.add_argument('--reports', type=str, nargs='+', default=list(report_names), choices=report_names,
+                        help='Reports to create, only the steps they need are calculated')
+    parser.add_argument('--formats', type=str, nargs='+', default=['xlsx'], choices=['xlsx', 'csv', 'parquet'],
+                        help='File formats to write the reports in')
+    parser.add_argument('--profile', action='store_true', help='Record the time and memory of every report stage and write them next to the reports')
+
+    return parser
+
+
+def get_positions_file_name(pl_arg: str | None) -> str:
+    # Set the positions file name from the argument
+    return f'./{pl_arg}' if pl_arg else positions_file_name
+
 
-# If no output dir is given, set either the pairs file name or "latest" as the output dir.
-if not args.output_dir:
-    output_dir = f'report_outputs/{args.pl.replace('.xlsx', '')}' if args.pl else "report_outputs/latest"
+def get_output_dir(pl_arg: str | None, output_dir_arg: str | None) -> str:
+    # If no output dir is given, set either the pairs file name, without the wildcards of a glob pattern, or "latest" as the output dir.
+    if not output_dir_arg:
+        if not pl_arg:
+            return f"{output_root_dir}/latest"
 
-# If an output_dir is given through runtime arg, use it
-else:
-    output_dir = f'report_outputs/{args.output_dir}'
+        pl_name = re.sub(r"[*?]|\[.*?]", "", os.path.splitext(pl_arg)[0]).rstrip("/")
+        return f'{output_root_dir}/{pl_name}'
 
-if not os.path.exists(output_dir):
-    os.mkdir(output_dir)
\ No newline at end of file
+    # If an output_dir is given through runtime arg, use it
+    return f'{output_root_dir}/{output_dir_arg}'
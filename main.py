@@ -1,4 +1,18 @@
 import constants
 from reports.gp_report import Report
+from reports.incremental import create_incremental_report
+from reports.report_config import ReportConfig
+from reports.sources import create_source_reports, expand_positions_files
 
-Report(all_positions_file=constants.positions_file_name)
+args = constants.create_arg_parser().parse_args()
+config = ReportConfig.from_args(args)
+
+# A folder or glob pattern of positions files is reported on source by source
+positions_files = expand_positions_files(constants.get_positions_file_name(args.pl))
+
+if len(positions_files) > 1:
+    create_source_reports(positions_files, config)
+elif config.incremental:
+    create_incremental_report(positions_files[0], config, constants.incremental_state_dir)
+else:
+    Report(all_positions_file=positions_files[0], config=config)
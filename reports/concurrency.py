@@ -0,0 +1,72 @@
+import numpy as np
+
+from reports.instrumentation import instrumented
+
+
+@instrumented()
+def build_concurrency_events(entry_times: np.ndarray, exit_times: np.ndarray) -> (np.ndarray, np.ndarray, np.ndarray):
+    """
+    Map the entries and exits of a list of positions onto their sorted distinct event times. A position counts as open from its entry time (inclusive)
+    until its exit time (exclusive), so it adds one open position at the event of its entry and removes it at the event of its exit.
+
+    Args:
+        entry_times (np.ndarray): The entry times of the positions.
+        exit_times (np.ndarray): The exit times of the positions.
+
+    Returns:
+        (np.ndarray, np.ndarray, np.ndarray): The sorted distinct event times, and the event index of every position's entry and exit.
+    """
+    entry_times = np.asarray(entry_times).astype("datetime64[ns]")
+    exit_times = np.asarray(exit_times).astype("datetime64[ns]")
+
+    event_times, event_indices = np.unique(np.concatenate([entry_times, exit_times]), return_inverse=True)
+
+    return event_times, event_indices[:len(entry_times)], event_indices[len(entry_times):]
+
+
+@instrumented()
+def calc_concurrency_stats(event_times: np.ndarray, open_deltas: np.ndarray, capital_deltas: np.ndarray, threshold: int) -> (float, int, float, float):
+    """
+    Sweep over the entry and exit events of a list of positions, keeping a running count of the open positions and of the capital engaged in them.
+
+    Args:
+        event_times (np.ndarray): The sorted event times.
+        open_deltas (np.ndarray): The change in the number of open positions at each event time.
+        capital_deltas (np.ndarray): The change in the engaged capital at each event time.
+        threshold (int): The number of open positions above which the time is counted.
+
+    Returns:
+        (float, int, float, float): The time-weighted average number of open positions, the peak number of open positions, the percentage of the time
+            with more than threshold open positions, and the peak engaged capital.
+    """
+    if len(event_times) == 0:
+        return 0, 0, 0, 0
+
+    # Number of open positions and engaged capital from each event until the next one
+    open_positions = np.cumsum(open_deltas)
+    engaged_capital = np.cumsum(capital_deltas)
+
+    event_offsets = np.asarray(event_times).astype("datetime64[ns]").view(np.int64)
+    durations = np.diff(event_offsets)
+    total_duration = event_offsets[-1] - event_offsets[0]
+
+    if total_duration == 0:
+        average_concurrent_positions = float(open_positions[0])
+        time_above_threshold = 100.0 if open_positions[0] > threshold else 0.0
+    else:
+        average_concurrent_positions = float((open_positions[:-1] * durations).sum() / total_duration)
+        time_above_threshold = float(durations[open_positions[:-1] > threshold].sum() / total_duration * 100)
+
+    return average_concurrent_positions, int(open_positions.max()), time_above_threshold, float(engaged_capital.max())
+
+
+@instrumented()
+def calc_position_concurrency(entry_times: np.ndarray, exit_times: np.ndarray, capital_used: np.ndarray, threshold: int) -> (float, int, float, float):
+    # Build the events of a single list of positions and sweep over them, see calc_concurrency_stats
+    event_times, entry_events, exit_events = build_concurrency_events(entry_times, exit_times)
+
+    open_deltas = np.bincount(entry_events, minlength=len(event_times)) - np.bincount(exit_events, minlength=len(event_times))
+    capital_deltas = (np.bincount(entry_events, weights=capital_used, minlength=len(event_times)) -
+                      np.bincount(exit_events, weights=capital_used, minlength=len(event_times)))
+
+    return calc_concurrency_stats(event_times, open_deltas, capital_deltas, threshold)
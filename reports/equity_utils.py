@@ -0,0 +1,177 @@
+import numpy as np
+import pandas as pd
+
+from reports.instrumentation import instrumented
+
+# Nanoseconds in a day, used to express drawdown durations in days
+NANOSECONDS_PER_DAY = 86_400 * 10 ** 9
+
+
+@instrumented()
+def build_equity_curve(exit_times: np.ndarray, net_profits: np.ndarray, timeframe: str | None = None) -> (np.ndarray, np.ndarray):
+    """
+    Build the equity curve of a list of positions from their exit events.
+
+    In the default event mode, the curve has one point per distinct exit time, and positions that exit at the same time are summed into a single step.
+    This is exact and costs O(n log n) for the sort. In grid mode (timeframe given, e.g. "15min"), the curve is sampled on a fixed grid running from the
+    first to the last exit time, and only positions that exit exactly on a grid point contribute, which reproduces the legacy date_range based curve.
+
+    Args:
+        exit_times (np.ndarray): The exit times of the positions.
+        net_profits (np.ndarray): The net profits of the positions, aligned with exit_times.
+        timeframe (str | None): The grid resolution as a fixed pandas frequency string, or None for the event mode.
+
+    Returns:
+        (np.ndarray, np.ndarray): The times of the curve points as datetime64[ns] and the cumulative equity at each of them.
+    """
+    exit_times = np.asarray(exit_times).astype("datetime64[ns]")
+    net_profits = np.asarray(net_profits, dtype=float)
+
+    if len(exit_times) == 0:
+        return exit_times, net_profits
+
+    if timeframe is None:
+        # One bucket per distinct exit time
+        curve_times, event_indices = np.unique(exit_times, return_inverse=True)
+        step_profits = np.bincount(event_indices, weights=net_profits, minlength=len(curve_times))
+
+    else:
+        step = pd.tseries.frequencies.to_offset(timeframe).nanos
+        exit_offsets = exit_times.view(np.int64)
+        start = exit_offsets.min()
+        offsets = exit_offsets - start
+
+        # Same point count as pd.date_range(start=min, end=max, freq=timeframe)
+        grid_length = int(offsets.max() // step) + 1
+        on_grid = offsets % step == 0
+
+        step_profits = np.bincount(offsets[on_grid] // step, weights=net_profits[on_grid], minlength=grid_length)
+        curve_times = (start + np.arange(grid_length, dtype=np.int64) * step).view("datetime64[ns]")
+
+    return curve_times, np.cumsum(step_profits)
+
+
+@instrumented()
+def build_segment_equity_curves(segment_codes: np.ndarray, exit_times: np.ndarray, net_profits: np.ndarray,
+                                timeframe: str | None = None) -> (np.ndarray, np.ndarray, np.ndarray):
+    """
+    Build the equity curves of many groups of positions (e.g. one per pair) at once, laid end to end in a single array sorted by group and exit time. Each
+    curve works like the event mode of build_equity_curve. If a timeframe is given, positions that don't exit exactly on a grid point counted from their
+    group's first exit don't count towards the equity, like in the grid mode.
+
+    Args:
+        segment_codes (np.ndarray): The group code of every position.
+        exit_times (np.ndarray): The exit times of the positions.
+        net_profits (np.ndarray): The net profits of the positions.
+        timeframe (str | None): The grid resolution as a fixed pandas frequency string, or None to use the exact exit times.
+
+    Returns:
+        (np.ndarray, np.ndarray, np.ndarray): The group code, time and cumulative equity of every curve point.
+    """
+    segment_codes = np.asarray(segment_codes)
+    exit_offsets = np.asarray(exit_times).astype("datetime64[ns]").view(np.int64)
+    net_profits = np.asarray(net_profits, dtype=float)
+
+    if len(segment_codes) == 0:
+        return segment_codes, exit_offsets.view("datetime64[ns]"), net_profits
+
+    if timeframe is not None:
+        step = pd.tseries.frequencies.to_offset(timeframe).nanos
+        first_exits = np.full(segment_codes.max() + 1, np.iinfo(np.int64).max)
+        np.minimum.at(first_exits, segment_codes, exit_offsets)
+
+        # Off-grid positions keep a flat point on the grid so the curve spans the same range as the grid does
+        grid_offsets = exit_offsets - first_exits[segment_codes]
+        net_profits = np.where(grid_offsets % step == 0, net_profits, 0)
+        exit_offsets = exit_offsets - grid_offsets % step
+
+    order = np.lexsort((exit_offsets, segment_codes))
+    segment_codes, exit_offsets, net_profits = segment_codes[order], exit_offsets[order], net_profits[order]
+
+    equity_curves = pd.Series(net_profits).groupby(segment_codes).cumsum().to_numpy()
+
+    # Positions of a group exiting at the same time make up a single point, the last one holding their combined equity
+    is_last_of_event = np.append((segment_codes[1:] != segment_codes[:-1]) | (exit_offsets[1:] != exit_offsets[:-1]), True)
+
+    return segment_codes[is_last_of_event], exit_offsets[is_last_of_event].view("datetime64[ns]"), equity_curves[is_last_of_event]
+
+
+@instrumented()
+def calc_segment_drawdowns(segment_codes: np.ndarray, curve_times: np.ndarray, equity_curves: np.ndarray,
+                           segment_count: int) -> (np.ndarray, np.ndarray, np.ndarray):
+    """
+    Calculate drawdown statistics of many equity curves at once. The curves are laid end to end in a single array, with segment_codes telling which curve
+    every point belongs to. The codes must be sorted, and the points of every curve must be in time order.
+
+    A drawdown stretch starts at the first point below the previous peak and ends at the first point back at it, or at the end of the curve if it never
+    got back. The drawdown duration of a curve is the longest of its stretches. The recovery time runs from the trough of the max drawdown until the curve
+    first got back to the peak preceding it, and is NaN if it never recovered.
+
+    Args:
+        segment_codes (np.ndarray): The curve code of every point, from 0 to segment_count - 1.
+        curve_times (np.ndarray): The times of the points.
+        equity_curves (np.ndarray): The cumulative equity at each of the points, restarting from each curve's own first point.
+        segment_count (int): The number of curves. Curves with no points get zeros.
+
+    Returns:
+        (np.ndarray, np.ndarray, np.ndarray): The max drawdown, the max drawdown duration in days and the recovery time in days of every curve.
+    """
+    max_drawdowns = np.zeros(segment_count)
+    max_durations = np.zeros(segment_count)
+    recovery_times = np.zeros(segment_count)
+
+    if len(equity_curves) == 0:
+        return max_drawdowns, max_durations, recovery_times
+
+    segment_codes = np.asarray(segment_codes)
+    times = np.asarray(curve_times).astype("datetime64[ns]").view(np.int64)
+
+    # Running maximum of every curve, the first point of a curve is always at its peak
+    running_max = pd.Series(equity_curves).groupby(segment_codes).cummax().to_numpy()
+    drawdown = running_max - equity_curves
+
+    # Curves summed in a different order can miss their previous peak by a rounding error, which shouldn't count as being below it
+    at_peak = drawdown <= 1e-9 * (1 + np.abs(running_max))
+
+    same_segment = segment_codes[1:] == segment_codes[:-1]
+    is_segment_end = np.append(~same_segment, True)
+
+    # Stretch starts and ends alternate within each curve, so sorting both lists pairs them up
+    stretch_starts = np.flatnonzero(at_peak[:-1] & ~at_peak[1:]) + 1
+    recoveries = np.flatnonzero(~at_peak[:-1] & at_peak[1:] & same_segment) + 1
+    stretch_ends = np.sort(np.concatenate([recoveries, np.flatnonzero(is_segment_end & ~at_peak)]))
+
+    np.maximum.at(max_drawdowns, segment_codes, drawdown)
+    np.maximum.at(max_durations, segment_codes[stretch_starts], (times[stretch_ends] - times[stretch_starts]) / NANOSECONDS_PER_DAY)
+
+    # The first point of every curve reaching its max drawdown
+    troughs = np.flatnonzero((drawdown == max_drawdowns[segment_codes]) & ~at_peak)
+    trough_segments, first_trough_positions = np.unique(segment_codes[troughs], return_index=True)
+    troughs = troughs[first_trough_positions]
+
+    # The first recovery after each trough, if it's still within the same curve
+    next_recovery_positions = np.searchsorted(recoveries, troughs)
+    has_recovery = next_recovery_positions < len(recoveries)
+    next_recoveries = recoveries[np.minimum(next_recovery_positions, len(recoveries) - 1)] if len(recoveries) > 0 else troughs
+    has_recovery &= segment_codes[next_recoveries] == trough_segments
+
+    recovery_times[trough_segments] = np.where(has_recovery, (times[next_recoveries] - times[troughs]) / NANOSECONDS_PER_DAY, np.nan)
+
+    return max_drawdowns, max_durations, recovery_times
+
+
+@instrumented()
+def calc_curve_drawdown(curve_times: np.ndarray, equity_curve: np.ndarray) -> (float, float, float):
+    """
+    Calculate the max drawdown, the max drawdown duration and the recovery time of a single equity curve, as described in calc_segment_drawdowns.
+
+    Args:
+        curve_times (np.ndarray): The times of the curve points as returned by build_equity_curve.
+        equity_curve (np.ndarray): The cumulative equity at each of the curve points.
+
+    Returns:
+        (float, float, float): The max drawdown, the max drawdown duration in days and the recovery time of the max drawdown in days.
+    """
+    max_drawdowns, max_durations, recovery_times = calc_segment_drawdowns(np.zeros(len(equity_curve), dtype=int), curve_times, equity_curve, 1)
+
+    return float(max_drawdowns[0]), float(max_durations[0]), float(recovery_times[0])
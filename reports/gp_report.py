@@ -1,240 +1,263 @@
+import functools
+
 import pandas as pd
 
-import constants
+from reports import instrumentation
 from reports.base_report_utils import *
+from reports.instrumentation import instrumented
+from reports.monte_carlo import create_robustness_report
+from reports.month_matrix import MonthCoverage, create_month_coverage
+from reports.pair_metrics import create_pair_metrics
+from reports.pair_overlap import create_pair_correlation_report
+from reports.portfolio_search import create_diversified_pair_list
+from reports.positions_io import load_positions
+from reports.positions_store import PositionsStore
+from reports.prefix_metrics import create_prefix_metrics
+from reports.report_config import ReportConfig
+from reports.report_writers import write_report_files
+from reports.streaming import create_streaming_pair_metrics
+from reports.walk_forward import create_walk_forward_report
+from reports.weight_sweep import create_ranking_stability_report
+
+
+def report_stage(create_method_name: str, shared: bool = False) -> functools.cached_property:
+    """
+    Declare a lazily evaluated step of a Report, an attribute that's calculated by calling the given Report method the first time it's used and then
+    kept, so that every intermediate result is calculated at most once and only if a requested report needs it.
+
+    Args:
+        create_method_name (str): The name of the Report method that calculates the step.
+        shared (bool): Whether the result is stored in the report's shared_state, where the other reports of the same positions and metrics key find it.
+    """
+    def get_stage(report):
+        if not shared:
+            return getattr(report, create_method_name)()
+
+        return report.get_shared(create_method_name, getattr(report, create_method_name))
+
+    return functools.cached_property(get_stage)
 
 
 class Report:
-    def __init__(self, all_positions_file='./all_positions.xlsx', mode='ALL_PAIRS'):
-        print('Reading from', all_positions_file)
-        self.positions_df: pd.DataFrame = pd.read_excel(all_positions_file)
-
-        if constants.position_type:
-            self.positions_df = self.positions_df[self.positions_df['Type'] == constants.position_type.lower()].reset_index()
-
-        self.positions_df.sort_values(["Entry time"], inplace=True)
-
-        # Filters
-        # Pair name filter
-        self.pair_names = self.positions_df['Pair name'].to_numpy()
-        self.net_profits = self.positions_df['Net profit'].to_numpy()
-        self.statuses = self.positions_df['Status'].to_numpy()
-
-        if mode == "LIMITED_PAIRS":
-            self.pair_list = pd.read_csv("pair_list.csv").pairs.tolist()
-        elif mode == "ALL_PAIRS":
-            self.pair_list = self.positions_df["Pair name"].unique().tolist()
-
-        self.base_report_df: pd.DataFrame = self.create_base_report()
-        self.final_report_df: pd.DataFrame = self.create_final_report()
-        self.monthly_report_df: pd.DataFrame = self.create_monthly_report()
-        self.combined_report_df: pd.DataFrame = self.create_combined_report()
-
-        self.base_report_df.to_excel(f"{constants.output_dir}/BaseReport.xlsx")
-        self.final_report_df.to_excel(f"{constants.output_dir}/FinalReport.xlsx")
-        self.monthly_report_df.to_excel(f"{constants.output_dir}/MonthlyReport.xlsx")
-        self.combined_report_df.to_excel(f"{constants.output_dir}/CombinedReport.xlsx", index=False)
-
+    # The file names of the reports that can be written, with the attribute holding each one and whether its index is written as the first column
+    report_attributes = {
+        "BaseReport": ("base_report_df", True),
+        "RankingStabilityReport": ("ranking_stability_df", False),
+        "FinalReport": ("final_report_df", True),
+        "MonthlyReport": ("monthly_report_df", True),
+        "CombinedReport": ("combined_report_df", False),
+        "WalkForwardReport": ("walk_forward_df", False),
+        "RobustnessReport": ("robustness_df", False),
+        "DiversifiedReport": ("diversified_report_df", True),
+        "PairCorrelationReport": ("pair_correlation_df", False)
+    }
+
+    # The reports that can be made from the streamed per-pair accumulators alone
+    streaming_reports = ["BaseReport", "RankingStabilityReport"]
+
+    # The steps of the reports, evaluated when they're first used. The positions, their filters, the month list, the pair x month matrices and the
+    # per-pair metrics only depend on the positions and config.metrics_key, so they're shared between reports. The positions are filtered by source,
+    # type and status in the encoded positions_store only, which every metric is calculated from.
+    all_positions_df = report_stage("load_positions_df")
+    positions_store = report_stage("create_positions_store", shared=True)
+    closed_positions = report_stage("filter_closed_positions", shared=True)
+    total_month_list = report_stage("create_total_month_list", shared=True)
+    pair_list = report_stage("create_pair_list", shared=True)
+    month_coverage = report_stage("create_month_coverage", shared=True)
+    original_capital_per_trade = report_stage("get_original_capital_per_trade", shared=True)
+    pair_metrics_df = report_stage("create_pair_metrics_df", shared=True)
+    base_report_df = report_stage("create_base_report", shared=True)
+    ranking_stability_df = report_stage("create_ranking_stability_report")
+    sorted_pair_list = report_stage("create_sorted_pair_list")
+    final_report_df = report_stage("create_final_report")
+    monthly_report_df = report_stage("create_monthly_report")
+    combined_report_df = report_stage("create_combined_report")
+    walk_forward_df = report_stage("create_walk_forward_report")
+    robustness_df = report_stage("create_robustness_report")
+    diversified_report_df = report_stage("create_diversified_report")
+    pair_correlation_df = report_stage("create_pair_correlation_report")
+
+    def __init__(self, all_positions_file='./all_positions.xlsx', mode='ALL_PAIRS', config: ReportConfig | None = None,
+                 positions_df: pd.DataFrame | None = None, shared_state: dict | None = None, create_reports: bool = True):
+        """
+        Create the reports of a positions file chosen with config.reports and write them to config.output_dir. Only the steps those reports depend on are
+        calculated, e.g. a BaseReport alone never merges the pairs of the FinalReport.
+
+        Args:
+            all_positions_file (str): The positions file to read, unless positions_df is given.
+            mode (str): ALL_PAIRS to report on every pair of the file, LIMITED_PAIRS to only use the pairs of pair_list.csv.
+            config (ReportConfig | None): The report settings, the defaults of ReportConfig if not given.
+            positions_df (pd.DataFrame | None): The already loaded positions of all_positions_file, so that several reports don't read it again.
+            shared_state (dict | None): The intermediate results shared with other reports of the same positions and config.metrics_key, filled in by
+                whichever report calculates them first.
+            create_reports (bool): Whether to create and write the reports right away. If False, nothing is calculated until the report attributes,
+                e.g. report.base_report_df, are used.
+        """
+        self.all_positions_file = all_positions_file
+        self.mode = mode
+        self.config: ReportConfig = config if config is not None else ReportConfig()
+        self.shared_state: dict = shared_state if shared_state is not None else {}
+        self.input_positions_df = positions_df
+
+        # Only the calls recorded during this report are written to its profile files
+        if self.config.profile:
+            instrumentation.enable()
+        self.first_profile_record = len(instrumentation.records)
+
+        if create_reports:
+            self.write_reports()
+            self.write_profile()
+
+    def get_shared(self, key: str, create):
+        # Return the shared intermediate result under key, calculating it first if no report has done so yet
+        if key not in self.shared_state:
+            self.shared_state[key] = create()
+
+        return self.shared_state[key]
+
+    def get_requested_reports(self) -> list:
+        # The reports of config.reports that this run can make, in the order of report_attributes
+        available_reports = self.streaming_reports if self.config.stream else self.report_attributes
+        return [report_name for report_name in self.report_attributes if report_name in self.config.reports and report_name in available_reports]
+
+    def load_positions_df(self) -> pd.DataFrame:
+        if self.input_positions_df is not None:
+            return self.input_positions_df
+
+        print('Reading from', self.all_positions_file)
+
+        return load_positions(self.all_positions_file, cache_dir=self.config.positions_cache_dir)
+
+    @instrumented("stage")
+    def create_positions_store(self) -> PositionsStore:
+        # The positions of config.source and config.position_type in entry time order, encoded once and filtered by their integer codes, see reports/positions_store.py
+        float_dtype = np.float32 if self.config.float32_profits else np.float64
+        positions_store = PositionsStore.from_positions_df(self.all_positions_df, float_dtype=float_dtype)
+        positions_store = positions_store.filter_source(self.config.source).filter_type(self.config.position_type).sort_by_entry_time().with_months()
+
+        # The loaded DataFrame isn't needed by the reports anymore once it's encoded, unless it belongs to the caller
+        if self.input_positions_df is None:
+            self.__dict__.pop("all_positions_df", None)
+
+        return positions_store
+
+    def filter_closed_positions(self) -> PositionsStore:
+        # The positions that count towards the reports, in entry time order
+        return self.positions_store.closed()
+
+    def create_total_month_list(self) -> pd.DatetimeIndex:
+        return self.positions_store.month_list
+
+    def create_pair_list(self) -> list:
+        if self.mode == "LIMITED_PAIRS":
+            return pd.read_csv("pair_list.csv").pairs.tolist()
+
+        # The pairs in the order they first appear in, the same as positions_df["Pair name"].unique()
+        return self.positions_store.pair_names[pd.unique(self.positions_store.pair_codes)].tolist()
+
+    def create_month_coverage(self) -> MonthCoverage:
+        # Net profit and activity of every pair in every month, shared by the reports that need per-month numbers
+        return create_month_coverage(self.closed_positions, self.pair_list)
+
+    def get_original_capital_per_trade(self) -> float:
+        # The capital the backtest engaged per trade, which the scaled reports are compared to
+        return self.positions_store.capital_used[0]
+
+    @property
+    def pair_month_net_profits(self) -> pd.DataFrame:
+        return pd.DataFrame(self.month_coverage.monthly_net_profits, index=pd.Index(self.pair_list, name="Pair name"), columns=self.total_month_list)
+
+    @instrumented("stage")
+    def write_reports(self):
+        # Only the requested reports, and the steps they depend on, are calculated here
+        reports = {}
+        for report_name in self.get_requested_reports():
+            report_attribute, index = self.report_attributes[report_name]
+            report_df = getattr(self, report_attribute)
+            if report_df is not None:
+                reports[report_name] = (report_df, index)
+
+        write_report_files(reports, self.config.output_dir, formats=self.config.formats, threads=self.config.output_threads)
+
+    def write_profile(self):
+        # The timings of the stages and helpers of this report, next to the report files
+        if instrumentation.enabled:
+            instrumentation.write_profile(self.config.output_dir, first_record=self.first_profile_record)
+
+    def create_sorted_pair_list(self) -> list:
+        # The pairs combined in the Final and Monthly reports, the top pairs of the BaseReport unless config.selected_pairs chooses them
+        if self.config.selected_pairs:
+            known_pairs = set(self.pair_list)
+            unknown_pairs = [pair for pair in self.config.selected_pairs if pair not in known_pairs]
+            if unknown_pairs:
+                raise ValueError(f"Unknown pairs: {', '.join(unknown_pairs)}")
+
+            return list(dict.fromkeys(self.config.selected_pairs))
+
+        sorted_pair_list = self.base_report_df["Pair name"][:self.config.max_final_report_pairs].tolist()
+        if not sorted_pair_list:
+            raise ValueError("No pairs to combine, none have closed positions with these settings or max_final_report_pairs is below 1")
+
+        return sorted_pair_list
+
+    def get_prefix_metrics(self, sorted_pair_list: list) -> pd.DataFrame:
+        """
+        The unscaled FinalReport rows of sorted_pair_list. Row n only depends on the first n pairs, so the rows calculated for a list that starts with
+        sorted_pair_list, e.g. a longer one of the same BaseReport ranking, are cut instead of being calculated again.
+        """
+        prefix_metrics_df = self.shared_state.get("prefix_metrics_df")
+        if prefix_metrics_df is None or self.shared_state["prefix_pair_list"][:len(sorted_pair_list)] != sorted_pair_list:
+            prefix_metrics_df = create_prefix_metrics(self.closed_positions, sorted_pair_list,
+                                                      timeframe=self.config.equity_curve_timeframe,
+                                                      concurrency_threshold=self.config.concurrent_positions_threshold, workers=self.config.workers)
+            self.shared_state["prefix_metrics_df"] = prefix_metrics_df
+            self.shared_state["prefix_pair_list"] = list(sorted_pair_list)
+
+        return prefix_metrics_df[prefix_metrics_df["Pair count"] <= len(sorted_pair_list)].copy()
+
+    @instrumented("stage")
+    def create_pair_metrics_df(self) -> pd.DataFrame:
+        # The streaming mode only keeps per-pair accumulators in memory, which is enough for the BaseReport alone
+        if self.config.stream:
+            return create_streaming_pair_metrics(self.all_positions_file, position_type=self.config.position_type)
+
+        # All the per-pair metrics are calculated in a single pass over the positions grouped by pair
+        return create_pair_metrics(self.closed_positions, self.pair_list, timeframe=self.config.equity_curve_timeframe,
+                                   workers=self.config.workers)
+
+    @instrumented("stage")
     def create_base_report(self) -> pd.DataFrame:
-        # The list which contains items that have data related to each pair. Each item is a dict and the list finally converts into a python dataframe.
-        base_report_list: list[dict] = []
-
-        total_month_list = calc_total_months(self.positions_df)
-
-        for pair_name in self.pair_list:
-            # The positions that have pair_name as their first column, and have been actually entered
-            positions_from_pair: pd.DataFrame = self.positions_df[
-                (self.pair_names == pair_name) &
-                (self.statuses != "ACTIVE") &
-                (self.statuses != "ENTERED")
-                ]
-
-            pair_net_profits = positions_from_pair["Net profit"].to_numpy()
-
-            # Number of trades
-            total_number_of_positions = len(positions_from_pair)
-            # If the file has no positions, skip to the next pair
-            if total_number_of_positions == 0:
-                continue
-
-            # The summation of the net profit for the list of trades
-            total_net_profit: float = sum(pair_net_profits)
-
-            # The gross positive and negative trades
-            total_gross_profit: float = sum(pair_net_profits[np.where(pair_net_profits > 0)])
-            total_gross_loss: float = sum(pair_net_profits[np.where(pair_net_profits < 0)])
-
-            try:
-                total_largest_profit_per_position: float = pair_net_profits[np.where(pair_net_profits > 0)].max()
-            except:
-                total_largest_profit_per_position = 0
-
-            total_average_profit_per_position: float = total_net_profit / len(positions_from_pair)
-
-            # Missing months
-            missing_months = calc_missing_months(positions_from_pair, total_month_list)
-
-            # Performance means what percentage of months have had positive net profits.
-            total_performance: float = calc_performance(positions_from_pair)
-
-            # Winrate represents what percentage of positions have had positive net profits.
-            total_winrate: float = calc_winrate(positions_from_pair)
-
-            # Drawdown represents the maximum drawdown of the equity curve formed by the positions
-            total_drawdown: float = calc_max_drawdown(positions_from_pair)
-
-            # Consecutive wins and losses
-            avg_consecutive_wins, max_consecutive_wins = calc_consecutive_wins(positions_from_pair)
-            avg_consecutive_losses, max_consecutive_losses = calc_consecutive_losses(positions_from_pair)
-
-            base_report_dict_item: dict = {
-                "Pair name": pair_name,
-                "Number of positions - total": total_number_of_positions,
-                "Performance - total": total_performance,
-                "Winrate - total": total_winrate,
-                "Net profit - total": total_net_profit,
-                "Gross profit - total": total_gross_profit,
-                "Gross loss - total": total_gross_loss,
-                "Largest profit in a trade - total": total_largest_profit_per_position,
-                "Average profit per trade - total": total_average_profit_per_position,
-                "Total months": len(total_month_list),
-                "Missing months": missing_months,
-                "Max drawdown - total": total_drawdown,
-                "Average consecutive wins": avg_consecutive_wins,
-                "Max consecutive wins": max_consecutive_wins,
-                "Average consecutive losses": avg_consecutive_losses,
-                "Max consecutive losses": max_consecutive_losses
-            }
-
-            base_report_list.append(base_report_dict_item)
-
-        base_report_df = pd.DataFrame.from_dict(base_report_list)
-
-        # Add the score column to the base_report dataframe
-        base_report_df["Score"] = calculate_score(base_report_df, weights)["Score"]
-
-        # Adjust the scores for missing months
-        base_report_df = adjust_score_for_missing_months(base_report_df)
-
-        # Sort the columns by Score
-        base_report_df.sort_values(["Score"], ascending=False, inplace=True)
-
-        # Round the values to 2 decimal places
-        base_report_df = base_report_df.round(4)
+        base_report_df = rank_base_report(self.pair_metrics_df.copy())
 
         print('Base report created.')
 
         return base_report_df
 
-    @profile
-    def create_final_report(self):
-        # The list containing rows of the final report, which show data on scenarios for choosing the first n pairs of base report as our selected pairs.
-        final_report_list = []
-
-        total_month_list = calc_total_months(self.positions_df)
-
-        def calculate_average_concurrent_positions(df):
-            entry_times = df['Entry time'].to_numpy()
-            exit_times = df['Exit time'].to_numpy()
-
-            min_time = min(min(entry_times), min(exit_times))
-            max_time = max(max(entry_times), max(exit_times))
-            all_times = pd.date_range(start=min_time, end=max_time, freq='5min').to_numpy()
-
-            concurrent_positions = np.zeros(len(all_times))
-
-            for i, time in enumerate(all_times):
-                # Count positions that are active at the current time
-                concurrent_positions[i] = np.sum((entry_times <= time) & (exit_times > time))
-
-            # Calculate the average number of concurrent positions
-            average_concurrent_positions = np.mean(concurrent_positions)
-            return average_concurrent_positions
-
-        def calculate_average_loss_per_position(df):
-            return df[df["Net profit"] < 0]["Net profit"].mean()
-
-        if len(self.pair_list) > constants.max_final_report_pairs:
-            sorted_pair_list = self.base_report_df["Pair name"][:constants.max_final_report_pairs].tolist()
-        else:
-            sorted_pair_list = self.base_report_df["Pair name"].tolist()
-
-        for pair_count in range(1, len(sorted_pair_list) + 1):
-            print(f"FinalReport.xlsx: Pair count {pair_count}")
-            current_pair_list = sorted_pair_list[:pair_count]
-            positions_for_current_pairs = self.positions_df[
-                (np.isin(self.pair_names, current_pair_list)) & (self.statuses != "ACTIVE") & (self.statuses != "ENTERED")]
-
-            # Number of trades
-            total_number_of_positions = len(positions_for_current_pairs)
-            # If the file has no positions, skip to the next pair
-            if total_number_of_positions == 0:
-                continue
+    @instrumented("stage")
+    def create_ranking_stability_report(self) -> pd.DataFrame | None:
+        # How the ranking of the BaseReport changes under weights sampled around the ones in base_report_utils, skipped if no samples are set
+        if self.config.weight_sweep_samples <= 0:
+            return None
 
-            pair_net_profits = positions_for_current_pairs["Net profit"].to_numpy()
+        ranking_stability_df = create_ranking_stability_report(self.pair_metrics_df, weights, sample_count=self.config.weight_sweep_samples,
+                                                                top_n=self.config.max_final_report_pairs, spread=self.config.weight_sweep_spread)
 
-            # The summation of the net profit for the list of trades
-            total_net_profit: float = calc_sum_net_profit(positions_for_current_pairs)
+        print('Ranking stability report created.')
 
-            # The gross positive and negative trades
-            total_gross_profit: float = positions_for_current_pairs[positions_for_current_pairs["Net profit"] > 0]["Net profit"].sum()
-            total_gross_loss: float = positions_for_current_pairs[positions_for_current_pairs["Net profit"] < 0]["Net profit"].sum()
+        return ranking_stability_df
 
-            try:
-                total_largest_profit_per_position: float = pair_net_profits[np.where(pair_net_profits > 0)].max()
-            except:
-                total_largest_profit_per_position = 0
-
-            total_average_profit_per_position: float = total_net_profit / len(positions_for_current_pairs)
-
-            # Performance means what percentage of months have had positive net profits.
-            total_performance: float = calc_performance(positions_for_current_pairs)
-
-            # Winrate represents what percentage of positions have had positive net profits.
-            total_winrate: float = calc_winrate(positions_for_current_pairs)
-
-            # Drawdown represents the maximum drawdown of the equity curve formed by the positions
-            total_drawdown: float = calc_max_drawdown(positions_for_current_pairs)
-
-            # Missing months that the combination of pairs had no positions in
-            missing_months = calc_missing_months(positions_for_current_pairs, total_month_list)
-
-            # Average concurrent open positions
-            average_concurrent_positions = calculate_average_concurrent_positions(positions_for_current_pairs)
-
-            # Average loss per position
-            average_loss_per_position = calculate_average_loss_per_position(positions_for_current_pairs)
-
-            # Consecutive wins and losses
-            avg_consecutive_wins, max_consecutive_wins = calc_consecutive_wins(positions_for_current_pairs)
-            avg_consecutive_losses, max_consecutive_losses = calc_consecutive_losses(positions_for_current_pairs)
+    @instrumented("stage")
+    def create_final_report(self):
+        # The rows for choosing the first n pairs of base report as our selected pairs, built by merging one pair at a time into the previous row's state
+        final_report_df = self.get_prefix_metrics(self.sorted_pair_list)
 
-            base_report_dict_item: dict = {
-                "Pair count": pair_count,
-                "Capital used per trade": positions_for_current_pairs.iloc[0]["Capital used"],
-                "Number of positions - total": total_number_of_positions,
-                "Performance - total": total_performance,
-                "Winrate - total": total_winrate,
-                "Net profit - total": total_net_profit,
-                "Gross profit - total": total_gross_profit,
-                "Gross loss - total": total_gross_loss,
-                "Largest profit in a trade - total": total_largest_profit_per_position,
-                "Average profit per trade - total": total_average_profit_per_position,
-                "Max drawdown - total": total_drawdown,
-                "Average loss per position - total": average_loss_per_position,
-                "Total months": len(total_month_list),
-                "Missing months": missing_months,
-                "Average # of concurrent trades": average_concurrent_positions,
-                "Average consecutive wins": avg_consecutive_wins,
-                "Max consecutive wins": max_consecutive_wins,
-                "Average consecutive losses": avg_consecutive_losses,
-                "Max consecutive losses": max_consecutive_losses
-            }
+        final_report_df = self.scale_final_report(final_report_df)
 
-            final_report_list.append(base_report_dict_item)
+        print('Final report created.')
 
-        final_report_df = pd.DataFrame.from_dict(final_report_list)
+        return final_report_df
 
+    def scale_final_report(self, final_report_df: pd.DataFrame) -> pd.DataFrame:
         # This scaling factor works by forcing a set amount of engaged capital for every signal of the LAST row of the final report. Then, a scaling factor
         # is calculated for all the other rows and all the affected numbers are multiplied by that.
 
@@ -246,7 +269,7 @@ class Report:
 
         # Fixed product which basically represents the total capital, calculated from the desired capital per trade (given in constants.py) and the number of
         # positions in the last row of FinalReport.
-        total_capital = final_report_df["Number of positions - total"].iloc[-1] * constants.capital_per_trade
+        total_capital = final_report_df["Number of positions - total"].iloc[-1] * self.config.capital_per_trade
 
         # The product of every row's total # of positions and its engaged capital should equal the total capital. So the Capital used per trade for each row
         # is corrected as follows:
@@ -261,54 +284,102 @@ class Report:
         final_report_df["Max drawdown - total"] = final_report_df["Max drawdown - total"] * scaling_factor
         final_report_df["Largest profit in a trade - total"] = final_report_df["Largest profit in a trade - total"] * scaling_factor
         final_report_df["Average profit per trade - total"] = final_report_df["Average profit per trade - total"] * scaling_factor
-
-        print('Final report created.')
+        final_report_df["Average loss per position - total"] = final_report_df["Average loss per position - total"] * scaling_factor
+        final_report_df["Max drawdown - trade order"] = final_report_df["Max drawdown - trade order"] * scaling_factor
+        final_report_df["Peak capital engaged - total"] = final_report_df["Peak capital engaged - total"] * scaling_factor
 
         return final_report_df
 
+    @instrumented("stage")
     def create_monthly_report(self):
-        if len(self.pair_list) > constants.max_final_report_pairs:
-            sorted_pair_list = self.base_report_df["Pair name"][:constants.max_final_report_pairs].tolist()
-        else:
-            sorted_pair_list = self.base_report_df["Pair name"].tolist()
+        sorted_pair_list = self.sorted_pair_list
 
-        earliest_yearmonth = self.positions_df["Entry time"].min().strftime("%Y-%m")
-        latest_yearmonth = self.positions_df["Exit time"].max().strftime("%Y-%m")
+        # Same scaling calculations from FinalReport
+        original_capital_per_trade = self.original_capital_per_trade
+        capital_per_trade = self.final_report_df.set_index("Pair count")["Capital used per trade"]
+        scaling_factors = capital_per_trade.reindex(range(1, len(sorted_pair_list) + 1)).to_numpy() / original_capital_per_trade
 
-        monthly_report_list = []
+        # The monthly profits of the first n pairs are the cumulative sums of the month coverage rows, in the order of the pairs' ranks
+        cumulative_monthly_net_profits = self.month_coverage.calc_prefix_monthly_net_profits(pd.Index(self.pair_list).get_indexer(sorted_pair_list))
 
-        # Same scaling calculations from FinalReport
-        total_capital = self.final_report_df["Number of positions - total"].iloc[-1] * constants.capital_per_trade
-        original_capital_per_trade = self.positions_df["Capital used"].iloc[0]
+        monthly_report_df = pd.DataFrame(cumulative_monthly_net_profits * scaling_factors[:, np.newaxis], columns=self.total_month_list.strftime("%Y-%m"))
+        monthly_report_df.insert(0, "Pair count", range(1, len(sorted_pair_list) + 1))
+
+        print('Monthly report created.')
+
+        return monthly_report_df
 
-        for pair_count in range(1, len(sorted_pair_list) + 1):
-            print(f"MonthlyReport.xlsx: Pair count {pair_count}")
-            current_pair_list = sorted_pair_list[:pair_count]
-            positions_for_current_pairs = self.positions_df[
-                (np.isin(self.pair_names, current_pair_list)) & (self.statuses != "ACTIVE") & (self.statuses != "ENTERED")]
+    @instrumented("stage")
+    def create_combined_report(self):
+        return pd.concat([self.final_report_df, self.monthly_report_df.drop(columns=["Pair count"])], axis=1)
 
-            scaling_factor = self.final_report_df[self.final_report_df["Pair count"] == pair_count]["Capital used per trade"].iloc[
-                                 0] / original_capital_per_trade
+    @instrumented("stage")
+    def create_walk_forward_report(self) -> pd.DataFrame | None:
+        # The out-of-sample results of re-selecting the top pairs on rolling train windows, skipped if no train window length is set
+        if self.config.walk_forward_train_months <= 0:
+            return None
 
-            # Iterate over every month between earliest and latest, calculating the profit for it
-            monthly_profit_dict = {
-                "Pair count": pair_count
-            }
+        walk_forward_df = create_walk_forward_report(self.closed_positions, self.pair_list, self.config.walk_forward_train_months,
+                                                     test_months=self.config.walk_forward_test_months, step_months=self.config.walk_forward_step_months,
+                                                     top_n=self.config.max_final_report_pairs)
 
-            current_month = earliest_yearmonth
-            while current_month <= latest_yearmonth:
-                positions_for_current_month = positions_for_current_pairs[
-                    (positions_for_current_pairs["Exit time"].dt.strftime("%Y-%m") == current_month)]
-                total_net_profit: float = calc_sum_net_profit(positions_for_current_month)
+        print('Walk-forward report created.')
 
-                monthly_profit_dict[current_month] = total_net_profit * scaling_factor
-                current_month = (pd.to_datetime(current_month) + pd.DateOffset(months=1)).strftime("%Y-%m")
+        return walk_forward_df
 
-            monthly_report_list.append(monthly_profit_dict)
+    @instrumented("stage")
+    def create_robustness_report(self) -> pd.DataFrame | None:
+        # Confidence intervals of the FinalReport pair counts from resampled trade sequences, skipped if no paths are set
+        if self.config.monte_carlo_paths <= 0:
+            return None
 
-        print('Monthly report created.')
+        robustness_df = create_robustness_report(self.closed_positions, self.sorted_pair_list, path_count=self.config.monte_carlo_paths,
+                                                 method=self.config.monte_carlo_method, workers=self.config.workers)
 
-        return pd.DataFrame(monthly_report_list)
+        # Same scaling as the MonthlyReport, from the capital per trade of the FinalReport rows
+        capital_per_trade = self.final_report_df.set_index("Pair count")["Capital used per trade"]
+        scaling_factors = capital_per_trade.reindex(robustness_df["Pair count"]).to_numpy() / self.original_capital_per_trade
 
-    def create_combined_report(self):
-        return pd.concat([self.final_report_df, self.monthly_report_df.drop(columns=["Pair count"])], axis=1)
+        money_columns = [column for column in robustness_df.columns if column.startswith(("Net profit", "Max drawdown"))]
+        robustness_df[money_columns] = robustness_df[money_columns].mul(scaling_factors, axis=0)
+
+        print('Robustness report created.')
+
+        return robustness_df
+
+    @instrumented("stage")
+    def create_diversified_report(self) -> pd.DataFrame | None:
+        # The FinalReport of the pairs chosen greedily for the net profit and drawdown of their merged equity curve, skipped if no bucket length is set
+        if not self.config.diversified_bucket:
+            return None
+
+        diversified_pair_list = create_diversified_pair_list(self.closed_positions, self.base_report_df["Pair name"].tolist(),
+                                                             self.config.max_final_report_pairs, bucket=self.config.diversified_bucket,
+                                                             drawdown_weight=self.config.diversified_drawdown_weight)
+
+        diversified_report_df = create_prefix_metrics(self.closed_positions, diversified_pair_list, timeframe=self.config.equity_curve_timeframe,
+                                                      concurrency_threshold=self.config.concurrent_positions_threshold, workers=self.config.workers)
+        diversified_report_df = self.scale_final_report(diversified_report_df)
+
+        # The pair each row adds to the ones before it
+        diversified_report_df.insert(1, "Added pair", [diversified_pair_list[pair_count - 1] for pair_count in diversified_report_df["Pair count"]])
+
+        print('Diversified report created.')
+
+        return diversified_report_df
+
+    @instrumented("stage")
+    def create_pair_correlation_report(self) -> pd.DataFrame | None:
+        # How the monthly net profits and open positions of every two pairs line up, skipped if no number of neighbours is set
+        if self.config.pair_correlation_top_k is None:
+            return None
+
+        ranked_pair_list = self.base_report_df["Pair name"].tolist()
+        monthly_net_profits = self.month_coverage.monthly_net_profits[pd.Index(self.pair_list).get_indexer(ranked_pair_list)]
+
+        pair_correlation_df = create_pair_correlation_report(self.closed_positions, ranked_pair_list, monthly_net_profits,
+                                                             top_k=self.config.pair_correlation_top_k, bucket=self.config.pair_overlap_bucket)
+
+        print('Pair correlation report created.')
+
+        return pair_correlation_df
@@ -0,0 +1,225 @@
+import copy
+import hashlib
+import os
+import pickle
+
+import numpy as np
+import pandas as pd
+
+from reports.base_report_utils import calc_total_months
+from reports.gp_report import Report
+from reports.instrumentation import instrumented
+from reports.positions_io import cast_position_columns, load_positions
+from reports.positions_store import PositionsStore, open_statuses
+from reports.report_config import ReportConfig
+from reports.streaming import StreamingPairMetrics
+
+# Bumped whenever the layout of the stored state changes, so that older state files are rebuilt instead of read
+state_version = 4
+
+# The columns identifying the last ingested row of a positions file
+fingerprint_columns = ["Pair name", "Type", "Status", "Entry time", "Exit time", "Net profit"]
+
+# The columns of the closed positions kept in the state for the FinalReport merges
+closed_position_columns = ["Pair name", "Status", "Entry time", "Exit time", "Net profit", "Capital used"]
+
+
+def get_state_path(file_path: str, position_type: str | None, state_dir: str) -> str:
+    # One state file per positions file and position type
+    source_key = hashlib.blake2b(f"{os.path.abspath(file_path)}:{(position_type or '').lower()}".encode(), digest_size=8).hexdigest()
+    return os.path.join(state_dir, f"{source_key}.pkl")
+
+
+def get_row_fingerprint(position_row: pd.Series) -> tuple:
+    return tuple(str(position_row.get(column)) for column in fingerprint_columns)
+
+
+def read_excel_rows(file_path: str, first_row: int) -> pd.DataFrame:
+    """
+    Read the rows of the first sheet of an xlsx file from first_row on. The sheet is streamed through openpyxl's read-only mode, which only builds the
+    values of the rows from first_row on, but still has to scan the XML of the rows before them, as an xlsx sheet has no index of where its rows start.
+    """
+    import openpyxl
+
+    workbook = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        sheet = workbook.worksheets[0]
+        header = next(sheet.iter_rows(max_row=1, values_only=True))
+        rows = [row for row in sheet.iter_rows(min_row=first_row + 2, max_col=len(header), values_only=True) if any(value is not None for value in row)]
+    finally:
+        workbook.close()
+
+    return pd.DataFrame(rows, columns=header)
+
+
+def read_positions_rows(file_path: str, first_row: int) -> pd.DataFrame:
+    """
+    Read the rows of a positions file from first_row (0 being the first row after the header) to its end. CSV and xlsx rows before first_row are skipped
+    by the reader instead of being turned into a DataFrame, and Parquet files are sliced after reading their columns. Only CSV and Parquet files are
+    read in proportion to the new rows, an Excel file is still scanned from its first row, see read_excel_rows.
+    """
+    extension = os.path.splitext(file_path)[1].lower()
+
+    if extension == ".csv":
+        positions_df = pd.read_csv(file_path, skiprows=range(1, first_row + 1))
+    elif extension == ".xlsx":
+        positions_df = read_excel_rows(file_path, first_row)
+    elif extension == ".xls":
+        positions_df = pd.read_excel(file_path, skiprows=range(1, first_row + 1))
+    elif extension == ".parquet":
+        positions_df = pd.read_parquet(file_path).iloc[first_row:].reset_index(drop=True)
+    else:
+        raise ValueError(f"Unsupported positions file type: {file_path}")
+
+    return cast_position_columns(positions_df)
+
+
+def create_incremental_state(position_type: str | None) -> dict:
+    return {
+        "version": state_version,
+        "position_type": position_type,
+        "ingested_rows": 0,
+        "last_row_fingerprint": None,
+        "pair_metrics": StreamingPairMetrics(),
+        "closed_positions_df": pd.DataFrame(columns=closed_position_columns),
+        "original_capital_per_trade": None
+    }
+
+
+def load_incremental_state(state_path: str) -> dict | None:
+    # The stored state, or None if there's none or it was written by an older layout
+    if not os.path.exists(state_path):
+        return None
+
+    with open(state_path, "rb") as file:
+        state = pickle.load(file)
+
+    return state if state.get("version") == state_version else None
+
+
+def save_incremental_state(state: dict, state_path: str):
+    os.makedirs(os.path.dirname(state_path) or ".", exist_ok=True)
+
+    # Written next to the old state and then swapped in, so that an interrupted run never leaves a half-written state behind
+    with open(f"{state_path}.tmp", "wb") as file:
+        pickle.dump(state, file, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(f"{state_path}.tmp", state_path)
+
+
+@instrumented("stage")
+def update_incremental_state(state: dict, new_positions: pd.DataFrame, chunk_size: int = 100_000):
+    """
+    Ingest the rows appended to the positions file since the last run. The per-pair totals, monthly buckets, streak tails and equity curve states are
+    moved forward through StreamingPairMetrics, and the closed positions are appended to the ones kept for the FinalReport.
+
+    The new rows don't have to enter after the ingested ones, e.g. closed positions exported in the order of their exit times. Only the positions of
+    every pair have to stay in order, see StreamingPairMetrics.get_unordered_pairs, and the pairs a new position breaks that order for are recalculated
+    from their stored closed positions instead of being moved forward.
+
+    Args:
+        state (dict): The state, see create_incremental_state, updated in place.
+        new_positions (pd.DataFrame): The new rows, in the order of the file.
+        chunk_size (int): The number of positions added to the accumulators at a time.
+    """
+    if len(new_positions) == 0:
+        return
+
+    state["ingested_rows"] += len(new_positions)
+    state["last_row_fingerprint"] = get_row_fingerprint(new_positions.iloc[-1])
+
+    if state["position_type"]:
+        new_positions = new_positions[new_positions["Type"].str.lower() == state["position_type"].lower()]
+    new_positions = new_positions.sort_values(["Entry time"], kind="stable")
+
+    if len(new_positions) == 0:
+        return
+
+    if state["original_capital_per_trade"] is None:
+        state["original_capital_per_trade"] = new_positions["Capital used"].iloc[0]
+
+    new_closed_positions = new_positions.loc[~new_positions["Status"].isin(open_statuses), closed_position_columns]
+    state["closed_positions_df"] = pd.concat([state["closed_positions_df"], new_closed_positions], ignore_index=True) \
+        if len(state["closed_positions_df"]) > 0 else new_closed_positions.reset_index(drop=True)
+
+    pair_metrics = state["pair_metrics"]
+    pair_metrics.update_time_span(new_positions["Entry time"].min(), new_positions["Exit time"].max())
+    unordered_pairs = pair_metrics.get_unordered_pairs(new_positions)
+
+    # The rows of the pairs still in order are moved forward. Rows entering before the ingested ones go in as a single chunk, as the exits of a pair
+    # are only final once all of its new positions are in.
+    ordered_positions = new_positions[~new_positions["Pair name"].isin(unordered_pairs)]
+    if len(ordered_positions) > 0 and ordered_positions["Entry time"].iloc[0].value < pair_metrics.last_entry_time:
+        pair_metrics.add_chunk(ordered_positions, check_order=False)
+    else:
+        for chunk_start in range(0, len(ordered_positions), chunk_size):
+            pair_metrics.add_chunk(ordered_positions.iloc[chunk_start:chunk_start + chunk_size])
+
+    # The other pairs are recalculated from all of their closed positions, in the entry time order a full run sorts the file in
+    if len(unordered_pairs) > 0:
+        closed_positions_df = state["closed_positions_df"]
+        pair_positions = closed_positions_df[closed_positions_df["Pair name"].isin(unordered_pairs)].sort_values(["Entry time"], kind="stable")
+
+        unordered_pair_metrics = StreamingPairMetrics()
+        for chunk_start in range(0, len(pair_positions), chunk_size):
+            unordered_pair_metrics.add_chunk(pair_positions.iloc[chunk_start:chunk_start + chunk_size])
+        pair_metrics.replace_pairs(unordered_pair_metrics)
+
+
+def read_new_positions(all_positions_file: str, state: dict) -> pd.DataFrame | None:
+    # The rows appended since the state was stored, or None if the rows it ingested don't end where they used to, i.e. the file wasn't only appended to
+    if state["ingested_rows"] == 0:
+        return read_positions_rows(all_positions_file, 0)
+
+    positions_rows = read_positions_rows(all_positions_file, state["ingested_rows"] - 1)
+    if len(positions_rows) == 0 or get_row_fingerprint(positions_rows.iloc[0]) != state["last_row_fingerprint"]:
+        return None
+
+    return positions_rows.iloc[1:]
+
+
+def create_incremental_report(all_positions_file: str, config: ReportConfig, state_dir: str) -> Report:
+    """
+    Create the reports of a positions file that only had rows appended since the last incremental run, from the state stored by that run. Only the new
+    rows are read and ingested, after which the BaseReport comes from the stored per-pair accumulators, and the Final and Monthly reports from the stored
+    closed positions, without parsing the whole file. The first run, and any run on a file whose last ingested row isn't where it used to be, builds the
+    state from the whole file.
+
+    The file is expected to only be appended to. Rows are taken in as they are when first read, so edits to earlier rows, e.g. positions that were still
+    open when ingested and closed later, aren't picked up until the state is rebuilt by removing it from state_dir.
+
+    Args:
+        all_positions_file (str): The positions file.
+        config (ReportConfig): The report settings.
+        state_dir (str): The folder holding the stored states.
+
+    Returns:
+        Report: The report, with the stored state standing in for the steps that would need all the positions.
+    """
+    state_path = get_state_path(all_positions_file, config.position_type, state_dir)
+    state = load_incremental_state(state_path)
+
+    new_positions = read_new_positions(all_positions_file, state) if state is not None else None
+    if new_positions is not None:
+        update_incremental_state(state, new_positions)
+        print(f"Ingested {len(new_positions)} new rows of {all_positions_file}")
+    else:
+        print(f"Building the incremental state of {all_positions_file}")
+        state = create_incremental_state(config.position_type)
+        update_incremental_state(state, load_positions(all_positions_file, cache_dir=config.positions_cache_dir))
+
+    save_incremental_state(state, state_path)
+
+    # The steps of the report that would otherwise read the whole positions file. create_pair_metrics flushes the buffered exits, so it runs on a copy
+    # and the stored accumulators keep waiting for the positions still to come.
+    pair_metrics = state["pair_metrics"]
+    total_month_list = calc_total_months(pd.DataFrame({"Entry time": [pair_metrics.min_entry_time], "Exit time": [pair_metrics.max_exit_time]}))
+    shared_state = {
+        "create_pair_metrics_df": copy.deepcopy(pair_metrics).create_pair_metrics(),
+        "filter_closed_positions": PositionsStore.from_positions_df(state["closed_positions_df"], month_list=total_month_list,
+                                                                    float_dtype=np.float32 if config.float32_profits else np.float64).sort_by_entry_time(),
+        "create_total_month_list": total_month_list,
+        "create_pair_list": np.asarray(pair_metrics.pair_list, dtype=object)[pair_metrics.get_pair_order()].tolist(),
+        "get_original_capital_per_trade": state["original_capital_per_trade"]
+    }
+
+    return Report(all_positions_file, config=config.updated({"stream": False}), shared_state=shared_state)
@@ -0,0 +1,146 @@
+import functools
+import json
+import os
+import platform
+import threading
+import time
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# Whether the instrumented functions record their calls, set with the --profile runtime arg or the GP_PROFILE environment variable
+enabled = os.environ.get("GP_PROFILE", "").lower() not in ("", "0", "false", "no")
+
+# The recorded calls, in the order they finished, and the nesting depth of the calls that are running
+records: list[dict] = []
+call_depth = threading.local()
+
+# Start of the clock the records' start times are relative to
+clock_origin = time.perf_counter()
+
+
+def enable():
+    global enabled
+    enabled = True
+
+
+def calc_max_rss_mb() -> float | None:
+    # The peak resident memory of the process so far, ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    if resource is None:
+        return None
+
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss / 1024 ** 2 if platform.system() == "Darwin" else max_rss / 1024
+
+
+def count_rows(value) -> int | None:
+    # The number of rows of a DataFrame, array or list, or of the first item of a tuple of them, None for anything else
+    if isinstance(value, tuple):
+        return count_rows(value[0]) if value else None
+    if hasattr(value, "shape") and len(value.shape) > 0:
+        return int(value.shape[0])
+    if isinstance(value, list):
+        return len(value)
+
+    return None
+
+
+def instrumented(category: str = "helper"):
+    """
+    Decorator recording the wall time, CPU time, peak RSS and input/output row counts of every call of a function while instrumentation is enabled.
+    While it's disabled, the only cost of a call is checking the enabled flag.
+
+    Args:
+        category (str): "stage" for the steps of a report run, "helper" for the metric functions they call.
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return function(*args, **kwargs)
+
+            depth = getattr(call_depth, "value", 0)
+            call_depth.value = depth + 1
+
+            wall_start = time.perf_counter()
+            cpu_start = time.process_time()
+            try:
+                result = function(*args, **kwargs)
+            finally:
+                call_depth.value = depth
+
+            wall_seconds = time.perf_counter() - wall_start
+            cpu_seconds = time.process_time() - cpu_start
+
+            # The rows of the first argument that has them, skipping self for methods
+            input_rows = next((rows for rows in map(count_rows, list(args) + list(kwargs.values())) if rows is not None), None)
+
+            records.append({
+                "name": function.__qualname__,
+                "category": category,
+                "start_seconds": wall_start - clock_origin,
+                "wall_seconds": wall_seconds,
+                "cpu_seconds": cpu_seconds,
+                "max_rss_mb": calc_max_rss_mb(),
+                "input_rows": input_rows,
+                "output_rows": count_rows(result),
+                "depth": depth,
+                "pid": os.getpid(),
+                "thread": threading.get_ident()
+            })
+
+            if category == "stage":
+                print(f"{function.__qualname__}: {wall_seconds:.3f}s")
+
+            return result
+
+        return wrapper
+
+    return decorator
+
+
+def summarize_records(call_records: list[dict]) -> list[dict]:
+    # The number of calls and the total times of every instrumented function, the slowest first
+    summaries = {}
+    for record in call_records:
+        summary = summaries.setdefault(record["name"], {"name": record["name"], "category": record["category"], "calls": 0, "wall_seconds": 0.0,
+                                                         "cpu_seconds": 0.0, "max_rss_mb": None})
+        summary["calls"] += 1
+        summary["wall_seconds"] += record["wall_seconds"]
+        summary["cpu_seconds"] += record["cpu_seconds"]
+        if record["max_rss_mb"] is not None:
+            summary["max_rss_mb"] = max(summary["max_rss_mb"] or 0, record["max_rss_mb"])
+
+    return sorted(summaries.values(), key=lambda summary: -summary["wall_seconds"])
+
+
+def write_profile(output_dir: str, first_record: int = 0):
+    """
+    Write the records since first_record to output_dir, as profile.json with every call and a per-function summary, and as profile.trace.json in the
+    Chrome trace event format, which can be opened in chrome://tracing or ui.perfetto.dev.
+
+    Args:
+        output_dir (str): The folder to write the files to, usually the reports' output folder.
+        first_record (int): The index of the first record to write, e.g. the number of records when the report run started.
+    """
+    call_records = records[first_record:]
+
+    with open(f"{output_dir}/profile.json", "w") as file:
+        json.dump({"summary": summarize_records(call_records), "calls": call_records}, file, indent=2)
+
+    trace_events = [{
+        "name": record["name"],
+        "cat": record["category"],
+        "ph": "X",
+        "ts": record["start_seconds"] * 1e6,
+        "dur": record["wall_seconds"] * 1e6,
+        "pid": record["pid"],
+        "tid": record["thread"],
+        "args": {"cpu_seconds": record["cpu_seconds"], "max_rss_mb": record["max_rss_mb"], "input_rows": record["input_rows"],
+                 "output_rows": record["output_rows"]}
+    } for record in call_records]
+
+    with open(f"{output_dir}/profile.trace.json", "w") as file:
+        json.dump({"traceEvents": trace_events, "displayTimeUnit": "ms"}, file)
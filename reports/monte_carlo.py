@@ -0,0 +1,141 @@
+import numpy as np
+import pandas as pd
+
+from reports.instrumentation import instrumented
+from reports.parallel import map_shared_chunks
+from reports.positions_store import PositionsStore
+
+# The ways the trades of a pair count are resampled: drawn with replacement, or the same trades in a random order
+resampling_methods = ("bootstrap", "shuffle")
+
+# The largest number of trade values resampled at a time, which bounds the size of the path matrices
+max_chunk_values = 10_000_000
+
+
+def draw_resample_indices(trade_count: int, path_count: int, method: str, random_generator: np.random.Generator) -> np.ndarray:
+    # A paths x trades matrix of trade indices, every row being one resampled trade sequence
+    if method == "bootstrap":
+        return random_generator.integers(0, trade_count, size=(path_count, trade_count))
+    if method == "shuffle":
+        return random_generator.permuted(np.broadcast_to(np.arange(trade_count), (path_count, trade_count)), axis=1)
+
+    raise ValueError(f"Unknown resampling method: {method}, choose from {', '.join(resampling_methods)}")
+
+
+def calc_path_stats(path_profits: np.ndarray) -> (np.ndarray, np.ndarray, np.ndarray):
+    """
+    Calculate the net profit, max drawdown and winrate of many trade sequences at once, one per row of path_profits. The equity curve of a sequence is
+    the cumulative sum of its trades and its drawdowns are measured from the running peak, starting at the first trade like calc_segment_drawdowns.
+
+    Returns:
+        (np.ndarray, np.ndarray, np.ndarray): The net profit, max drawdown and winrate of every sequence.
+    """
+    equity_curves = np.cumsum(path_profits, axis=1)
+    max_drawdowns = (np.maximum.accumulate(equity_curves, axis=1) - equity_curves).max(axis=1, initial=0)
+
+    return equity_curves[:, -1], max_drawdowns, (path_profits > 0).mean(axis=1) * 100
+
+
+@instrumented()
+def simulate_path_chunk(pair_ranks: np.ndarray, net_profits: np.ndarray, pair_count: int, chunk_index: int, path_count: int, method: str = "bootstrap",
+                        seed: int = 0) -> (np.ndarray, np.ndarray, np.ndarray):
+    """
+    Resample the trades of the first pair_count pairs path_count times and calculate the stats of every path, see calc_path_stats. Every chunk draws from
+    its own generator, seeded by seed, pair_count and chunk_index, so that the paths don't depend on how the chunks are spread over processes.
+
+    Args:
+        pair_ranks (np.ndarray): The rank of every position's pair, i.e. the pair count from which it's included minus 1.
+        net_profits (np.ndarray): The net profits of the positions, in entry time order.
+        pair_count (int): The number of pairs whose trades are resampled.
+        chunk_index (int): The index of the chunk among the chunks of pair_count.
+        path_count (int): The number of paths of the chunk.
+        method (str): One of resampling_methods.
+        seed (int): The seed of the simulation.
+
+    Returns:
+        (np.ndarray, np.ndarray, np.ndarray): The net profit, max drawdown and winrate of every path.
+    """
+    trade_profits = net_profits[pair_ranks < pair_count]
+    random_generator = np.random.default_rng([seed, pair_count, chunk_index])
+
+    return calc_path_stats(trade_profits[draw_resample_indices(len(trade_profits), path_count, method, random_generator)])
+
+
+def summarize_paths(path_values: np.ndarray, column_name: str, quantiles: tuple) -> dict:
+    # The mean and the quantiles of a metric over the paths, e.g. "Net profit P5"
+    return {f"{column_name} mean": path_values.mean(), **{f"{column_name} P{quantile * 100:g}": value
+                                                          for quantile, value in zip(quantiles, np.quantile(path_values, quantiles))}}
+
+
+@instrumented()
+def create_robustness_report(closed_positions: PositionsStore, sorted_pair_list: list, path_count: int = 1000, method: str = "bootstrap",
+                             quantiles: tuple = (0.05, 0.5, 0.95), seed: int = 0, workers: int = 1) -> pd.DataFrame:
+    """
+    Measure how much the FinalReport pair counts depend on the order and luck of their trades. For every count N of the first pairs of sorted_pair_list,
+    the merged trades are resampled into path_count trade sequences, by bootstrapping or shuffling, and the net profit, max drawdown and winrate of the
+    sequences are summarized by their mean and quantiles. The paths of a chunk are drawn as one index matrix and their equity curves and drawdowns are
+    cumulative sums and maxima along its rows, and with more than one worker the chunks are spread over a process pool.
+
+    Args:
+        closed_positions (PositionsStore): The closed positions, sorted by entry time.
+        sorted_pair_list (list): The pairs in the order they're added in.
+        path_count (int): The number of resampled paths of every pair count.
+        method (str): One of resampling_methods.
+        quantiles (tuple): The quantiles of every metric to report.
+        seed (int): The seed of the simulation.
+        workers (int): The number of worker processes.
+
+    Returns:
+        pd.DataFrame: One row per pair count with positions, with its observed net profit, trade order max drawdown and winrate and the summaries of
+            their resampled values. The profits are unscaled.
+    """
+    if method not in resampling_methods:
+        raise ValueError(f"Unknown resampling method: {method}, choose from {', '.join(resampling_methods)}")
+
+    pair_ranks = closed_positions.get_pair_ranks(sorted_pair_list)
+    in_pair_list = pair_ranks >= 0
+    position_arrays = {"pair_ranks": pair_ranks[in_pair_list], "net_profits": closed_positions.net_profits[in_pair_list].astype(float)}
+
+    # The pair counts with positions, and the chunks of paths of every one of them, sized so that a chunk's path matrix stays below max_chunk_values
+    trade_counts = np.cumsum(np.bincount(position_arrays["pair_ranks"], minlength=len(sorted_pair_list)))
+    chunk_kwargs_list = []
+    for pair_count, trade_count in enumerate(trade_counts, start=1):
+        if trade_count == 0:
+            continue
+
+        chunk_path_count = max(1, min(path_count, max_chunk_values // trade_count))
+        for chunk_index, first_path in enumerate(range(0, path_count, chunk_path_count)):
+            chunk_kwargs_list.append({"pair_count": pair_count, "chunk_index": chunk_index, "path_count": min(chunk_path_count, path_count - first_path),
+                                      "method": method, "seed": seed})
+
+    if workers > 1 and len(chunk_kwargs_list) > 1:
+        chunk_stats = map_shared_chunks(simulate_path_chunk, position_arrays, chunk_kwargs_list, workers)
+    else:
+        chunk_stats = [simulate_path_chunk(**position_arrays, **chunk_kwargs) for chunk_kwargs in chunk_kwargs_list]
+
+    path_stats_by_pair_count = {}
+    for chunk_kwargs, path_stats in zip(chunk_kwargs_list, chunk_stats):
+        path_stats_by_pair_count.setdefault(chunk_kwargs["pair_count"], []).append(path_stats)
+
+    robustness_rows = []
+
+    for pair_count, chunk_path_stats in path_stats_by_pair_count.items():
+        path_net_profits, path_max_drawdowns, path_winrates = (np.concatenate(path_values) for path_values in zip(*chunk_path_stats))
+
+        # The observed values, with the trades in their entry time order
+        observed_net_profit, observed_max_drawdown, observed_winrate = calc_path_stats(
+            position_arrays["net_profits"][position_arrays["pair_ranks"] < pair_count][np.newaxis, :])
+
+        robustness_rows.append({
+            "Pair count": pair_count,
+            "Number of positions - total": int(trade_counts[pair_count - 1]),
+            "Net profit - total": observed_net_profit[0],
+            **summarize_paths(path_net_profits, "Net profit", quantiles),
+            "Probability of a loss (%)": (path_net_profits < 0).mean() * 100,
+            "Max drawdown - trade order": observed_max_drawdown[0],
+            **summarize_paths(path_max_drawdowns, "Max drawdown", quantiles),
+            "Winrate - total": observed_winrate[0],
+            **summarize_paths(path_winrates, "Winrate", quantiles)
+        })
+
+    return pd.DataFrame.from_dict(robustness_rows)
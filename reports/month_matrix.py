@@ -0,0 +1,141 @@
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from reports.instrumentation import instrumented
+
+# The number of set bits in every byte value, for counting the active months of a packed bitmap
+byte_bit_counts = np.unpackbits(np.arange(256, dtype=np.uint8)[:, np.newaxis], axis=1).sum(axis=1)
+
+
+def calc_month_codes(times: np.ndarray) -> np.ndarray:
+    # Number of months since 1970-01, so that the months of datetimes can be compared and subtracted as integers
+    return np.asarray(times).astype("datetime64[ns]").astype("datetime64[M]").astype(np.int64)
+
+
+def bin_pair_months(pair_codes: np.ndarray, month_indices: np.ndarray, net_profits: np.ndarray, pair_count: int,
+                    month_count: int) -> (np.ndarray, np.ndarray):
+    # The pair x month net profit and position count matrices of positions whose exit months are already indices into the month list
+    in_month_list = (month_indices >= 0) & (month_indices < month_count)
+
+    pair_month_indices = np.asarray(pair_codes)[in_month_list].astype(np.int64) * month_count + month_indices[in_month_list]
+
+    monthly_net_profits = np.bincount(pair_month_indices, weights=np.asarray(net_profits, dtype=float)[in_month_list], minlength=pair_count * month_count)
+    monthly_position_counts = np.bincount(pair_month_indices, minlength=pair_count * month_count)
+
+    return monthly_net_profits.reshape(pair_count, month_count), monthly_position_counts.reshape(pair_count, month_count)
+
+
+def count_bits(packed_bits: np.ndarray) -> np.ndarray:
+    # The number of set bits in the last axis of a packed bitmap, i.e. of every row of a 2D one
+    return byte_bit_counts[packed_bits].sum(axis=-1)
+
+
+@dataclass
+class MonthCoverage:
+    """
+    The monthly net profits of every pair, and which months every pair had positions in as a pairs x months bitmap packed 8 months to a byte. Both come
+    from a single bincount over the (pair, month) codes of the positions, after which the missing months, the positive and negative months and the
+    performance of any set of pairs are bitwise ORs and sums over their rows, instead of going back to the positions. Rows are pair codes, and pair_rows
+    arguments are arrays of them, every row by default.
+    """
+    monthly_net_profits: np.ndarray
+    activity_bits: np.ndarray
+    month_count: int
+
+    @classmethod
+    def from_month_indices(cls, pair_codes: np.ndarray, month_indices: np.ndarray, net_profits: np.ndarray, pair_count: int,
+                           month_count: int) -> "MonthCoverage":
+        # The coverage of positions whose exit months are indices into the month list, months outside of it are left out
+        monthly_net_profits, monthly_position_counts = bin_pair_months(pair_codes, month_indices, net_profits, pair_count, month_count)
+        return cls(monthly_net_profits, np.packbits(monthly_position_counts > 0, axis=-1), month_count)
+
+    @classmethod
+    def from_exit_times(cls, pair_codes: np.ndarray, exit_times: np.ndarray, net_profits: np.ndarray, pair_count: int,
+                        month_list: pd.DatetimeIndex) -> "MonthCoverage":
+        # The coverage of positions by the month of their exit times, months outside of month_list are left out
+        month_count = len(month_list)
+        month_indices = calc_month_codes(exit_times) - calc_month_codes(month_list[:1])[0] if month_count > 0 else np.zeros(len(exit_times), dtype=int)
+
+        return cls.from_month_indices(pair_codes, month_indices, net_profits, pair_count, month_count)
+
+    def get_rows(self, pair_rows: np.ndarray | None) -> slice | np.ndarray:
+        return slice(None) if pair_rows is None else np.asarray(pair_rows, dtype=np.intp)
+
+    def calc_active_bits(self, pair_rows: np.ndarray | None = None) -> np.ndarray:
+        # The months any of the pairs had positions in, as a packed bitmap
+        return np.bitwise_or.reduce(self.activity_bits[self.get_rows(pair_rows)], axis=0)
+
+    def calc_missing_months(self, pair_rows: np.ndarray | None = None) -> int:
+        # The number of months none of the pairs had positions in
+        return self.month_count - int(count_bits(self.calc_active_bits(pair_rows)))
+
+    def calc_combined_net_profits(self, pair_rows: np.ndarray | None = None) -> np.ndarray:
+        return self.monthly_net_profits[self.get_rows(pair_rows)].sum(axis=0)
+
+    def calc_signed_months(self, pair_rows: np.ndarray | None = None) -> (int, int):
+        # The number of months the combined net profit of the pairs was positive and negative in
+        combined_net_profits = self.calc_combined_net_profits(pair_rows)
+        return int((combined_net_profits > 0).sum()), int((combined_net_profits < 0).sum())
+
+    def calc_performance(self, pair_rows: np.ndarray | None = None) -> float:
+        return float(calc_monthly_performance(self.calc_combined_net_profits(pair_rows)))
+
+    def calc_pair_missing_months(self) -> np.ndarray:
+        # The missing months of every pair on its own
+        return self.month_count - count_bits(self.activity_bits)
+
+    def calc_pair_performances(self) -> np.ndarray:
+        # The performance of every pair on its own
+        return calc_monthly_performance(self.monthly_net_profits)
+
+    def calc_prefix_missing_months(self, pair_rows: np.ndarray | None = None) -> np.ndarray:
+        # The missing months of the first 1..N pairs of pair_rows, from a running OR of their bitmap rows
+        return self.month_count - count_bits(np.bitwise_or.accumulate(self.activity_bits[self.get_rows(pair_rows)], axis=0))
+
+    def calc_prefix_monthly_net_profits(self, pair_rows: np.ndarray | None = None) -> np.ndarray:
+        # The combined monthly net profits of the first 1..N pairs of pair_rows, one row per pair count
+        return np.cumsum(self.monthly_net_profits[self.get_rows(pair_rows)], axis=0)
+
+    def calc_prefix_performances(self, pair_rows: np.ndarray | None = None) -> np.ndarray:
+        # The performance of the first 1..N pairs of pair_rows
+        return calc_monthly_performance(self.calc_prefix_monthly_net_profits(pair_rows))
+
+
+@instrumented()
+def create_month_coverage(closed_positions, pair_list: list) -> MonthCoverage:
+    """
+    Build the month coverage of the closed positions, with one row per pair of pair_list. It's calculated once per report and shared by every part of it
+    that needs per-month numbers, e.g. the MonthlyReport rows are its prefix monthly net profits in the order of the pairs' ranks.
+
+    Args:
+        closed_positions (PositionsStore): The positions that have been closed, whose month_list makes up the months of the coverage.
+        pair_list (list): The pairs making up the rows of the coverage.
+
+    Returns:
+        MonthCoverage: The monthly net profits and activity bitmap of every pair.
+    """
+    # Positions of pairs outside of pair_list get rank -1, which the bins leave out like months outside of month_list
+    pair_ranks = closed_positions.get_pair_ranks(pair_list)
+    month_indices = np.where(pair_ranks >= 0, closed_positions.exit_month_indices, -1)
+
+    return MonthCoverage.from_month_indices(np.maximum(pair_ranks, 0), month_indices, closed_positions.net_profits, len(pair_list),
+                                            len(closed_positions.month_list))
+
+
+def calc_monthly_performance(monthly_net_profits: np.ndarray) -> np.ndarray:
+    """
+    Calculate the performance, i.e. what percentage of the months with a non-zero net profit have had positive net profits, from monthly net profits. A 2D
+    matrix gives the performance of each of its rows. NaN is returned if there are no such months.
+    """
+    positive_months = (np.asarray(monthly_net_profits) > 0).sum(axis=-1)
+    negative_months = (np.asarray(monthly_net_profits) < 0).sum(axis=-1)
+    traded_months = positive_months + negative_months
+
+    return np.divide(positive_months * 100, traded_months, out=np.full(np.shape(traded_months), np.nan), where=traded_months > 0)
+
+
+def calc_monthly_missing_months(monthly_position_counts: np.ndarray) -> np.ndarray:
+    # The number of months with no positions, for a vector of monthly position counts or each row of a matrix of them
+    return (np.asarray(monthly_position_counts) == 0).sum(axis=-1)
@@ -0,0 +1,126 @@
+import numpy as np
+import pandas as pd
+
+from reports.equity_utils import build_segment_equity_curves, calc_segment_drawdowns
+from reports.instrumentation import instrumented
+from reports.month_matrix import MonthCoverage
+from reports.parallel import map_shared_chunks, split_balanced_chunks
+from reports.positions_store import PositionsStore
+from reports.trade_runs import calc_segment_trade_stats
+
+
+@instrumented()
+def calc_pair_metric_arrays(pair_codes: np.ndarray, net_profits: np.ndarray, exit_times: np.ndarray, pair_count: int, month_list: pd.DatetimeIndex,
+                            timeframe: str | None = None) -> dict:
+    """
+    Calculate the BaseReport metrics of every pair in one vectorized pass, as reductions over the pair segments of the position arrays.
+
+    Args:
+        pair_codes (np.ndarray): The pair code of every position, sorted, from 0 to pair_count - 1.
+        net_profits (np.ndarray): The net profits of the positions, in entry time order within each pair.
+        exit_times (np.ndarray): The exit times of the positions.
+        pair_count (int): The number of pairs.
+        month_list (pd.DatetimeIndex): The months spanned by the positions, as returned by calc_total_months.
+        timeframe (str | None): The equity curve resolution passed to build_segment_equity_curves.
+
+    Returns:
+        dict: The BaseReport columns other than the pair name, each an array with one value per pair code.
+    """
+    is_win = net_profits > 0
+    is_loss = net_profits < 0
+
+    # Totals
+    position_counts = np.bincount(pair_codes, minlength=pair_count)
+    net_profit_totals = np.bincount(pair_codes, weights=net_profits, minlength=pair_count)
+    gross_profits = np.bincount(pair_codes, weights=np.where(is_win, net_profits, 0), minlength=pair_count)
+    gross_losses = np.bincount(pair_codes, weights=np.where(is_loss, net_profits, 0), minlength=pair_count)
+    win_counts = np.bincount(pair_codes, weights=is_win, minlength=pair_count)
+
+    largest_profits = np.zeros(pair_count)
+    np.maximum.at(largest_profits, pair_codes, np.where(is_win, net_profits, 0))
+
+    # Net profit and activity of every pair in every month of month_list, from the exit month of each position
+    month_coverage = MonthCoverage.from_exit_times(pair_codes, exit_times, net_profits, pair_count, month_list)
+
+    # Performance means what percentage of months with a non-zero net profit have had positive net profits.
+    performances = month_coverage.calc_pair_performances()
+    missing_months = month_coverage.calc_pair_missing_months()
+
+    # Drawdowns of the per-pair equity curves
+    curve_codes, curve_times, equity_curves = build_segment_equity_curves(pair_codes, exit_times, net_profits, timeframe=timeframe)
+    max_drawdowns, drawdown_durations, drawdown_recoveries = calc_segment_drawdowns(curve_codes, curve_times, equity_curves, pair_count)
+
+    # Win and loss streaks, average loss and trade order drawdowns, in entry time order
+    trade_stats = calc_segment_trade_stats(net_profits, pair_codes, pair_count)
+
+    return {
+        "Number of positions - total": position_counts,
+        "Performance - total": performances,
+        "Winrate - total": win_counts / position_counts * 100,
+        "Net profit - total": net_profit_totals,
+        "Gross profit - total": gross_profits,
+        "Gross loss - total": gross_losses,
+        "Largest profit in a trade - total": largest_profits,
+        "Average profit per trade - total": net_profit_totals / position_counts,
+        "Total months": np.full(pair_count, len(month_list)),
+        "Missing months": missing_months,
+        "Max drawdown - total": max_drawdowns,
+        "Max drawdown duration (days)": drawdown_durations,
+        "Max drawdown recovery (days)": drawdown_recoveries,
+        **trade_stats
+    }
+
+
+def calc_pair_metric_chunk(pair_codes: np.ndarray, net_profits: np.ndarray, exit_times: np.ndarray, pair_offsets: np.ndarray, first_pair: int,
+                           last_pair: int, month_list: pd.DatetimeIndex, timeframe: str | None = None) -> dict:
+    # The metrics of the pairs first_pair..last_pair - 1, whose positions are a contiguous slice of the pair sorted arrays
+    positions = slice(pair_offsets[first_pair], pair_offsets[last_pair])
+
+    return calc_pair_metric_arrays(pair_codes[positions] - first_pair, net_profits[positions], exit_times[positions], last_pair - first_pair, month_list,
+                                   timeframe=timeframe)
+
+
+@instrumented()
+def create_pair_metrics(closed_positions: PositionsStore, pair_list: list, timeframe: str | None = None, workers: int = 1) -> pd.DataFrame:
+    """
+    Calculate the BaseReport metrics of every pair. The positions are sorted once by pair, keeping their entry time order within each pair, and
+    every metric is then calculated as a reduction over the pair segments instead of filtering the positions once per pair. With more than one worker, the
+    pairs are split into chunks of roughly equal numbers of positions, which are calculated in a process pool over arrays published in shared memory.
+
+    Args:
+        closed_positions (PositionsStore): The closed positions, i.e. without the open_statuses ones, sorted by entry time.
+        pair_list (list): The pairs to include in the report, in the order of the report rows.
+        timeframe (str | None): The equity curve resolution passed to build_segment_equity_curves.
+        workers (int): The number of worker processes.
+
+    Returns:
+        pd.DataFrame: One row per pair of pair_list that has closed positions, without the Score column.
+    """
+    month_list = closed_positions.month_list
+
+    # The rank of every position's pair in pair_list, renumbered to the pairs that have positions, which keeps them in the order of pair_list
+    pair_ranks = closed_positions.get_pair_ranks(pair_list)
+    in_pair_list = pair_ranks >= 0
+    ranks_with_positions, pair_codes = np.unique(pair_ranks[in_pair_list], return_inverse=True)
+    pair_count = len(ranks_with_positions)
+
+    # Sort by pair, the stable sort keeps the entry time order within each pair
+    order = np.argsort(pair_codes, kind="stable")
+    pair_codes = pair_codes[order]
+    net_profits = closed_positions.net_profits[in_pair_list].astype(float)[order]
+    exit_times = closed_positions.exit_datetimes[in_pair_list][order]
+
+    if workers > 1 and pair_count > 1:
+        pair_position_counts = np.bincount(pair_codes, minlength=pair_count)
+        pair_offsets = np.concatenate([[0], np.cumsum(pair_position_counts)])
+
+        chunk_metrics = map_shared_chunks(calc_pair_metric_chunk,
+                                          {"pair_codes": pair_codes, "net_profits": net_profits, "exit_times": exit_times, "pair_offsets": pair_offsets},
+                                          [{"first_pair": first_pair, "last_pair": last_pair, "month_list": month_list, "timeframe": timeframe}
+                                           for first_pair, last_pair in split_balanced_chunks(pair_position_counts, workers * 4)],
+                                          workers)
+        pair_metrics = {column: np.concatenate([metrics[column] for metrics in chunk_metrics]) for column in chunk_metrics[0]}
+    else:
+        pair_metrics = calc_pair_metric_arrays(pair_codes, net_profits, exit_times, pair_count, month_list, timeframe=timeframe)
+
+    return pd.DataFrame({"Pair name": np.asarray(pair_list, dtype=object)[ranks_with_positions], **pair_metrics})
@@ -0,0 +1,192 @@
+import numpy as np
+import pandas as pd
+
+from reports.instrumentation import instrumented
+from reports.positions_store import PositionsStore, missing_time
+
+
+def calc_correlation_matrix(monthly_net_profits: np.ndarray) -> np.ndarray:
+    """
+    Calculate the Pearson correlation of the monthly net profits of every two pairs, one pair per row of monthly_net_profits. The rows are centered and
+    divided by their norms, after which all the correlations are a single product of the matrix with its transpose. Pairs whose monthly net profits
+    don't vary have NaN correlations.
+
+    Returns:
+        np.ndarray: The pairs x pairs correlation matrix.
+    """
+    centered_net_profits = monthly_net_profits - monthly_net_profits.mean(axis=1, keepdims=True)
+    norms = np.linalg.norm(centered_net_profits, axis=1)
+    normalized_net_profits = np.divide(centered_net_profits, norms[:, np.newaxis], out=np.full(centered_net_profits.shape, np.nan),
+                                       where=norms[:, np.newaxis] > 0)
+
+    return np.clip(normalized_net_profits @ normalized_net_profits.T, -1, 1)
+
+
+def merge_pair_intervals(pair_codes: np.ndarray, entry_times: np.ndarray, exit_times: np.ndarray) -> (np.ndarray, np.ndarray, np.ndarray):
+    """
+    Merge the overlapping positions of every pair into the intervals that pair had any positions open in, in a single sweep over the positions sorted by
+    pair and entry time: a position starts a new interval unless it enters before the latest exit of the earlier positions of its pair.
+
+    Args:
+        pair_codes (np.ndarray): The pair code of every position.
+        entry_times (np.ndarray): The int64 entry times of the positions.
+        exit_times (np.ndarray): The int64 exit times of the positions, not before their entry times.
+
+    Returns:
+        (np.ndarray, np.ndarray, np.ndarray): The pair code, start and end of every merged interval, sorted by pair and start.
+    """
+    position_count = len(pair_codes)
+    if position_count == 0:
+        return pair_codes, entry_times, exit_times
+
+    sort_order = np.lexsort((entry_times, pair_codes))
+    pair_codes, entry_times, exit_times = pair_codes[sort_order].astype(np.int64), entry_times[sort_order], exit_times[sort_order]
+
+    # The latest exit so far within every pair, as a running maximum of the exit ranks offset by the pair codes, so that it restarts at every pair
+    sorted_exit_times = np.sort(exit_times)
+    exit_keys = pair_codes * position_count + np.searchsorted(sorted_exit_times, exit_times)
+    latest_exit_times = sorted_exit_times[np.maximum.accumulate(exit_keys) - pair_codes * position_count]
+
+    interval_starts = np.r_[True, (pair_codes[1:] != pair_codes[:-1]) | (entry_times[1:] > latest_exit_times[:-1])]
+    interval_last_positions = np.r_[np.flatnonzero(interval_starts)[1:] - 1, position_count - 1]
+
+    return pair_codes[interval_starts], entry_times[interval_starts], latest_exit_times[interval_last_positions]
+
+
+@instrumented()
+def create_pair_open_time_matrix(closed_positions: PositionsStore, pair_list: list, bucket: str = "1h") -> (np.ndarray, int):
+    """
+    Calculate how long every pair had positions open in every time bucket, from the first entry to the last exit of the positions. The merged open
+    intervals of every pair are swept once: the partial buckets at their ends are added with a bincount, and the buckets they cover whole with a
+    difference array whose cumulative sum marks them.
+
+    Args:
+        closed_positions (PositionsStore): The closed positions.
+        pair_list (list): The pairs making up the rows of the matrix, positions of other pairs are left out.
+        bucket (str): The length of a bucket as a fixed pandas frequency string, e.g. "1h".
+
+    Returns:
+        (np.ndarray, int): The pairs x buckets matrix of open time in nanoseconds, as float32, and the length of the positions' time span in nanoseconds.
+    """
+    pair_ranks = closed_positions.get_pair_ranks(pair_list)
+    is_valid = (pair_ranks >= 0) & (closed_positions.entry_times != missing_time) & (closed_positions.exit_times >= closed_positions.entry_times)
+
+    pair_codes, starts, ends = merge_pair_intervals(pair_ranks[is_valid], closed_positions.entry_times[is_valid], closed_positions.exit_times[is_valid])
+    pair_count = len(pair_list)
+    if len(starts) == 0:
+        return np.zeros((pair_count, 0), dtype=np.float32), 0
+
+    first_time = starts.min()
+    bucket_nanos = pd.tseries.frequencies.to_offset(bucket).nanos
+    starts, ends = starts - first_time, ends - first_time
+    span = int(ends.max())
+    bucket_count = span // bucket_nanos + 1
+
+    start_buckets, end_buckets = starts // bucket_nanos, ends // bucket_nanos
+    in_one_bucket = start_buckets == end_buckets
+
+    # The open time in the first and last bucket of every interval, or all of it if both are the same bucket
+    partial_indices = np.r_[pair_codes * bucket_count + start_buckets, (pair_codes * bucket_count + end_buckets)[~in_one_bucket]]
+    partial_times = np.r_[np.where(in_one_bucket, ends - starts, (start_buckets + 1) * bucket_nanos - starts),
+                          (ends - end_buckets * bucket_nanos)[~in_one_bucket]]
+    open_times = np.bincount(partial_indices, weights=partial_times, minlength=pair_count * bucket_count)
+
+    # The buckets strictly between the first and last one are open the whole time
+    change_offsets = (pair_codes * (bucket_count + 1))[~in_one_bucket]
+    full_bucket_changes = np.bincount(np.r_[change_offsets + start_buckets[~in_one_bucket] + 1, change_offsets + end_buckets[~in_one_bucket]],
+                                      weights=np.repeat([1.0, -1.0], len(change_offsets)), minlength=pair_count * (bucket_count + 1))
+    full_buckets = np.cumsum(full_bucket_changes.reshape(pair_count, bucket_count + 1), axis=1)[:, :bucket_count]
+
+    open_time_matrix = open_times.reshape(pair_count, bucket_count) + full_buckets * bucket_nanos
+
+    return open_time_matrix.astype(np.float32), span
+
+
+def calc_overlap_matrix(open_time_matrix: np.ndarray, bucket: str, span: int) -> np.ndarray:
+    """
+    Calculate the percentage of the time span that every two pairs both had positions open, as a product of the open time matrix with its transpose.
+    In a bucket that either pair has positions open all of, the overlap is exact. Otherwise it's estimated as if their open times in the bucket were
+    independent, so the estimate gets closer to the exact one as the buckets get shorter. The diagonal, the time of every pair itself, is always exact.
+
+    Args:
+        open_time_matrix (np.ndarray): The pairs x buckets open times, see create_pair_open_time_matrix.
+        bucket (str): The length of the buckets of the matrix.
+        span (int): The length of the time span in nanoseconds.
+
+    Returns:
+        np.ndarray: The pairs x pairs overlap matrix, its diagonal being the percentage of the time every pair had positions open.
+    """
+    if span <= 0:
+        return np.zeros((len(open_time_matrix), len(open_time_matrix)))
+
+    # Scaling the rows first keeps the float32 product in a comfortable range
+    bucket_nanos = pd.tseries.frequencies.to_offset(bucket).nanos
+    open_shares = open_time_matrix / np.float32(bucket_nanos)
+
+    overlaps = (open_shares @ open_shares.T).astype(float) * bucket_nanos / span * 100
+    np.fill_diagonal(overlaps, open_time_matrix.sum(axis=1, dtype=float) / span * 100)
+
+    return overlaps
+
+
+def select_neighbours(correlations: np.ndarray, top_k: int = 0) -> np.ndarray:
+    """
+    The other pairs of every pair in the order of their correlation with it, highest first and NaN correlations last, cut to the top_k first ones if
+    top_k is more than 0.
+
+    Returns:
+        np.ndarray: A pairs x neighbours matrix of the rows of the neighbours.
+    """
+    pair_count = len(correlations)
+    if pair_count < 2:
+        return np.zeros((pair_count, 0), dtype=np.intp)
+
+    # NaN sorts last, which also puts every pair itself after its neighbours
+    sort_keys = -correlations
+    np.fill_diagonal(sort_keys, np.nan)
+    neighbour_count = min(top_k, pair_count - 1) if top_k > 0 else pair_count - 1
+
+    neighbour_orders = np.argsort(sort_keys, axis=1, kind="stable")
+    neighbour_orders = neighbour_orders[neighbour_orders != np.arange(pair_count)[:, np.newaxis]].reshape(pair_count, pair_count - 1)
+
+    return neighbour_orders[:, :neighbour_count]
+
+
+@instrumented()
+def create_pair_correlation_report(closed_positions: PositionsStore, ranked_pair_list: list, monthly_net_profits: np.ndarray, top_k: int = 0,
+                                   bucket: str = "1h") -> pd.DataFrame:
+    """
+    Report how the pairs move together: the correlation of the monthly net profits of every two pairs and the percentage of the time both had positions
+    open, see calc_correlation_matrix and calc_overlap_matrix. Both are pairs x pairs matrix products, so they stay fast for thousands of pairs.
+
+    Args:
+        closed_positions (PositionsStore): The closed positions.
+        ranked_pair_list (list): The pairs, in the order of the BaseReport ranking.
+        monthly_net_profits (np.ndarray): The pairs x months net profits, in the order of ranked_pair_list.
+        top_k (int): The number of most correlated neighbours reported for every pair, all of them if it's 0.
+        bucket (str): The length of the time buckets the open times are measured on.
+
+    Returns:
+        pd.DataFrame: One row per pair and neighbour, the pairs in the order of ranked_pair_list and their neighbours from the most correlated one down.
+    """
+    correlations = calc_correlation_matrix(np.asarray(monthly_net_profits, dtype=float))
+
+    open_time_matrix, span = create_pair_open_time_matrix(closed_positions, ranked_pair_list, bucket=bucket)
+    overlaps = calc_overlap_matrix(open_time_matrix, bucket, span)
+
+    neighbour_rows = select_neighbours(correlations, top_k)
+    neighbour_count = neighbour_rows.shape[1]
+    pair_rows = np.repeat(np.arange(len(ranked_pair_list)), neighbour_count)
+    neighbour_rows = neighbour_rows.ravel()
+
+    pair_names = np.asarray(ranked_pair_list, dtype=object)
+
+    return pd.DataFrame({
+        "Pair name": pair_names[pair_rows],
+        "Neighbour rank": np.tile(np.arange(1, neighbour_count + 1), len(ranked_pair_list)),
+        "Neighbour": pair_names[neighbour_rows],
+        "Monthly net profit correlation": correlations[pair_rows, neighbour_rows],
+        "Time both open (%)": overlaps[pair_rows, neighbour_rows],
+        "Time pair open (%)": np.diag(overlaps)[pair_rows],
+        "Time neighbour open (%)": np.diag(overlaps)[neighbour_rows]
+    })
@@ -0,0 +1,84 @@
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+# The shared arrays as seen from inside a worker process, set up once per worker by attach_shared_arrays
+worker_arrays: dict = {}
+worker_shared_memories: list = []
+
+
+def publish_shared_arrays(arrays: dict) -> (list, dict):
+    """
+    Copy numpy arrays into shared memory blocks, so that worker processes can map them instead of receiving a pickled copy with every task.
+
+    Args:
+        arrays (dict): The arrays to publish, by name.
+
+    Returns:
+        (list, dict): The shared memory blocks, which the caller has to close and unlink, and the specs needed by attach_shared_arrays.
+    """
+    shared_memories = []
+    array_specs = {}
+
+    for array_name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        shared_memory_block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        np.ndarray(array.shape, dtype=array.dtype, buffer=shared_memory_block.buf)[...] = array
+
+        shared_memories.append(shared_memory_block)
+        array_specs[array_name] = (shared_memory_block.name, array.shape, array.dtype.str)
+
+    return shared_memories, array_specs
+
+
+def attach_shared_arrays(array_specs: dict):
+    # Worker initializer, maps the published arrays into the worker's globals
+    for array_name, (shared_memory_name, shape, dtype) in array_specs.items():
+        shared_memory_block = shared_memory.SharedMemory(name=shared_memory_name)
+        worker_shared_memories.append(shared_memory_block)
+        worker_arrays[array_name] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shared_memory_block.buf)
+
+
+def run_shared_chunk(function, chunk_kwargs: dict):
+    return function(**worker_arrays, **chunk_kwargs)
+
+
+def map_shared_chunks(function, arrays: dict, chunk_kwargs_list: list[dict], workers: int) -> list:
+    """
+    Run function over chunks of work in a process pool. The arrays are published once through shared memory and passed to every call as keyword
+    arguments, along with the chunk's own keyword arguments.
+
+    Args:
+        function: A module-level function, called as function(**arrays, **chunk_kwargs).
+        arrays (dict): The arrays shared by all the chunks, by name.
+        chunk_kwargs_list (list[dict]): The keyword arguments of every chunk.
+        workers (int): The number of worker processes.
+
+    Returns:
+        list: The results of the chunks, in the order of chunk_kwargs_list.
+    """
+    shared_memories, array_specs = publish_shared_arrays(arrays)
+
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=attach_shared_arrays, initargs=(array_specs,)) as pool:
+            return list(pool.map(run_shared_chunk, [function] * len(chunk_kwargs_list), chunk_kwargs_list))
+    finally:
+        for shared_memory_block in shared_memories:
+            shared_memory_block.close()
+            shared_memory_block.unlink()
+
+
+def split_balanced_chunks(item_weights: np.ndarray, chunk_count: int) -> list[tuple]:
+    """
+    Split the range of items into at most chunk_count contiguous (start, stop) chunks with roughly the same total weight each, e.g. pairs weighted by their
+    number of positions.
+    """
+    cumulative_weights = np.cumsum(item_weights, dtype=float)
+    if len(cumulative_weights) == 0:
+        return []
+
+    targets = cumulative_weights[-1] * np.arange(1, chunk_count) / chunk_count
+    boundaries = np.unique(np.concatenate([[0], np.searchsorted(cumulative_weights, targets, side="right"), [len(cumulative_weights)]]))
+
+    return [(int(start), int(stop)) for start, stop in zip(boundaries[:-1], boundaries[1:]) if stop > start]
@@ -0,0 +1,117 @@
+import numpy as np
+import pandas as pd
+
+from reports.instrumentation import instrumented
+from reports.positions_store import PositionsStore
+
+
+@instrumented()
+def create_bucket_net_profit_matrix(closed_positions: PositionsStore, pair_list: list, bucket: str = "1D") -> np.ndarray:
+    """
+    Bucket the net profits of the closed positions into a pair x time matrix by their exit times, with a single bincount over the combined (pair, bucket)
+    codes. The buckets run from the first to the last exit of the positions.
+
+    Args:
+        closed_positions (PositionsStore): The closed positions.
+        pair_list (list): The pairs making up the rows of the matrix, positions of other pairs are left out.
+        bucket (str): The length of a bucket as a fixed pandas frequency string, e.g. "1D" or "4h".
+
+    Returns:
+        np.ndarray: The net profit of every pair in every bucket.
+    """
+    pair_ranks = closed_positions.get_pair_ranks(pair_list)
+    in_pair_list = pair_ranks >= 0
+    exit_times = closed_positions.exit_times[in_pair_list]
+
+    if len(exit_times) == 0:
+        return np.zeros((len(pair_list), 0))
+
+    bucket_nanos = pd.tseries.frequencies.to_offset(bucket).nanos
+    bucket_indices = (exit_times - exit_times.min()) // bucket_nanos
+    bucket_count = int(bucket_indices.max()) + 1
+
+    bucket_net_profits = np.bincount(pair_ranks[in_pair_list].astype(np.int64) * bucket_count + bucket_indices,
+                                     weights=closed_positions.net_profits[in_pair_list].astype(float), minlength=len(pair_list) * bucket_count)
+
+    return bucket_net_profits.reshape(len(pair_list), bucket_count)
+
+
+def calc_curve_objectives(equity_curves: np.ndarray, drawdown_weight: float) -> (np.ndarray, np.ndarray, np.ndarray):
+    """
+    Calculate the objective of many equity curves at once, one per row of equity_curves: the net profit minus drawdown_weight times the max drawdown,
+    which is measured from the running peak of the curve from its first bucket on.
+
+    Returns:
+        (np.ndarray, np.ndarray, np.ndarray): The objective, net profit and max drawdown of every curve.
+    """
+    net_profits = equity_curves[:, -1] if equity_curves.shape[1] > 0 else np.zeros(len(equity_curves))
+    max_drawdowns = (np.maximum.accumulate(equity_curves, axis=1) - equity_curves).max(axis=1, initial=0)
+
+    return net_profits - drawdown_weight * max_drawdowns, net_profits, max_drawdowns
+
+
+@instrumented()
+def search_diversified_pairs(bucket_net_profits: np.ndarray, pair_count: int, drawdown_weight: float = 1.0,
+                             candidate_chunk_size: int | None = None) -> list[int]:
+    """
+    Choose pairs one at a time, each time adding the one whose positions most improve the objective of the merged equity curve, see calc_curve_objectives.
+    Unlike a prefix of the BaseReport ranking, a pair whose losing stretches line up with those of the chosen pairs is passed over for one that offsets
+    them. The equity curve of every pair is a cumulative sum taken once, and the merged curve of the chosen pairs plus a candidate is the running curve of
+    the chosen pairs plus the candidate's, so every step evaluates all the remaining candidates with one addition over a candidates x buckets matrix.
+
+    Args:
+        bucket_net_profits (np.ndarray): The pair x time bucket net profit matrix, see create_bucket_net_profit_matrix.
+        pair_count (int): The number of pairs to choose.
+        drawdown_weight (float): How much a unit of max drawdown costs against a unit of net profit.
+        candidate_chunk_size (int | None): The number of candidates evaluated per matrix, which bounds its size. By default enough for a matrix of about
+            10M values.
+
+    Returns:
+        list[int]: The rows of the chosen pairs, in the order they were chosen.
+    """
+    row_count, bucket_count = bucket_net_profits.shape
+    candidate_chunk_size = candidate_chunk_size or max(1, 10_000_000 // max(bucket_count, 1))
+
+    pair_equity_curves = np.cumsum(bucket_net_profits, axis=1)
+
+    is_chosen = np.zeros(row_count, dtype=bool)
+    chosen_equity_curve = np.zeros(bucket_count)
+    chosen_rows = []
+
+    for _ in range(min(pair_count, row_count)):
+        candidate_rows = np.flatnonzero(~is_chosen)
+
+        candidate_objectives = np.concatenate([
+            calc_curve_objectives(chosen_equity_curve + pair_equity_curves[candidate_rows[chunk_start:chunk_start + candidate_chunk_size]],
+                                  drawdown_weight)[0]
+            for chunk_start in range(0, len(candidate_rows), candidate_chunk_size)])
+
+        # The first of the best candidates, so that ties go to the pair ranked higher in the BaseReport
+        chosen_row = int(candidate_rows[np.argmax(candidate_objectives)])
+        is_chosen[chosen_row] = True
+        chosen_equity_curve += pair_equity_curves[chosen_row]
+        chosen_rows.append(chosen_row)
+
+    return chosen_rows
+
+
+@instrumented()
+def create_diversified_pair_list(closed_positions: PositionsStore, ranked_pair_list: list, pair_count: int, bucket: str = "1D",
+                                 drawdown_weight: float = 1.0) -> list:
+    """
+    The pairs chosen by search_diversified_pairs on the bucketed net profits of the closed positions.
+
+    Args:
+        closed_positions (PositionsStore): The closed positions.
+        ranked_pair_list (list): The candidate pairs, in the order of the BaseReport ranking, which breaks ties.
+        pair_count (int): The number of pairs to choose.
+        bucket (str): The length of the time buckets, see create_bucket_net_profit_matrix.
+        drawdown_weight (float): How much a unit of max drawdown costs against a unit of net profit.
+
+    Returns:
+        list: The chosen pairs, in the order they were chosen.
+    """
+    bucket_net_profits = create_bucket_net_profit_matrix(closed_positions, ranked_pair_list, bucket=bucket)
+    chosen_rows = search_diversified_pairs(bucket_net_profits, pair_count, drawdown_weight=drawdown_weight)
+
+    return [ranked_pair_list[chosen_row] for chosen_row in chosen_rows]
@@ -0,0 +1,166 @@
+import hashlib
+import os
+
+import pandas as pd
+
+from reports.instrumentation import instrumented
+
+try:
+    import pyarrow  # noqa: F401
+
+    CACHE_FORMAT = "parquet"
+except ImportError:
+    CACHE_FORMAT = "pkl"
+
+DEFAULT_CACHE_DIR = ".positions_cache"
+
+# Column types of the positions sheet. Columns that aren't listed here are kept as they are parsed.
+datetime_columns = ["Entry time", "Exit time"]
+float_columns = ["Net profit", "Capital used"]
+
+
+@instrumented("stage")
+def read_positions_file(file_path: str) -> pd.DataFrame:
+    """
+    Parse a positions file based on its extension. Excel, CSV and Parquet files are supported.
+
+    Args:
+        file_path (str): The path of the positions file.
+
+    Returns:
+        pd.DataFrame: The positions, with the datetime and float columns cast to their proper types.
+    """
+    extension = os.path.splitext(file_path)[1].lower()
+
+    if extension in (".xlsx", ".xls"):
+        positions_df = pd.read_excel(file_path)
+    elif extension == ".csv":
+        positions_df = pd.read_csv(file_path)
+    elif extension == ".parquet":
+        positions_df = pd.read_parquet(file_path)
+    else:
+        raise ValueError(f"Unsupported positions file type: {file_path}")
+
+    return cast_position_columns(positions_df)
+
+
+def parse_position_times(values: pd.Series) -> pd.Series:
+    """
+    Parse a time column into naive datetime64[ns] times. Timezone aware times keep their local wall times, which is how the reports have always read
+    them, including text times whose UTC offsets differ from row to row, e.g. across a daylight saving change.
+    """
+    try:
+        times = pd.to_datetime(values)
+    except ValueError:
+        if not pd.api.types.is_string_dtype(values):
+            raise
+        times = pd.to_datetime(values.str.replace(r"(?:Z|[+-]\d{2}:?\d{2})$", "", regex=True))
+
+    if times.dt.tz is not None:
+        times = times.dt.tz_localize(None)
+
+    return times.astype("datetime64[ns]")
+
+
+def cast_position_columns(positions_df: pd.DataFrame) -> pd.DataFrame:
+    for column in datetime_columns:
+        if column in positions_df.columns:
+            positions_df[column] = parse_position_times(positions_df[column])
+
+    for column in float_columns:
+        if column in positions_df.columns:
+            positions_df[column] = positions_df[column].astype(float)
+
+    return positions_df
+
+
+def iter_positions_chunks(file_path: str, chunk_size: int = 100_000):
+    """
+    Read a positions file in chunks of at most chunk_size rows, without loading all of it. CSV files are read with pandas' chunked reader and Parquet files
+    batch by batch through pyarrow. Excel files can't be read in chunks.
+
+    Args:
+        file_path (str): The path of the positions file.
+        chunk_size (int): The maximum number of rows per chunk.
+
+    Yields:
+        pd.DataFrame: The chunks, with the same column types as read_positions_file.
+    """
+    extension = os.path.splitext(file_path)[1].lower()
+
+    if extension == ".csv":
+        for positions_chunk in pd.read_csv(file_path, chunksize=chunk_size):
+            yield cast_position_columns(positions_chunk)
+
+    elif extension == ".parquet":
+        import pyarrow.parquet
+
+        for record_batch in pyarrow.parquet.ParquetFile(file_path).iter_batches(batch_size=chunk_size):
+            yield cast_position_columns(record_batch.to_pandas())
+
+    else:
+        raise ValueError(f"Positions can only be streamed from CSV and Parquet files: {file_path}")
+
+
+def calc_file_hash(file_path: str, chunk_size: int = 1 << 20) -> str:
+    file_hash = hashlib.blake2b(digest_size=16)
+
+    with open(file_path, "rb") as file:
+        while chunk := file.read(chunk_size):
+            file_hash.update(chunk)
+
+    return file_hash.hexdigest()
+
+
+def get_cache_path(file_path: str, cache_dir: str) -> str:
+    """
+    Build the path of the cached copy of a positions file. The name is made of a digest of the absolute source path, so that all the cached versions of
+    one source can be found, and a digest of its size, mtime and content, so that any change to the source produces a different name.
+    """
+    file_stat = os.stat(file_path)
+    source_key = hashlib.blake2b(os.path.abspath(file_path).encode(), digest_size=8).hexdigest()
+    version_key = hashlib.blake2b(f"{file_stat.st_size}:{file_stat.st_mtime_ns}:{calc_file_hash(file_path)}".encode(), digest_size=8).hexdigest()
+
+    return os.path.join(cache_dir, f"{source_key}-{version_key}.{CACHE_FORMAT}")
+
+
+@instrumented("stage")
+def load_positions(file_path: str, cache_dir: str | None = DEFAULT_CACHE_DIR) -> pd.DataFrame:
+    """
+    Load a positions file through the columnar cache. The first load of a file parses it and stores a typed copy in cache_dir, and later loads of the same
+    unchanged file read that copy instead. Cached copies of older versions of the file are removed when a new one is written. Parquet inputs are already
+    columnar, so they are read directly.
+
+    Args:
+        file_path (str): The path of the positions file.
+        cache_dir (str | None): The folder holding the cached copies, or None to always parse the source file.
+
+    Returns:
+        pd.DataFrame: The positions.
+    """
+    if cache_dir is None or file_path.lower().endswith(".parquet"):
+        return read_positions_file(file_path)
+
+    cache_path = get_cache_path(file_path, cache_dir)
+
+    if os.path.exists(cache_path):
+        if CACHE_FORMAT == "parquet":
+            return pd.read_parquet(cache_path)
+        return pd.read_pickle(cache_path)
+
+    positions_df = read_positions_file(file_path)
+
+    os.makedirs(cache_dir, exist_ok=True)
+
+    # Remove the cached copies of the previous versions of this file
+    source_key = os.path.basename(cache_path).split("-")[0]
+    for cache_file_name in os.listdir(cache_dir):
+        if cache_file_name.startswith(f"{source_key}-"):
+            os.remove(os.path.join(cache_dir, cache_file_name))
+
+    if CACHE_FORMAT == "parquet":
+        positions_df.to_parquet(cache_path, index=False)
+    else:
+        positions_df.to_pickle(cache_path)
+
+    return positions_df
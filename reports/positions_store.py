@@ -0,0 +1,172 @@
+from dataclasses import dataclass, replace
+
+import numpy as np
+import pandas as pd
+
+from reports.month_matrix import calc_month_codes
+
+# Statuses of the positions that haven't been closed yet, and are left out of the reports
+open_statuses = ["ACTIVE", "ENTERED"]
+
+# The int64 value of NaT, i.e. a missing time
+missing_time = np.iinfo(np.int64).min
+
+
+@dataclass
+class PositionsStore:
+    """
+    A compact, column-oriented copy of the positions sheet for the metric calculations. The pair names, types and statuses are stored once as categories
+    and referred to by integer codes, the closed positions are a precomputed mask, the times are int64 nanoseconds since the epoch along with the exit
+    month as an index into month_list (-1 or len(month_list) for exits outside of it), and the money columns can be kept as float32. Selecting the
+    positions of a list of pairs is then an integer lookup instead of comparing strings. Positions read from several files are told apart by their
+    source, the "Source" column of load_source_positions, which is a single "" source otherwise.
+    """
+    pair_names: np.ndarray
+    pair_codes: np.ndarray
+    type_names: np.ndarray
+    type_codes: np.ndarray
+    source_names: np.ndarray
+    source_codes: np.ndarray
+    status_names: np.ndarray
+    status_codes: np.ndarray
+    is_closed: np.ndarray
+    entry_times: np.ndarray
+    exit_times: np.ndarray
+    exit_month_indices: np.ndarray
+    net_profits: np.ndarray
+    capital_used: np.ndarray
+    month_list: pd.DatetimeIndex
+
+    @classmethod
+    def from_positions_df(cls, positions_df: pd.DataFrame, month_list: pd.DatetimeIndex | None = None, float_dtype=np.float64) -> "PositionsStore":
+        """
+        Encode a positions DataFrame, keeping the order of its rows.
+
+        Args:
+            positions_df (pd.DataFrame): The positions.
+            month_list (pd.DatetimeIndex | None): The months the exit month indices count from, by default the months spanned by the positions, as
+                returned by calc_total_months.
+            float_dtype: The dtype of the net profit and capital columns, np.float32 halves their size at the cost of precision.
+
+        Returns:
+            PositionsStore: The encoded positions. The pair categories are in the order the pairs first appear in.
+        """
+        pair_codes, pair_names = pd.factorize(positions_df["Pair name"])
+        type_codes, type_names = pd.factorize(positions_df["Type"].str.lower()) if "Type" in positions_df.columns else \
+            (np.zeros(len(positions_df), dtype=int), pd.Index([""]))
+        source_codes, source_names = pd.factorize(positions_df["Source"]) if "Source" in positions_df.columns else \
+            (np.zeros(len(positions_df), dtype=int), pd.Index([""]))
+        status_codes, status_names = pd.factorize(positions_df["Status"])
+
+        entry_times = positions_df["Entry time"].to_numpy(dtype="datetime64[ns]").view(np.int64)
+        exit_times = positions_df["Exit time"].to_numpy(dtype="datetime64[ns]").view(np.int64)
+
+        if month_list is None:
+            month_list = calc_store_months(entry_times, exit_times)
+
+        return cls(
+            pair_names=np.asarray(pair_names, dtype=object),
+            pair_codes=pair_codes.astype(np.int32),
+            type_names=np.asarray(type_names, dtype=object),
+            type_codes=type_codes.astype(np.int8),
+            source_names=np.asarray(source_names, dtype=object),
+            source_codes=source_codes.astype(np.int16),
+            status_names=np.asarray(status_names, dtype=object),
+            status_codes=status_codes.astype(np.int8),
+            is_closed=~np.isin(np.asarray(status_names, dtype=object), open_statuses)[status_codes],
+            entry_times=entry_times,
+            exit_times=exit_times,
+            exit_month_indices=calc_month_indices(exit_times, month_list),
+            net_profits=positions_df["Net profit"].to_numpy(dtype=float_dtype),
+            capital_used=positions_df["Capital used"].to_numpy(dtype=float_dtype),
+            month_list=month_list
+        )
+
+    def __len__(self) -> int:
+        return len(self.pair_codes)
+
+    @property
+    def nbytes(self) -> int:
+        # The memory used by the per-position columns
+        return sum(column.nbytes for column in (self.pair_codes, self.type_codes, self.source_codes, self.status_codes, self.is_closed, self.entry_times,
+                                                self.exit_times, self.exit_month_indices, self.net_profits, self.capital_used))
+
+    @property
+    def entry_datetimes(self) -> np.ndarray:
+        return self.entry_times.view("datetime64[ns]")
+
+    @property
+    def exit_datetimes(self) -> np.ndarray:
+        return self.exit_times.view("datetime64[ns]")
+
+    def with_months(self, month_list: pd.DatetimeIndex | None = None) -> "PositionsStore":
+        # The same positions with their exit months counted from another month_list, by default the months spanned by the positions themselves
+        month_list = month_list if month_list is not None else calc_store_months(self.entry_times, self.exit_times)
+        return replace(self, exit_month_indices=calc_month_indices(self.exit_times, month_list), month_list=month_list)
+
+    def take(self, selection: np.ndarray) -> "PositionsStore":
+        # The positions picked by a boolean mask or an array of indices, in that order, with the same categories and month_list
+        return PositionsStore(
+            pair_names=self.pair_names,
+            pair_codes=self.pair_codes[selection],
+            type_names=self.type_names,
+            type_codes=self.type_codes[selection],
+            source_names=self.source_names,
+            source_codes=self.source_codes[selection],
+            status_names=self.status_names,
+            status_codes=self.status_codes[selection],
+            is_closed=self.is_closed[selection],
+            entry_times=self.entry_times[selection],
+            exit_times=self.exit_times[selection],
+            exit_month_indices=self.exit_month_indices[selection],
+            net_profits=self.net_profits[selection],
+            capital_used=self.capital_used[selection],
+            month_list=self.month_list
+        )
+
+    def filter_type(self, position_type: str | None) -> "PositionsStore":
+        # The positions of one type, compared through its code
+        if not position_type:
+            return self
+
+        type_code = pd.Index(self.type_names).get_indexer([position_type.lower()])[0]
+        return self.take(self.type_codes == type_code)
+
+    def filter_source(self, source: str | None) -> "PositionsStore":
+        # The positions of one source file, compared through its code
+        if source is None:
+            return self
+
+        source_code = pd.Index(self.source_names).get_indexer([source])[0]
+        return self.take(self.source_codes == source_code)
+
+    def closed(self) -> "PositionsStore":
+        return self.take(self.is_closed)
+
+    def sort_by_entry_time(self) -> "PositionsStore":
+        return self.take(np.argsort(self.entry_times, kind="stable"))
+
+    def get_pair_ranks(self, pair_list: list) -> np.ndarray:
+        """
+        The position of every position's pair in pair_list, -1 for pairs that aren't in it. The pair categories are looked up in pair_list once, after which
+        every position is a lookup by its pair code.
+        """
+        return pd.Index(pair_list).get_indexer(self.pair_names)[self.pair_codes] if len(self) > 0 else np.zeros(0, dtype=np.intp)
+
+
+def calc_store_months(entry_times: np.ndarray, exit_times: np.ndarray) -> pd.DatetimeIndex:
+    # The months from the earliest entry to the latest exit, the same as calc_total_months, from int64 nanosecond times
+    valid_exit_times = exit_times[exit_times != missing_time]
+    if len(entry_times) == 0 or len(valid_exit_times) == 0:
+        return pd.DatetimeIndex([])
+
+    return pd.date_range(start=pd.Timestamp(entry_times.min()).to_period("M").to_timestamp(),
+                         end=pd.Timestamp(valid_exit_times.max()).to_period("M").to_timestamp(), freq="MS")
+
+
+def calc_month_indices(exit_times: np.ndarray, month_list: pd.DatetimeIndex) -> np.ndarray:
+    # The index of every exit month in month_list, -1 for exits before it, including missing ones, and len(month_list) for exits after it
+    first_month_code = calc_month_codes(month_list[:1])[0] if len(month_list) > 0 else 0
+    month_indices = np.clip(calc_month_codes(exit_times.view("datetime64[ns]")) - first_month_code, -1, len(month_list))
+
+    return np.where(exit_times == missing_time, -1, month_indices).astype(np.int32)
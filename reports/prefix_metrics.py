@@ -0,0 +1,208 @@
+import numpy as np
+import pandas as pd
+
+from reports.concurrency import build_concurrency_events, calc_concurrency_stats
+from reports.equity_utils import calc_curve_drawdown
+from reports.instrumentation import instrumented
+from reports.month_matrix import MonthCoverage
+from reports.parallel import map_shared_chunks, split_balanced_chunks
+from reports.positions_store import PositionsStore
+from reports.trade_runs import TradeSequenceTree
+
+
+@instrumented()
+def calc_prefix_metric_rows(pair_ranks: np.ndarray, net_profits: np.ndarray, capital_used: np.ndarray, entry_times: np.ndarray, exit_times: np.ndarray,
+                            pair_count: int, month_list: pd.DatetimeIndex, timeframe: str | None = None, concurrency_threshold: int = 10,
+                            first_pair_count: int = 1, last_pair_count: int | None = None) -> list[dict]:
+    """
+    Calculate the FinalReport rows for the pair counts first_pair_count..last_pair_count. Instead of filtering the positions and recalculating everything
+    from scratch for every pair count, the positions of each pair are merged into a running state built from the previous pair counts: the totals and the
+    per-event profits and deltas the combined equity curve and concurrency sweep are formed from. The monthly numbers of every pair count are running sums
+    and ORs over the MonthCoverage rows of the pairs. Pairs before first_pair_count are only merged, which is cheap compared to calculating a row.
+
+    Not everything can be carried over from one pair count to the next. The drawdowns and concurrency peaks of the combined curves are maxima over them,
+    which a merged pair can lower as well as raise, so every row takes one cumulative sum over the events between the first and last one of the merged
+    positions. The positions of a merged pair also land in between the earlier ones in entry time order, splitting their streaks and shifting the trade
+    order equity after them, which a TradeSequenceTree over all the positions keeps up to date in O(log positions) per merged position. A row therefore
+    costs O(events) of vectorized work for the combined curves, while the totals, months, streaks and trade order drawdown cost O(positions x
+    log positions) for all the rows together.
+
+    Args:
+        pair_ranks (np.ndarray): The rank of every position's pair, i.e. the pair count from which it's included minus 1.
+        net_profits (np.ndarray): The net profits of the positions, in entry time order.
+        capital_used (np.ndarray): The capital used by the positions.
+        entry_times (np.ndarray): The entry times of the positions.
+        exit_times (np.ndarray): The exit times of the positions.
+        pair_count (int): The number of ranked pairs.
+        month_list (pd.DatetimeIndex): The months spanned by the positions, as returned by calc_total_months.
+        timeframe (str | None): The equity curve resolution, as used by build_equity_curve.
+        concurrency_threshold (int): The number of concurrent positions above which the time is reported.
+        first_pair_count (int): The first pair count to calculate a row for.
+        last_pair_count (int | None): The last pair count to calculate a row for, or None for pair_count.
+
+    Returns:
+        list[dict]: The unscaled FinalReport rows. Pair counts with no positions are skipped.
+    """
+    last_pair_count = pair_count if last_pair_count is None else last_pair_count
+
+    # The positions of each pair, keeping their entry time order
+    positions_by_pair = np.split(np.argsort(pair_ranks, kind="stable"), np.cumsum(np.bincount(pair_ranks, minlength=pair_count))[:-1])
+
+    is_win = net_profits > 0
+
+    # The performance and missing months of every pair count, from running sums and ORs over the monthly net profits and activity of the pairs
+    month_coverage = MonthCoverage.from_exit_times(pair_ranks, exit_times, net_profits, pair_count, month_list)
+    prefix_performances = month_coverage.calc_prefix_performances(np.arange(last_pair_count))
+    prefix_missing_months = month_coverage.calc_prefix_missing_months(np.arange(last_pair_count))
+
+    # Every distinct exit time of the positions is a point of the combined equity curves
+    event_times, event_indices = np.unique(exit_times, return_inverse=True)
+    event_offsets = event_times.astype("datetime64[ns]").view(np.int64)
+    grid_step = pd.tseries.frequencies.to_offset(timeframe).nanos if timeframe is not None else None
+
+    # Every distinct entry or exit time is an event of the concurrency sweep
+    concurrency_event_times, entry_events, exit_events = build_concurrency_events(entry_times, exit_times)
+
+    # The running state, holding the combination of the pairs merged so far
+    trade_sequence = TradeSequenceTree(net_profits)
+    event_profits = np.zeros(len(event_times))
+    total_number_of_positions = 0
+    total_net_profit = 0.0
+    total_gross_profit = 0.0
+    total_gross_loss = 0.0
+    total_wins = 0
+    total_losses = 0
+    total_largest_profit_per_position = 0.0
+    first_event = len(event_times)
+    last_event = -1
+    first_position = len(net_profits)
+    open_deltas = np.zeros(len(concurrency_event_times), dtype=int)
+    capital_deltas = np.zeros(len(concurrency_event_times))
+    first_concurrency_event = len(concurrency_event_times)
+    last_concurrency_event = -1
+
+    prefix_metrics_list = []
+
+    for current_pair_count, pair_positions in enumerate(positions_by_pair[:last_pair_count], start=1):
+        # Merge the positions of the next pair into the running state
+        pair_net_profits = net_profits[pair_positions]
+
+        trade_sequence.add(pair_positions)
+        np.add.at(event_profits, event_indices[pair_positions], pair_net_profits)
+        np.add.at(open_deltas, entry_events[pair_positions], 1)
+        np.add.at(open_deltas, exit_events[pair_positions], -1)
+        np.add.at(capital_deltas, entry_events[pair_positions], capital_used[pair_positions])
+        np.add.at(capital_deltas, exit_events[pair_positions], -capital_used[pair_positions])
+
+        total_number_of_positions += len(pair_positions)
+        total_net_profit += pair_net_profits.sum()
+        total_gross_profit += pair_net_profits[pair_net_profits > 0].sum()
+        total_gross_loss += pair_net_profits[pair_net_profits < 0].sum()
+        total_wins += int(is_win[pair_positions].sum())
+        total_losses += int((pair_net_profits < 0).sum())
+        total_largest_profit_per_position = max(total_largest_profit_per_position, pair_net_profits.max(initial=0))
+
+        if len(pair_positions) > 0:
+            first_position = min(first_position, pair_positions[0])
+            first_event = min(first_event, event_indices[pair_positions].min())
+            last_event = max(last_event, event_indices[pair_positions].max())
+            first_concurrency_event = min(first_concurrency_event, entry_events[pair_positions].min())
+            last_concurrency_event = max(last_concurrency_event, exit_events[pair_positions].max())
+
+        # If the combination has no positions or its row isn't requested, skip to the next pair
+        if total_number_of_positions == 0 or current_pair_count < first_pair_count:
+            continue
+
+        # The combined equity curve runs from the first to the last exit of the merged positions
+        curve_events = slice(first_event, last_event + 1)
+        if timeframe is None:
+            curve_times, equity_curve = event_times[curve_events], np.cumsum(event_profits[curve_events])
+        else:
+            # On the grid of build_equity_curve, which starts at the first exit, only the exits on a grid point move the curve, so its points are those
+            # exits plus the last grid point, which holds the final equity
+            grid_offsets = event_offsets[curve_events] - event_offsets[first_event]
+            on_grid = grid_offsets % grid_step == 0
+            curve_offsets, equity_curve = event_offsets[curve_events][on_grid], np.cumsum(event_profits[curve_events][on_grid])
+            last_grid_offset = event_offsets[first_event] + grid_offsets[-1] // grid_step * grid_step
+            if curve_offsets[-1] != last_grid_offset:
+                curve_offsets, equity_curve = np.append(curve_offsets, last_grid_offset), np.append(equity_curve, equity_curve[-1])
+            curve_times = curve_offsets.view("datetime64[ns]")
+
+        total_drawdown, drawdown_duration, drawdown_recovery = calc_curve_drawdown(curve_times, equity_curve)
+
+        # Concurrent positions, from the first entry to the last exit of the merged positions
+        concurrency_events = slice(first_concurrency_event, last_concurrency_event + 1)
+        average_concurrent_positions, peak_concurrent_positions, time_above_threshold, peak_engaged_capital = calc_concurrency_stats(
+            concurrency_event_times[concurrency_events], open_deltas[concurrency_events], capital_deltas[concurrency_events], concurrency_threshold)
+
+        prefix_metrics_list.append({
+            "Pair count": current_pair_count,
+            "Capital used per trade": capital_used[first_position],
+            "Number of positions - total": total_number_of_positions,
+            "Performance - total": float(prefix_performances[current_pair_count - 1]),
+            "Winrate - total": total_wins / total_number_of_positions * 100,
+            "Net profit - total": total_net_profit,
+            "Gross profit - total": total_gross_profit,
+            "Gross loss - total": total_gross_loss,
+            "Largest profit in a trade - total": total_largest_profit_per_position,
+            "Average profit per trade - total": total_net_profit / total_number_of_positions,
+            "Max drawdown - total": total_drawdown,
+            "Max drawdown duration (days)": drawdown_duration,
+            "Max drawdown recovery (days)": drawdown_recovery,
+            "Average loss per position - total": total_gross_loss / total_losses if total_losses > 0 else np.nan,
+            "Total months": len(month_list),
+            "Missing months": int(prefix_missing_months[current_pair_count - 1]),
+            "Average # of concurrent trades": average_concurrent_positions,
+            "Max # of concurrent trades": peak_concurrent_positions,
+            f"Time with more than {concurrency_threshold} concurrent trades (%)": time_above_threshold,
+            "Peak capital engaged - total": peak_engaged_capital,
+            # Win and loss streaks and trade order drawdown, in the entry time order of the merged positions
+            **trade_sequence.calc_stats()
+        })
+
+    return prefix_metrics_list
+
+
+@instrumented()
+def create_prefix_metrics(closed_positions: PositionsStore, sorted_pair_list: list, timeframe: str | None = None, concurrency_threshold: int = 10,
+                          workers: int = 1) -> pd.DataFrame:
+    """
+    Calculate the FinalReport metrics for the first 1..N pairs of sorted_pair_list, see calc_prefix_metric_rows. With more than one worker, the pair counts
+    are split into chunks of roughly equal cost, which are calculated in a process pool over arrays published in shared memory.
+
+    Args:
+        closed_positions (PositionsStore): The closed positions, i.e. without the open_statuses ones, sorted by entry time.
+        sorted_pair_list (list): The pairs in the order they're added in.
+        timeframe (str | None): The equity curve resolution, as used by build_equity_curve.
+        concurrency_threshold (int): The number of concurrent positions above which the time is reported.
+        workers (int): The number of worker processes.
+
+    Returns:
+        pd.DataFrame: One row per pair count, with the unscaled FinalReport columns.
+    """
+    pair_ranks = closed_positions.get_pair_ranks(sorted_pair_list)
+    in_pair_list = pair_ranks >= 0
+
+    position_arrays = {
+        "pair_ranks": pair_ranks[in_pair_list],
+        "net_profits": closed_positions.net_profits[in_pair_list].astype(float),
+        "capital_used": closed_positions.capital_used[in_pair_list].astype(float),
+        "entry_times": closed_positions.entry_datetimes[in_pair_list],
+        "exit_times": closed_positions.exit_datetimes[in_pair_list]
+    }
+    metric_kwargs = {"pair_count": len(sorted_pair_list), "month_list": closed_positions.month_list, "timeframe": timeframe,
+                     "concurrency_threshold": concurrency_threshold}
+
+    if workers > 1 and len(sorted_pair_list) > 1:
+        # The cost of a row grows with the number of positions merged by then
+        row_costs = np.cumsum(np.bincount(position_arrays["pair_ranks"], minlength=len(sorted_pair_list)))
+
+        chunk_rows = map_shared_chunks(calc_prefix_metric_rows, position_arrays,
+                                       [{**metric_kwargs, "first_pair_count": first_row + 1, "last_pair_count": last_row}
+                                        for first_row, last_row in split_balanced_chunks(row_costs, workers * 2)],
+                                       workers)
+        prefix_metrics_list = [row for rows in chunk_rows for row in rows]
+    else:
+        prefix_metrics_list = calc_prefix_metric_rows(**position_arrays, **metric_kwargs)
+
+    return pd.DataFrame.from_dict(prefix_metrics_list)
@@ -0,0 +1,104 @@
+from dataclasses import dataclass, fields, replace
+
+import constants
+
+
+@dataclass(frozen=True)
+class ReportConfig:
+    """
+    The settings of a single report run. The defaults come from constants.py, main.py fills them in from the runtime arguments and every scenario of a
+    batch run overrides some of them.
+    """
+    output_dir: str = f"{constants.output_root_dir}/latest"
+    position_type: str | None = None
+
+    # Only use the positions of this source of a multi-file run, see reports/sources.py
+    source: str | None = None
+
+    max_final_report_pairs: int = constants.max_final_report_pairs
+    capital_per_trade: float = constants.capital_per_trade
+    equity_curve_timeframe: str | None = constants.equity_curve_timeframe
+    concurrent_positions_threshold: int = constants.concurrent_positions_threshold
+    positions_cache_dir: str | None = constants.positions_cache_dir
+    weight_sweep_samples: int = constants.weight_sweep_samples
+    weight_sweep_spread: float = constants.weight_sweep_spread
+    monte_carlo_paths: int = constants.monte_carlo_paths
+    monte_carlo_method: str = constants.monte_carlo_method
+    diversified_bucket: str | None = constants.diversified_bucket
+    diversified_drawdown_weight: float = constants.diversified_drawdown_weight
+    pair_correlation_top_k: int | None = constants.pair_correlation_top_k
+    pair_overlap_bucket: str = constants.pair_overlap_bucket
+    walk_forward_train_months: int = constants.walk_forward_train_months
+    walk_forward_test_months: int = constants.walk_forward_test_months
+    walk_forward_step_months: int = constants.walk_forward_step_months
+
+    # The pairs combined in the Final and Monthly reports, in this order, instead of the top max_final_report_pairs pairs of the BaseReport
+    selected_pairs: tuple | None = None
+
+    # Number of worker processes for the BaseReport and FinalReport metrics, 1 calculates everything in the main process
+    workers: int = 1
+
+    # Whether to stream the positions file through per-pair accumulators instead of loading it whole
+    stream: bool = False
+
+    # Whether to only ingest the rows appended to the positions file since the last incremental run, see reports/incremental.py
+    incremental: bool = False
+
+    # Whether to keep the net profits and capital of the positions as float32 instead of float64, which makes the positions store smaller at the cost of
+    # precision in the last digits of the sums, see reports/positions_store.py
+    float32_profits: bool = False
+
+    # The reports to create, any of the names in Report.report_attributes
+    reports: tuple = constants.report_names
+
+    # The file formats the reports are written in, see reports/report_writers.py, and the number of files written at the same time
+    formats: tuple = ("xlsx",)
+    output_threads: int = constants.output_threads
+
+    # Whether to record the timings of the report stages and metric helpers and write them next to the reports, see reports/instrumentation.py
+    profile: bool = False
+
+    @classmethod
+    def from_args(cls, args) -> "ReportConfig":
+        # The config of a main.py run, from the arguments parsed by constants.create_arg_parser
+        walk_forward_months = args.walk_forward if args.walk_forward else (constants.walk_forward_train_months, constants.walk_forward_test_months,
+                                                                           constants.walk_forward_step_months)
+
+        return cls(output_dir=constants.get_output_dir(args.pl, args.output_dir),
+                   position_type=args.position_type if args.position_type else None,
+                   positions_cache_dir=None if args.no_cache else constants.positions_cache_dir,
+                   workers=max(args.workers, 1),
+                   stream=args.stream,
+                   incremental=args.incremental,
+                   float32_profits=args.float32,
+                   weight_sweep_samples=args.weight_sweep if args.weight_sweep is not None else constants.weight_sweep_samples,
+                   monte_carlo_paths=args.monte_carlo if args.monte_carlo is not None else constants.monte_carlo_paths,
+                   monte_carlo_method=args.monte_carlo_method,
+                   diversified_bucket=args.diversified if args.diversified else constants.diversified_bucket,
+                   pair_correlation_top_k=args.pair_correlation if args.pair_correlation is not None else constants.pair_correlation_top_k,
+                   walk_forward_train_months=walk_forward_months[0],
+                   walk_forward_test_months=walk_forward_months[1],
+                   walk_forward_step_months=walk_forward_months[2],
+                   reports=tuple(args.reports),
+                   formats=tuple(args.formats),
+                   profile=args.profile)
+
+    def updated(self, settings: dict) -> "ReportConfig":
+        """
+        Return a copy of the config with some of its settings replaced, e.g. by the entries of a scenario file.
+
+        Raises:
+            ValueError: If settings contains a name that isn't a setting of ReportConfig.
+        """
+        setting_names = {field.name for field in fields(self)}
+        unknown_settings = sorted(set(settings) - setting_names)
+        if unknown_settings:
+            raise ValueError(f"Unknown report settings: {', '.join(unknown_settings)}")
+
+        return replace(self, **settings)
+
+    @property
+    def metrics_key(self) -> tuple:
+        # The settings the unscaled per-pair metrics depend on. Reports with the same key can share them and only differ in how they are scaled and cut.
+        return (self.position_type.lower() if self.position_type else None, self.source, self.equity_curve_timeframe, self.concurrent_positions_threshold,
+                self.float32_profits)
@@ -0,0 +1,267 @@
+import io
+import json
+import os
+import socketserver
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import pandas as pd
+
+import constants
+from reports.gp_report import Report
+from reports.positions_io import load_positions
+from reports.report_config import ReportConfig
+from reports.report_writers import write_parquet
+
+
+def parse_bool(value: str) -> bool:
+    return value.lower() in ("1", "true", "yes")
+
+
+def parse_optional_str(value: str) -> str | None:
+    # An empty value, e.g. position_type=, resets the setting to None
+    return value or None
+
+
+# The ReportConfig settings a query can set, with the parser of their query string values. Settings that choose files, processes or output formats are
+# left to the service itself.
+query_setting_parsers = {
+    "position_type": parse_optional_str,
+    "max_final_report_pairs": int,
+    "capital_per_trade": float,
+    "equity_curve_timeframe": parse_optional_str,
+    "concurrent_positions_threshold": int,
+    "float32_profits": parse_bool,
+    "weight_sweep_samples": int,
+    "weight_sweep_spread": float,
+    "monte_carlo_paths": int,
+    "monte_carlo_method": str,
+    "diversified_bucket": parse_optional_str,
+    "diversified_drawdown_weight": float,
+    "pair_correlation_top_k": int,
+    "pair_overlap_bucket": str,
+    "walk_forward_train_months": int,
+    "walk_forward_test_months": int,
+    "walk_forward_step_months": int
+}
+
+
+# The values every numeric or choice setting of a query has to have, with how to describe them, so that e.g. max_final_report_pairs=0 is answered with an
+# error instead of failing inside a report
+query_setting_checks = {
+    "max_final_report_pairs": (lambda value: value >= 1, "at least 1"),
+    "capital_per_trade": (lambda value: value > 0, "more than 0"),
+    "concurrent_positions_threshold": (lambda value: value >= 0, "at least 0"),
+    "weight_sweep_samples": (lambda value: value >= 0, "at least 0"),
+    "weight_sweep_spread": (lambda value: value >= 0, "at least 0"),
+    "monte_carlo_paths": (lambda value: value >= 0, "at least 0"),
+    "monte_carlo_method": (lambda value: value in ("bootstrap", "shuffle"), "bootstrap or shuffle"),
+    "diversified_drawdown_weight": (lambda value: value >= 0, "at least 0"),
+    "pair_correlation_top_k": (lambda value: value is None or value >= 0, "at least 0"),
+    "walk_forward_train_months": (lambda value: value >= 0, "at least 0"),
+    "walk_forward_test_months": (lambda value: value >= 1, "at least 1"),
+    "walk_forward_step_months": (lambda value: value >= 1, "at least 1")
+}
+
+
+def validate_query_settings(settings: dict):
+    """
+    Raises:
+        ValueError: If a setting's value is outside of what query_setting_checks allows.
+    """
+    for name, value in settings.items():
+        if name in query_setting_checks:
+            is_valid, requirement = query_setting_checks[name]
+            if not is_valid(value):
+                raise ValueError(f"Invalid {name}: {value}, it has to be {requirement}")
+
+
+def parse_query_settings(query: dict) -> dict:
+    """
+    Turn the parameters of a report query into ReportConfig settings, e.g. ?position_type=short&pairs=BTCUSDT,ETHUSDT. "pairs" is a comma separated list
+    of the pairs to combine, in order, and sets selected_pairs.
+
+    Args:
+        query (dict): The query parameters as parsed by urllib.parse.parse_qs, without "format".
+
+    Returns:
+        dict: The settings, with hashable values so that they can key the report cache.
+
+    Raises:
+        ValueError: If a parameter isn't a query setting or its value can't be parsed.
+    """
+    settings = {}
+    for name, values in query.items():
+        if name == "pairs":
+            settings["selected_pairs"] = tuple(pair.strip() for value in values for pair in value.split(",") if pair.strip())
+        elif name in query_setting_parsers:
+            settings[name] = query_setting_parsers[name](values[-1])
+        else:
+            raise ValueError(f"Unknown query parameter: {name}, choose from pairs, format, {', '.join(query_setting_parsers)}")
+
+    return settings
+
+
+def encode_json(report_df: pd.DataFrame, index: bool) -> bytes:
+    # The rows of the report as a list of objects, with its index as the first field if index is True, like the first column of the report files
+    report_df = report_df.reset_index() if index else report_df
+    return report_df.rename(columns=str).to_json(orient="records", date_format="iso").encode()
+
+
+def encode_parquet(report_df: pd.DataFrame, index: bool) -> bytes:
+    parquet_buffer = io.BytesIO()
+    write_parquet(report_df, parquet_buffer, index=index)
+    return parquet_buffer.getvalue()
+
+
+# The content type and encoder of every response format, by the query's "format" parameter
+response_formats = {
+    "json": ("application/json", encode_json),
+    "parquet": ("application/vnd.apache.parquet", encode_parquet)
+}
+
+
+class ReportService:
+    """
+    Keeps the positions of a file loaded and answers report queries from them. The encoded positions, the per-pair metrics, the month coverage and the
+    unscaled FinalReport rows are shared between all the queries with the same ReportConfig.metrics_key, so e.g. after the first short positions query
+    the others only rank, cut or scale them. The computed reports themselves are kept in an LRU cache of cache_size entries, keyed by the report name
+    and the query settings.
+    """
+
+    def __init__(self, all_positions_file: str, base_config: ReportConfig | None = None, cache_size: int = constants.service_cache_size,
+                 mode: str = 'ALL_PAIRS'):
+        """
+        Args:
+            all_positions_file (str): The positions file, read once here.
+            base_config (ReportConfig | None): The settings the queries override, the defaults of ReportConfig if not given.
+            cache_size (int): The number of computed reports to keep.
+            mode (str): The pair selection mode of the reports, see Report.
+        """
+        self.all_positions_file = all_positions_file
+        self.base_config = base_config if base_config is not None else ReportConfig()
+        self.cache_size = cache_size
+        self.mode = mode
+
+        self.positions_df = load_positions(all_positions_file, cache_dir=self.base_config.positions_cache_dir)
+        self.shared_states = {}
+        self.cached_reports = OrderedDict()
+
+    def get_pair_names(self) -> list:
+        return self.positions_df["Pair name"].unique().tolist()
+
+    def get_report(self, report_name: str, settings: dict | None = None) -> pd.DataFrame | None:
+        """
+        The report_name report of the positions with the base config's settings replaced by settings, from the cache if it's been computed before.
+
+        Returns:
+            pd.DataFrame | None: The report, or None if it's an optional report that the settings don't enable.
+
+        Raises:
+            ValueError: If report_name isn't one of Report.report_attributes, a setting is unknown or has an invalid value, see validate_query_settings,
+                or the settings leave no pairs to report on.
+        """
+        if report_name not in Report.report_attributes:
+            raise ValueError(f"Unknown report: {report_name}, choose from {', '.join(Report.report_attributes)}")
+
+        settings = settings or {}
+        validate_query_settings(settings)
+        cache_key = (report_name, tuple(sorted(settings.items())))
+        if cache_key in self.cached_reports:
+            self.cached_reports.move_to_end(cache_key)
+            return self.cached_reports[cache_key]
+
+        config = self.base_config.updated(settings)
+        report = Report(self.all_positions_file, mode=self.mode, config=config, positions_df=self.positions_df,
+                        shared_state=self.shared_states.setdefault(config.metrics_key, {}), create_reports=False)
+        report_df = getattr(report, Report.report_attributes[report_name][0])
+
+        self.cached_reports[cache_key] = report_df
+        if len(self.cached_reports) > self.cache_size:
+            self.cached_reports.popitem(last=False)
+
+        return report_df
+
+
+class ReportRequestHandler(BaseHTTPRequestHandler):
+    """
+    Answers the GET requests of a report server:
+
+        /reports                                       The names of the reports.
+        /pairs                                         The pairs of the positions file.
+        /BaseReport?position_type=short                A report, with query settings, see parse_query_settings.
+        /FinalReport?pairs=BTCUSDT,ETHUSDT&format=parquet
+
+    Reports are JSON by default, format=parquet returns them as Parquet files.
+    """
+
+    def do_GET(self):
+        start_time = time.perf_counter()
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+        path = url.path.strip("/")
+        service = self.server.service
+
+        if path == "reports":
+            return self.send_body(200, "application/json", json.dumps(list(Report.report_attributes)).encode())
+        if path == "pairs":
+            return self.send_body(200, "application/json", json.dumps(service.get_pair_names()).encode())
+        if path not in Report.report_attributes:
+            return self.send_error(404, f"Unknown report: {path}, choose from {', '.join(Report.report_attributes)}")
+
+        response_format = query.pop("format", ["json"])[-1]
+        if response_format not in response_formats:
+            return self.send_error(400, f"Unknown format: {response_format}, choose from {', '.join(response_formats)}")
+
+        try:
+            report_df = service.get_report(path, parse_query_settings(query))
+        except ValueError as error:
+            return self.send_error(400, str(error))
+        except Exception as error:
+            # Any other failure is answered too, instead of dropping the connection
+            self.log_error("%s failed: %r", path, error)
+            return self.send_error(500, f"{path} failed: {type(error).__name__}: {error}")
+
+        if report_df is None:
+            return self.send_error(404, f"{path} isn't created with these settings")
+
+        content_type, encoder = response_formats[response_format]
+        self.send_body(200, content_type, encoder(report_df, Report.report_attributes[path][1]))
+        self.log_message("%s answered in %.1f ms", path, (time.perf_counter() - start_time) * 1000)
+
+    def send_body(self, status: int, content_type: str, body: bytes):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def address_string(self) -> str:
+        # Clients of a Unix socket have no address
+        return self.client_address[0] if self.client_address else "unix"
+
+
+class UnixReportServer(socketserver.UnixStreamServer):
+    # An HTTP server listening on a Unix socket, which replaces a socket file left over by an earlier server
+    def server_bind(self):
+        if os.path.exists(self.server_address):
+            os.remove(self.server_address)
+        super().server_bind()
+
+
+def create_report_server(service: ReportService, host: str = constants.service_host, port: int = constants.service_port,
+                         socket_path: str | None = None) -> socketserver.BaseServer:
+    """
+    Create a server answering report queries from service, see ReportRequestHandler, on a Unix socket if socket_path is given and on host:port otherwise.
+    Requests are answered one at a time, so the queries never compute the same shared results at once.
+    """
+    if socket_path:
+        server = UnixReportServer(socket_path, ReportRequestHandler)
+    else:
+        server = HTTPServer((host, port), ReportRequestHandler)
+
+    server.service = service
+
+    return server
@@ -0,0 +1,106 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+from openpyxl import Workbook
+
+from reports.instrumentation import instrumented
+
+try:
+    import pyarrow  # noqa: F401
+
+    PARQUET_AVAILABLE = True
+except ImportError:
+    PARQUET_AVAILABLE = False
+
+
+def iter_report_rows(report_df: pd.DataFrame, index: bool, chunk_size: int):
+    # The rows of report_df as lists of plain Python values with None for missing values, converted chunk_size rows at a time
+    for chunk_start in range(0, len(report_df), chunk_size):
+        report_chunk = report_df.iloc[chunk_start:chunk_start + chunk_size]
+        if index:
+            report_chunk = report_chunk.reset_index()
+
+        chunk_values = report_chunk.astype(object).to_numpy()
+        chunk_values[pd.isna(chunk_values)] = None
+
+        yield from chunk_values.tolist()
+
+
+def write_xlsx(report_df: pd.DataFrame, file_path: str, index: bool = True, chunk_size: int = 10_000):
+    """
+    Write a report to an Excel file through openpyxl's write-only mode, which streams the rows to the file instead of keeping a cell object for every
+    value in memory. The layout is the same as DataFrame.to_excel's, with the index as an unnamed first column if index is True, but without its styling.
+
+    Args:
+        report_df (pd.DataFrame): The report.
+        file_path (str): The path of the .xlsx file.
+        index (bool): Whether to write the index as the first column.
+        chunk_size (int): The number of rows converted to Python values at a time.
+    """
+    workbook = Workbook(write_only=True)
+    worksheet = workbook.create_sheet("Sheet1")
+
+    worksheet.append(([report_df.index.name] if index else []) + [str(column) for column in report_df.columns])
+    for row in iter_report_rows(report_df, index, chunk_size):
+        worksheet.append(row)
+
+    workbook.save(file_path)
+
+
+def write_csv(report_df: pd.DataFrame, file_path: str, index: bool = True):
+    report_df.to_csv(file_path, index=index)
+
+
+def write_parquet(report_df: pd.DataFrame, file_path: str, index: bool = True):
+    if not PARQUET_AVAILABLE:
+        raise ImportError("pyarrow is needed to write Parquet reports, install it or choose other --formats")
+
+    # Parquet needs string column names, e.g. the month columns of the MonthlyReport
+    report_df.rename(columns=str).to_parquet(file_path, index=index)
+
+
+# The writer of every output format, by file extension
+report_writers = {
+    "xlsx": write_xlsx,
+    "csv": write_csv,
+    "parquet": write_parquet
+}
+
+
+@instrumented()
+def write_report_files(reports: dict, output_dir: str, formats: tuple = ("xlsx",), threads: int = 1) -> list[str]:
+    """
+    Write every report in every format to output_dir, as <report name>.<format>. The reports are independent of each other, so with more than one thread
+    the files are written concurrently from a thread pool.
+
+    Args:
+        reports (dict): The (report_df, index) of every report, by report name, index being whether to write its index.
+        output_dir (str): The folder to write the files to, created if it doesn't exist.
+        formats (tuple): The output formats, keys of report_writers.
+        threads (int): The number of files written at the same time.
+
+    Returns:
+        list[str]: The paths of the written files.
+    """
+    unknown_formats = sorted(set(formats) - set(report_writers))
+    if unknown_formats:
+        raise ValueError(f"Unknown report formats: {', '.join(unknown_formats)}, choose from {', '.join(report_writers)}")
+
+    os.makedirs(output_dir, exist_ok=True)
+
+    write_tasks = [(report_writers[file_format], report_df, f"{output_dir}/{report_name}.{file_format}", index)
+                   for report_name, (report_df, index) in reports.items() for file_format in dict.fromkeys(formats)]
+
+    # The largest reports go first, so that they don't end up being the only files left to write
+    write_tasks.sort(key=lambda write_task: -np.prod(write_task[1].shape))
+
+    if threads > 1 and len(write_tasks) > 1:
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            list(pool.map(lambda write_task: write_task[0](write_task[1], write_task[2], index=write_task[3]), write_tasks))
+    else:
+        for writer, report_df, file_path, index in write_tasks:
+            writer(report_df, file_path, index=index)
+
+    return [file_path for _, _, file_path, _ in write_tasks]
@@ -0,0 +1,143 @@
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+import constants
+from reports.gp_report import Report
+from reports.positions_io import load_positions
+from reports.report_config import ReportConfig
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+
+def load_scenarios(scenario_file: str) -> list[dict]:
+    """
+    Read a scenario file, a YAML or JSON list with the ReportConfig settings of every scenario, e.g.
+
+        - name: long-top-10
+          position_type: long
+          max_final_report_pairs: 10
+        - name: all-capital-500
+          capital_per_trade: 500
+
+    Args:
+        scenario_file (str): The path of the .yaml, .yml or .json scenario file.
+
+    Returns:
+        list[dict]: The settings of the scenarios, in the order of the file.
+    """
+    extension = os.path.splitext(scenario_file)[1].lower()
+
+    with open(scenario_file) as file:
+        if extension in (".yaml", ".yml"):
+            if yaml is None:
+                raise ImportError("PyYAML is needed to read YAML scenario files, install it or use a JSON scenario file instead")
+            scenarios = yaml.safe_load(file)
+        elif extension == ".json":
+            scenarios = json.load(file)
+        else:
+            raise ValueError(f"Unsupported scenario file type: {scenario_file}")
+
+    if not isinstance(scenarios, list) or not all(isinstance(scenario, dict) for scenario in scenarios):
+        raise ValueError(f"The scenario file {scenario_file} should hold a list of settings")
+
+    return scenarios
+
+
+def create_scenario_configs(scenarios: list[dict], base_config: ReportConfig | None = None) -> list[ReportConfig]:
+    """
+    Turn the scenario settings into report configs. Every scenario gets its own output folder, "output_dir" under report_outputs/ if it's set, or else
+    its "name", or else its position in the list.
+
+    Args:
+        scenarios (list[dict]): The settings of the scenarios, as returned by load_scenarios.
+        base_config (ReportConfig | None): The config whose settings the scenarios override, the defaults of ReportConfig if not given.
+
+    Returns:
+        list[ReportConfig]: The config of every scenario.
+    """
+    base_config = base_config if base_config is not None else ReportConfig()
+
+    scenario_configs = []
+    for scenario_index, scenario in enumerate(scenarios):
+        settings = dict(scenario)
+        output_dir = settings.pop("output_dir", None) or settings.pop("name", None) or f"scenario_{scenario_index + 1}"
+        settings.pop("name", None)
+
+        scenario_configs.append(base_config.updated({**settings, "output_dir": f"{constants.output_root_dir}/{output_dir}"}))
+
+    output_dirs = [scenario_config.output_dir for scenario_config in scenario_configs]
+    if len(set(output_dirs)) < len(output_dirs):
+        raise ValueError("Every scenario should have its own output folder, some of the scenario names or output_dirs are repeated")
+
+    return scenario_configs
+
+
+def run_scenario_group(all_positions_file: str, positions_df: pd.DataFrame, scenario_configs: list[ReportConfig], mode: str) -> list[Report]:
+    # Run scenarios with the same metrics_key one after the other, so that they share the filtered positions and the unscaled metrics. The scenario with
+    # the most FinalReport pairs goes first, so the later ones only need to cut its prefix rows.
+    shared_state = {}
+    run_order = sorted(range(len(scenario_configs)), key=lambda scenario_index: -scenario_configs[scenario_index].max_final_report_pairs)
+
+    reports = [None] * len(scenario_configs)
+    for scenario_index in run_order:
+        reports[scenario_index] = Report(all_positions_file, mode=mode, config=scenario_configs[scenario_index], positions_df=positions_df,
+                                         shared_state=shared_state)
+
+    return reports
+
+
+def run_scenarios(all_positions_file: str, scenario_configs: list[ReportConfig], workers: int = 1, mode: str = 'ALL_PAIRS',
+                  positions_cache_dir: str | None = constants.positions_cache_dir) -> list[Report]:
+    """
+    Create the reports of many scenarios over the same positions file. The file is loaded once and the scenarios are grouped by the settings that change
+    the per-pair metrics, i.e. the position type, equity curve timeframe and concurrency threshold. Within a group the filtered positions, the BaseReport,
+    the pair x month matrices and the unscaled FinalReport rows are calculated once, and only the capital scaling and the number of combined pairs differ
+    between the scenarios. With more than one worker, the groups run in parallel in a process pool.
+
+    Args:
+        all_positions_file (str): The positions file.
+        scenario_configs (list[ReportConfig]): The config of every scenario, e.g. from create_scenario_configs.
+        workers (int): The number of scenario groups to run at the same time.
+        mode (str): The pair selection mode of the reports, see Report.
+        positions_cache_dir (str | None): The cache folder passed to load_positions.
+
+    Returns:
+        list[Report]: The reports of the scenarios, in the order of scenario_configs.
+    """
+    positions_df = load_positions(all_positions_file, cache_dir=positions_cache_dir)
+
+    scenario_groups = {}
+    for scenario_index, scenario_config in enumerate(scenario_configs):
+        scenario_groups.setdefault(scenario_config.metrics_key, []).append(scenario_index)
+
+    group_configs = [[scenario_configs[scenario_index] for scenario_index in scenario_indices] for scenario_indices in scenario_groups.values()]
+
+    if workers > 1 and len(scenario_groups) > 1:
+        # Each group only receives the positions of its own type
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            group_reports = list(pool.map(run_scenario_group, [all_positions_file] * len(group_configs),
+                                          [filter_position_type(positions_df, configs[0].position_type) for configs in group_configs],
+                                          group_configs, [mode] * len(group_configs)))
+    else:
+        group_reports = [run_scenario_group(all_positions_file, positions_df, configs, mode) for configs in group_configs]
+
+    reports = [None] * len(scenario_configs)
+    for scenario_indices, scenario_reports in zip(scenario_groups.values(), group_reports):
+        for scenario_index, scenario_report in zip(scenario_indices, scenario_reports):
+            reports[scenario_index] = scenario_report
+
+    return reports
+
+
+def filter_position_type(positions_df: pd.DataFrame, position_type: str | None) -> pd.DataFrame:
+    # Keep the positions of position_type, or all of them if it's None. Report filters them again, which leaves the already filtered positions as they are.
+    if position_type:
+        return positions_df[positions_df['Type'].str.lower() == position_type.lower()]
+
+    return positions_df
@@ -0,0 +1,153 @@
+import glob
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from reports.gp_report import Report
+from reports.instrumentation import instrumented
+from reports.positions_io import DEFAULT_CACHE_DIR, load_positions
+from reports.positions_store import PositionsStore
+from reports.report_config import ReportConfig
+from reports.report_writers import write_report_files
+
+# The extensions of the files a folder of positions files is searched for
+positions_file_extensions = (".xlsx", ".xls", ".csv", ".parquet")
+
+
+def expand_positions_files(pattern: str) -> list[str]:
+    """
+    The positions files named by a --pl argument: every positions file directly inside it if it's a folder, the files matching it if it's a glob
+    pattern such as "exports/*.csv", and the file itself otherwise. The files of a folder or pattern are sorted by path.
+
+    Raises:
+        FileNotFoundError: If a folder or pattern matches no positions files.
+    """
+    if os.path.isdir(pattern):
+        file_paths = sorted(os.path.join(pattern, file_name) for file_name in os.listdir(pattern)
+                            if os.path.splitext(file_name)[1].lower() in positions_file_extensions)
+    elif any(wildcard in pattern for wildcard in "*?["):
+        file_paths = sorted(file_path for file_path in glob.glob(pattern) if os.path.isfile(file_path))
+    else:
+        return [pattern]
+
+    if not file_paths:
+        raise FileNotFoundError(f"No positions files found in {pattern}")
+
+    return file_paths
+
+
+def get_source_names(file_paths: list[str]) -> list[str]:
+    # The name of every file without its extension, or its path relative to the common folder of the files if two of them share a name, keeping the
+    # extension if that still leaves two of them with the same name, e.g. long.csv and long.parquet
+    source_names = [os.path.splitext(os.path.basename(file_path))[0] for file_path in file_paths]
+    if len(set(source_names)) < len(source_names):
+        common_dir = os.path.commonpath([os.path.abspath(file_path) for file_path in file_paths])
+        relative_paths = [os.path.relpath(os.path.abspath(file_path), common_dir) for file_path in file_paths]
+        source_names = [os.path.splitext(relative_path)[0] for relative_path in relative_paths]
+        if len(set(source_names)) < len(source_names):
+            source_names = relative_paths
+
+    return source_names
+
+
+@instrumented("stage")
+def load_source_positions(file_paths: list[str], cache_dir: str | None = DEFAULT_CACHE_DIR, workers: int | None = None) -> pd.DataFrame:
+    """
+    Load several positions files into one DataFrame with a categorical "Source" column naming the file of every position, see get_source_names. Every
+    file is loaded through the positions cache like a single one, and the files are parsed in a process pool of up to workers processes, one per CPU
+    by default, so the load takes about as long as the largest files on each core rather than all of them one after the other.
+
+    Args:
+        file_paths (list[str]): The positions files.
+        cache_dir (str | None): The cache folder passed to load_positions.
+        workers (int | None): The number of files parsed at the same time.
+
+    Returns:
+        pd.DataFrame: The positions of all the files, in the order of file_paths.
+    """
+    workers = min(workers or os.cpu_count() or 1, len(file_paths))
+
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            source_positions_dfs = list(pool.map(load_positions, file_paths, [cache_dir] * len(file_paths)))
+    else:
+        source_positions_dfs = [load_positions(file_path, cache_dir=cache_dir) for file_path in file_paths]
+
+    source_names = get_source_names(file_paths)
+    positions_df = pd.concat(source_positions_dfs, ignore_index=True)
+    positions_df["Source"] = pd.Categorical.from_codes(np.repeat(np.arange(len(file_paths)), [len(source_df) for source_df in source_positions_dfs]),
+                                                       categories=source_names)
+
+    return positions_df
+
+
+@instrumented()
+def create_source_summary(source_base_reports: dict) -> pd.DataFrame:
+    """
+    Compare the BaseReport rankings of several sources: the rank and score every pair got under every source, next to how many sources it has positions
+    in and its mean, best and worst rank over them.
+
+    Args:
+        source_base_reports (dict): The BaseReport of every source, by source name.
+
+    Returns:
+        pd.DataFrame: One row per pair, indexed by pair name and sorted by mean rank, with NaN for the sources a pair has no positions in.
+    """
+    source_ranks = pd.DataFrame({source_name: pd.Series(np.arange(1, len(base_report_df) + 1), index=base_report_df["Pair name"].to_numpy())
+                                 for source_name, base_report_df in source_base_reports.items()})
+    source_scores = pd.DataFrame({source_name: base_report_df.set_index("Pair name")["Score"]
+                                  for source_name, base_report_df in source_base_reports.items()})
+
+    source_summary_df = pd.DataFrame({"Sources": source_ranks.notna().sum(axis=1), "Mean rank": source_ranks.mean(axis=1),
+                                      "Best rank": source_ranks.min(axis=1), "Worst rank": source_ranks.max(axis=1)})
+    for source_name in source_ranks.columns:
+        source_summary_df[f"Rank - {source_name}"] = source_ranks[source_name]
+        source_summary_df[f"Score - {source_name}"] = source_scores[source_name]
+
+    source_summary_df.index.name = "Pair name"
+
+    return source_summary_df.sort_values(["Mean rank", "Best rank"], kind="stable")
+
+
+def create_source_reports(file_paths: list[str], config: ReportConfig, mode: str = 'ALL_PAIRS', workers: int | None = None) -> dict:
+    """
+    Create the reports of several positions files, e.g. one export per strategy, in a single run. The files are loaded concurrently, see
+    load_source_positions, and encoded into one positions store, whose positions of every source are then reported on like a positions file of their
+    own, in a folder named after the source under config.output_dir. The SourceSummary next to those folders compares the BaseReport rankings of the
+    sources, see create_source_summary.
+
+    Args:
+        file_paths (list[str]): The positions files.
+        config (ReportConfig): The settings of the reports of every source.
+        mode (str): The pair selection mode of the reports, see Report.
+        workers (int | None): The number of files parsed at the same time.
+
+    Returns:
+        dict: The Report of every source, by source name.
+    """
+    if config.stream or config.incremental:
+        raise ValueError("Streamed and incremental runs read a single positions file")
+
+    positions_df = load_source_positions(file_paths, cache_dir=config.positions_cache_dir, workers=workers)
+
+    # The positions are encoded once, and every source's report starts from its own positions of the shared store
+    float_dtype = np.float32 if config.float32_profits else np.float64
+    positions_store = PositionsStore.from_positions_df(positions_df, float_dtype=float_dtype)
+
+    source_reports = {}
+    for source_name, file_path in zip(positions_df["Source"].cat.categories, file_paths):
+        print('Reporting on', file_path)
+        source_config = config.updated({"source": source_name, "output_dir": f"{config.output_dir}/{source_name}"})
+        shared_state = {"create_positions_store": positions_store.filter_source(source_name).filter_type(config.position_type).sort_by_entry_time()
+                        .with_months()}
+
+        source_reports[source_name] = Report(file_path, mode=mode, config=source_config, positions_df=positions_df, shared_state=shared_state)
+
+    source_summary_df = create_source_summary({source_name: source_report.base_report_df for source_name, source_report in source_reports.items()})
+    write_report_files({"SourceSummary": (source_summary_df, True)}, config.output_dir, formats=config.formats)
+
+    print('Source summary created.')
+
+    return source_reports
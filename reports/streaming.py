@@ -0,0 +1,480 @@
+import numpy as np
+import pandas as pd
+
+from reports.base_report_utils import calc_total_months
+from reports.equity_utils import NANOSECONDS_PER_DAY
+from reports.instrumentation import instrumented
+from reports.month_matrix import calc_month_codes, calc_monthly_missing_months, calc_monthly_performance
+from reports.positions_io import iter_positions_chunks
+from reports.positions_store import missing_time, open_statuses
+from reports.trade_runs import calc_segment_equity_curves, streak_quantile
+
+
+class StreamingPairMetrics:
+    """
+    Online per-pair accumulators for the BaseReport metrics, updated one chunk of positions at a time so that the memory used is proportional to the number
+    of pairs and months rather than to the number of positions.
+
+    The chunks must come in "Entry time" order. Streaks and the trade order equity curves are counted in that order, carrying every pair's current streak,
+    equity and peak over from one chunk to the next.
+    The equity curves need the exit time order instead, so closed positions wait in a buffer until the entry time of the stream has moved past their exit
+    time, at which point no later position can exit before them. The buffer only holds the positions that are still open at the current entry time.
+
+    Only the positions of every pair have to keep that order between them. A caller that still has the positions, like the incremental reports, can take
+    in chunks out of the stream's order, finding the pairs whose positions can't be added with get_unordered_pairs and recalculating those from all of
+    their positions, see replace_pairs.
+    """
+
+    # The per-pair accumulators and the value a new pair starts them with
+    pair_state_fill_values = {
+        "position_counts": 0, "net_profit_totals": 0, "gross_profits": 0, "gross_losses": 0, "win_counts": 0, "loss_counts": 0, "largest_profits": 0,
+        "first_pair_entry_times": np.iinfo(np.int64).max, "last_pair_entry_times": missing_time,
+        "trade_equities": 0, "trade_peaks": -np.inf, "trade_drawdowns": 0,
+        "equities": 0, "peaks": -np.inf, "last_times": missing_time, "stretch_starts": missing_time, "max_drawdowns": 0, "max_durations": 0,
+        "trough_times": missing_time, "recovery_times": 0
+    }
+
+    def __init__(self):
+        self.pair_list: list = []
+        self.pair_codes: dict = {}
+
+        self.min_entry_time = None
+        self.max_exit_time = None
+        self.last_entry_time = np.iinfo(np.int64).min
+
+        # The earliest entry time of the positions of every pair, and the latest one of its closed positions
+        self.first_pair_entry_times = np.zeros(0, dtype=np.int64)
+        self.last_pair_entry_times = np.zeros(0, dtype=np.int64)
+
+        # Totals
+        self.position_counts = np.zeros(0, dtype=int)
+        self.net_profit_totals = np.zeros(0)
+        self.gross_profits = np.zeros(0)
+        self.gross_losses = np.zeros(0)
+        self.win_counts = np.zeros(0, dtype=int)
+        self.loss_counts = np.zeros(0, dtype=int)
+        self.largest_profits = np.zeros(0)
+
+        # Net profit and number of positions per (pair code, month code)
+        self.monthly_net_profits = pd.Series(dtype=float)
+        self.monthly_position_counts = pd.Series(dtype=float)
+
+        # Streak state: the number of streaks and the longest one so far, the flag of the last position, and the length of the current streak
+        self.streak_states = {streak_type: {"counts": np.zeros(0, dtype=int), "max": np.zeros(0, dtype=int), "last_flag": np.zeros(0, dtype=bool),
+                                            "current": np.zeros(0, dtype=int)} for streak_type in ("wins", "losses")}
+
+        # Number of ended streaks per (pair code, streak length), for the streak quantiles
+        self.streak_length_counts = {streak_type: pd.Series(dtype=float) for streak_type in ("wins", "losses")}
+
+        # Trade order equity curve state: the equity and peak after the last position of every pair, and the max drawdown so far
+        self.trade_equities = np.zeros(0)
+        self.trade_peaks = np.zeros(0)
+        self.trade_drawdowns = np.zeros(0)
+
+        # Closed positions waiting for the stream to move past their exit time
+        self.pending_codes = np.zeros(0, dtype=int)
+        self.pending_exit_times = np.zeros(0, dtype=np.int64)
+        self.pending_net_profits = np.zeros(0)
+
+        # Equity curve state of every pair, see update_drawdowns. The time of the last point, the start of the current drawdown stretch and the trough of a
+        # max drawdown that hasn't recovered yet are missing_time when there's none.
+        self.equities = np.zeros(0)
+        self.peaks = np.zeros(0)
+        self.last_times = np.zeros(0, dtype=np.int64)
+        self.stretch_starts = np.zeros(0, dtype=np.int64)
+        self.max_drawdowns = np.zeros(0)
+        self.max_durations = np.zeros(0)
+        self.trough_times = np.zeros(0, dtype=np.int64)
+        self.recovery_times = np.zeros(0)
+
+    def add_pairs(self, pair_names: np.ndarray):
+        new_pairs = [pair_name for pair_name in pd.unique(pair_names) if pair_name not in self.pair_codes]
+        if not new_pairs:
+            return
+
+        for pair_name in new_pairs:
+            self.pair_codes[pair_name] = len(self.pair_list)
+            self.pair_list.append(pair_name)
+
+        def grow(array: np.ndarray, fill_value=0) -> np.ndarray:
+            return np.concatenate([array, np.full(len(new_pairs), fill_value, dtype=array.dtype)])
+
+        for state_name, fill_value in self.pair_state_fill_values.items():
+            setattr(self, state_name, grow(getattr(self, state_name), fill_value))
+
+        for streak_state in self.streak_states.values():
+            for state_name in streak_state:
+                streak_state[state_name] = grow(streak_state[state_name])
+
+    def get_unordered_pairs(self, positions_chunk: pd.DataFrame) -> np.ndarray:
+        """
+        The pairs of a chunk sorted by "Entry time" that it can't be added in for, because one of their closed positions enters before a closed position
+        of theirs already added, or exits no later than the last point of their equity curve.
+        """
+        pair_codes = positions_chunk["Pair name"].map(self.pair_codes)
+        is_known = pair_codes.notna().to_numpy() & ~positions_chunk["Status"].isin(open_statuses).to_numpy()
+        pair_codes = pair_codes.to_numpy()[is_known].astype(int)
+
+        entry_times = positions_chunk["Entry time"].to_numpy(dtype="datetime64[ns]").view(np.int64)[is_known]
+        exit_times = positions_chunk["Exit time"].to_numpy(dtype="datetime64[ns]").view(np.int64)[is_known]
+        is_unordered = (entry_times < self.last_pair_entry_times[pair_codes]) | (exit_times <= self.last_times[pair_codes])
+
+        return pd.unique(positions_chunk["Pair name"].to_numpy()[is_known][is_unordered])
+
+    def replace_pairs(self, pair_metrics: "StreamingPairMetrics"):
+        """
+        Replace the accumulators of the pairs of pair_metrics with its own, e.g. ones calculated from all the positions of the pairs returned by
+        get_unordered_pairs, leaving those of the other pairs as they are.
+        """
+        self.add_pairs(np.asarray(pair_metrics.pair_list, dtype=object))
+        pair_codes = np.array([self.pair_codes[pair_name] for pair_name in pair_metrics.pair_list], dtype=int)
+        first_pair_entry_times = self.first_pair_entry_times.copy()
+
+        for state_name in self.pair_state_fill_values:
+            getattr(self, state_name)[pair_codes] = getattr(pair_metrics, state_name)
+        # The first entries can also be of open positions, which the replaced accumulators may not have been given
+        self.first_pair_entry_times[pair_codes] = np.minimum(first_pair_entry_times[pair_codes], pair_metrics.first_pair_entry_times)
+        for streak_type, streak_state in self.streak_states.items():
+            for state_name in streak_state:
+                streak_state[state_name][pair_codes] = pair_metrics.streak_states[streak_type][state_name]
+
+        def replace_pair_rows(pair_rows: pd.Series, new_pair_rows: pd.Series) -> pd.Series:
+            # The rows of a Series indexed by (pair code, ...) with those of the replaced pairs swapped for new_pair_rows, renumbered to the pair codes
+            if len(new_pair_rows) > 0:
+                new_pair_rows = new_pair_rows.set_axis(pd.MultiIndex.from_arrays([pair_codes[new_pair_rows.index.get_level_values(0)],
+                                                                                  new_pair_rows.index.get_level_values(1)]))
+            if len(pair_rows) > 0:
+                pair_rows = pair_rows[~np.isin(pair_rows.index.get_level_values(0), pair_codes)]
+
+            return pd.concat([pair_rows, new_pair_rows]) if len(pair_rows) > 0 and len(new_pair_rows) > 0 else \
+                (new_pair_rows if len(new_pair_rows) > 0 else pair_rows)
+
+        self.monthly_net_profits = replace_pair_rows(self.monthly_net_profits, pair_metrics.monthly_net_profits)
+        self.monthly_position_counts = replace_pair_rows(self.monthly_position_counts, pair_metrics.monthly_position_counts)
+        for streak_type in self.streak_length_counts:
+            self.streak_length_counts[streak_type] = replace_pair_rows(self.streak_length_counts[streak_type], pair_metrics.streak_length_counts[streak_type])
+
+        is_kept = ~np.isin(self.pending_codes, pair_codes)
+        self.pending_codes = np.concatenate([self.pending_codes[is_kept], pair_codes[pair_metrics.pending_codes]])
+        self.pending_exit_times = np.concatenate([self.pending_exit_times[is_kept], pair_metrics.pending_exit_times])
+        self.pending_net_profits = np.concatenate([self.pending_net_profits[is_kept], pair_metrics.pending_net_profits])
+
+        self.update_time_span(pair_metrics.min_entry_time, pair_metrics.max_exit_time)
+        self.last_entry_time = max(self.last_entry_time, pair_metrics.last_entry_time)
+
+    def get_pair_order(self) -> np.ndarray:
+        # The pair codes in the order of the first entries of the pairs, the order they first appear in once the positions are sorted by entry time
+        return np.argsort(self.first_pair_entry_times, kind="stable")
+
+    def update_time_span(self, min_entry_time, max_exit_time):
+        if min_entry_time is not None:
+            self.min_entry_time = min_entry_time if self.min_entry_time is None else min(self.min_entry_time, min_entry_time)
+        if max_exit_time is not None and not pd.isna(max_exit_time):
+            self.max_exit_time = max_exit_time if self.max_exit_time is None else max(self.max_exit_time, max_exit_time)
+
+    def add_chunk(self, positions_chunk: pd.DataFrame, check_order: bool = True):
+        """
+        Add a chunk of positions, sorted by "Entry time", to the accumulators.
+
+        Args:
+            positions_chunk (pd.DataFrame): The positions.
+            check_order (bool): Whether to check that the chunk doesn't enter before the chunks already added. A caller that checked the order of every
+                pair's positions with get_unordered_pairs instead can skip it.
+
+        Raises:
+            ValueError: If the chunk isn't sorted by "Entry time", or enters before the chunks already added.
+        """
+        entry_times = positions_chunk["Entry time"].to_numpy(dtype="datetime64[ns]").view(np.int64)
+        if len(entry_times) == 0:
+            return
+
+        if np.any(np.diff(entry_times) < 0) or (check_order and entry_times[0] < self.last_entry_time):
+            raise ValueError("Streamed positions have to be sorted by Entry time")
+        self.last_entry_time = max(self.last_entry_time, entry_times[-1])
+
+        self.add_pairs(positions_chunk["Pair name"].to_numpy())
+        np.minimum.at(self.first_pair_entry_times, positions_chunk["Pair name"].map(self.pair_codes).to_numpy(dtype=int), entry_times)
+
+        self.update_time_span(positions_chunk["Entry time"].min(), positions_chunk["Exit time"].max())
+
+        closed_positions = positions_chunk[~positions_chunk["Status"].isin(open_statuses)]
+        pair_codes = closed_positions["Pair name"].map(self.pair_codes).to_numpy(dtype=int)
+        net_profits = closed_positions["Net profit"].to_numpy(dtype=float)
+        exit_times = closed_positions["Exit time"].to_numpy(dtype="datetime64[ns]")
+        pair_count = len(self.pair_list)
+
+        np.maximum.at(self.last_pair_entry_times, pair_codes, closed_positions["Entry time"].to_numpy(dtype="datetime64[ns]").view(np.int64))
+
+        # Totals
+        self.position_counts += np.bincount(pair_codes, minlength=pair_count)
+        self.net_profit_totals += np.bincount(pair_codes, weights=net_profits, minlength=pair_count)
+        self.gross_profits += np.bincount(pair_codes, weights=np.where(net_profits > 0, net_profits, 0), minlength=pair_count)
+        self.gross_losses += np.bincount(pair_codes, weights=np.where(net_profits < 0, net_profits, 0), minlength=pair_count)
+        self.win_counts += np.bincount(pair_codes[net_profits > 0], minlength=pair_count)
+        self.loss_counts += np.bincount(pair_codes[net_profits < 0], minlength=pair_count)
+        np.maximum.at(self.largest_profits, pair_codes, np.where(net_profits > 0, net_profits, 0))
+
+        # Monthly buckets
+        pair_months = pd.MultiIndex.from_arrays([pair_codes, calc_month_codes(exit_times)])
+        chunk_monthly_profits = pd.Series(net_profits, index=pair_months).groupby(level=[0, 1])
+        self.monthly_net_profits = self.monthly_net_profits.add(chunk_monthly_profits.sum(), fill_value=0)
+        self.monthly_position_counts = self.monthly_position_counts.add(chunk_monthly_profits.size(), fill_value=0)
+
+        # Streaks, grouped by pair while keeping the entry time order
+        order = np.argsort(pair_codes, kind="stable")
+        self.update_streaks("wins", net_profits[order] > 0, pair_codes[order])
+        self.update_streaks("losses", net_profits[order] < 0, pair_codes[order])
+        self.update_trade_drawdowns(net_profits[order], pair_codes[order])
+
+        # Positions exiting before the current entry time can't be preceded by any position still to come
+        self.pending_codes = np.concatenate([self.pending_codes, pair_codes])
+        self.pending_exit_times = np.concatenate([self.pending_exit_times, exit_times.view(np.int64)])
+        self.pending_net_profits = np.concatenate([self.pending_net_profits, net_profits])
+        self.flush_pending_exits(self.last_entry_time)
+
+    def update_streaks(self, streak_type: str, flags: np.ndarray, pair_codes: np.ndarray):
+        """
+        Count the streaks of True flags of a chunk, continuing the streak each pair had going at the end of the previous chunk. Since a streak only gets
+        longer until it ends, its length so far can count towards the max straight away, and only the current length has to be carried over.
+        """
+        if len(flags) == 0:
+            return
+
+        streak_state = self.streak_states[streak_type]
+
+        is_pair_start = np.append(True, pair_codes[1:] != pair_codes[:-1])
+        previous_flags = np.where(is_pair_start, streak_state["last_flag"][pair_codes], np.append(False, flags[:-1]))
+
+        # New streaks, plus the continued streaks which get the carried length added
+        new_streak_starts = flags & ~previous_flags
+        continued_streak_starts = flags & previous_flags & is_pair_start
+        streak_starts = new_streak_starts | continued_streak_starts
+
+        streak_ids = np.cumsum(streak_starts) - 1
+        streak_lengths = np.bincount(streak_ids[flags], minlength=streak_starts.sum())
+        streak_lengths[continued_streak_starts[streak_starts]] += streak_state["current"][pair_codes[continued_streak_starts]]
+
+        streak_state["counts"] += np.bincount(pair_codes[new_streak_starts], minlength=len(streak_state["counts"]))
+        np.maximum.at(streak_state["max"], pair_codes[streak_starts], streak_lengths)
+
+        # The last streak of every pair carries over if the pair's last position is a part of it
+        is_pair_end = np.append(pair_codes[1:] != pair_codes[:-1], True)
+        last_pair_codes = pair_codes[is_pair_end]
+        last_flags = flags[is_pair_end]
+        last_streak_lengths = np.zeros(len(last_pair_codes), dtype=int)
+        last_streak_lengths[last_flags] = streak_lengths[streak_ids[is_pair_end][last_flags]]
+
+        # Every other streak has ended, so its length is final, as have the carried streaks of the pairs whose first position here breaks them
+        is_ended = np.ones(len(streak_lengths), dtype=bool)
+        is_ended[streak_ids[is_pair_end][last_flags]] = False
+        broken_pair_codes = pair_codes[is_pair_start & previous_flags & ~flags]
+        ended_lengths = pd.Series(1.0, index=pd.MultiIndex.from_arrays([np.r_[pair_codes[streak_starts][is_ended], broken_pair_codes],
+                                                                       np.r_[streak_lengths[is_ended], streak_state["current"][broken_pair_codes]]]))
+        self.streak_length_counts[streak_type] = self.streak_length_counts[streak_type].add(ended_lengths.groupby(level=[0, 1]).sum(), fill_value=0)
+
+        streak_state["last_flag"][last_pair_codes] = last_flags
+        streak_state["current"][last_pair_codes] = last_streak_lengths
+
+    def update_trade_drawdowns(self, net_profits: np.ndarray, pair_codes: np.ndarray):
+        """
+        Move the trade order equity curves forward over the positions of a chunk, grouped by pair in entry time order, starting every pair's curve from
+        its carried equity and its running peak from its carried peak, like calc_segment_trade_stats over all the positions at once.
+        """
+        if len(pair_codes) == 0:
+            return
+
+        equity_curves = calc_segment_equity_curves(net_profits, pair_codes) + self.trade_equities[pair_codes]
+        peaks = np.maximum(pd.Series(equity_curves).groupby(pair_codes).cummax().to_numpy(), self.trade_peaks[pair_codes])
+        np.maximum.at(self.trade_drawdowns, pair_codes, peaks - equity_curves)
+
+        is_pair_end = np.append(pair_codes[1:] != pair_codes[:-1], True)
+        self.trade_equities[pair_codes[is_pair_end]] = equity_curves[is_pair_end]
+        self.trade_peaks[pair_codes[is_pair_end]] = peaks[is_pair_end]
+
+    def calc_streak_quantiles(self, streak_type: str, quantile: float) -> np.ndarray:
+        # The quantile of the streak lengths of every pair from their counts, adding the current streaks which end with the stream, see calc_run_quantiles
+        pair_count = len(self.pair_list)
+        streak_state = self.streak_states[streak_type]
+        current_pairs = np.flatnonzero(streak_state["last_flag"])
+        current_lengths = pd.Series(1.0, index=pd.MultiIndex.from_arrays([current_pairs, streak_state["current"][current_pairs]]))
+
+        length_counts = self.streak_length_counts[streak_type].add(current_lengths, fill_value=0).sort_index()
+        if len(length_counts) == 0:
+            return np.zeros(pair_count, dtype=int)
+
+        pair_codes = length_counts.index.get_level_values(0).to_numpy()
+        streak_lengths = length_counts.index.get_level_values(1).to_numpy()
+        streak_counts = np.bincount(pair_codes, weights=length_counts.to_numpy(), minlength=pair_count)
+
+        # The first length of every pair whose cumulative count passes the position of the quantile
+        cumulative_counts = length_counts.groupby(level=0).cumsum().to_numpy()
+        quantile_positions = np.maximum(np.ceil(quantile * streak_counts) - 1, 0)
+        is_past_quantile = cumulative_counts > quantile_positions[pair_codes]
+        first_past_quantile = is_past_quantile & np.append(True, (pair_codes[1:] != pair_codes[:-1]) | ~is_past_quantile[:-1])
+
+        streak_quantiles = np.zeros(pair_count, dtype=int)
+        streak_quantiles[pair_codes[first_past_quantile]] = streak_lengths[first_past_quantile]
+
+        return streak_quantiles
+
+    def flush_pending_exits(self, before_time: int):
+        is_final = self.pending_exit_times < before_time
+
+        self.update_drawdowns(self.pending_codes[is_final], self.pending_exit_times[is_final], self.pending_net_profits[is_final])
+
+        self.pending_codes = self.pending_codes[~is_final]
+        self.pending_exit_times = self.pending_exit_times[~is_final]
+        self.pending_net_profits = self.pending_net_profits[~is_final]
+
+    def update_drawdowns(self, pair_codes: np.ndarray, exit_times: np.ndarray, net_profits: np.ndarray):
+        """
+        Move the equity curves forward over a batch of exits, which all come after the exits already processed. Positions of a pair exiting at the same time
+        make up a single point, and the drawdown stretches, troughs and recoveries follow the same rules as calc_segment_drawdowns. Every pair's points
+        are a segment of the batch, whose curve and running peak are a cumulative sum and max starting from the pair's carried equity and peak, so only
+        the state at the end of every segment is carried over to the next batch.
+        """
+        if len(pair_codes) == 0:
+            return
+
+        order = np.lexsort((exit_times, pair_codes))
+        pair_codes, exit_times, net_profits = pair_codes[order], exit_times[order], net_profits[order]
+
+        point_starts = np.flatnonzero(np.append(True, (pair_codes[1:] != pair_codes[:-1]) | (exit_times[1:] != exit_times[:-1])))
+        point_profits = np.add.reduceat(net_profits, point_starts)
+        pair_codes, point_times = pair_codes[point_starts], exit_times[point_starts]
+        point_count = len(pair_codes)
+
+        is_pair_start = np.append(True, pair_codes[1:] != pair_codes[:-1])
+        is_pair_end = np.append(is_pair_start[1:], True)
+
+        # The curves and running peaks continue from the carried state of every pair
+        equity_curves = calc_segment_equity_curves(point_profits, pair_codes) + self.equities[pair_codes]
+        peaks = np.maximum(pd.Series(equity_curves).groupby(pair_codes).cummax().to_numpy(), self.peaks[pair_codes])
+        drawdowns = peaks - equity_curves
+        at_peak = drawdowns <= 1e-9 * (1 + np.abs(peaks))
+
+        # A stretch starts at a point below the peak after one at it, and ends at the first point back at it. A pair that was below its peak at the end of
+        # the previous batch continues that stretch, marked at its first point with the carried start.
+        was_at_peak = np.where(is_pair_start, self.stretch_starts[pair_codes] == missing_time, np.append(True, at_peak[:-1]))
+        stretch_marks = (~at_peak & was_at_peak) | (is_pair_start & ~was_at_peak)
+        mark_times = np.where(is_pair_start & ~was_at_peak, self.stretch_starts[pair_codes], point_times)
+        stretch_start_times = mark_times[np.maximum.accumulate(np.where(stretch_marks, np.arange(point_count), 0))]
+
+        stretch_ends = at_peak & ~was_at_peak
+        np.maximum.at(self.max_durations, pair_codes[stretch_ends], (point_times[stretch_ends] - stretch_start_times[stretch_ends]) / NANOSECONDS_PER_DAY)
+
+        # Recoveries of the max drawdowns carried over from the previous batch, at the pair's first point back at its peak
+        recovery_points = np.flatnonzero(at_peak)
+        first_recoveries = recovery_points[np.unique(pair_codes[recovery_points], return_index=True)[1]]
+        is_recovered = self.trough_times[pair_codes[first_recoveries]] != missing_time
+        recovered_pairs, recovery_times = pair_codes[first_recoveries][is_recovered], point_times[first_recoveries][is_recovered]
+        self.recovery_times[recovered_pairs] = (recovery_times - self.trough_times[recovered_pairs]) / NANOSECONDS_PER_DAY
+        self.trough_times[recovered_pairs] = missing_time
+
+        # New max drawdowns, whose trough is the first point reaching them, recovered at the first point back at the peak after it within the batch
+        batch_max_drawdowns = np.full(len(self.max_drawdowns), -np.inf)
+        np.maximum.at(batch_max_drawdowns, pair_codes[~at_peak], drawdowns[~at_peak])
+        is_trough = ~at_peak & (drawdowns == batch_max_drawdowns[pair_codes]) & (drawdowns > self.max_drawdowns[pair_codes])
+        troughs = np.flatnonzero(is_trough)
+        troughs = troughs[np.unique(pair_codes[troughs], return_index=True)[1]]
+        trough_pairs = pair_codes[troughs]
+
+        next_recoveries = recovery_points[np.minimum(np.searchsorted(recovery_points, troughs), max(len(recovery_points) - 1, 0))] if len(recovery_points) > 0 \
+            else troughs
+        has_recovery = (next_recoveries > troughs) & (pair_codes[next_recoveries] == trough_pairs)
+
+        self.max_drawdowns[trough_pairs] = drawdowns[troughs]
+        self.trough_times[trough_pairs] = np.where(has_recovery, missing_time, point_times[troughs])
+        self.recovery_times[trough_pairs] = np.where(has_recovery, (point_times[next_recoveries] - point_times[troughs]) / NANOSECONDS_PER_DAY, np.nan)
+
+        # The state at the last point of every pair
+        last_pairs = pair_codes[is_pair_end]
+        self.equities[last_pairs] = equity_curves[is_pair_end]
+        self.peaks[last_pairs] = peaks[is_pair_end]
+        self.last_times[last_pairs] = point_times[is_pair_end]
+        self.stretch_starts[last_pairs] = np.where(at_peak[is_pair_end], missing_time, stretch_start_times[is_pair_end])
+
+    def create_pair_metrics(self) -> pd.DataFrame:
+        """
+        Process the remaining buffered exits and build the BaseReport metrics from the accumulators, in the same layout as create_pair_metrics.
+        """
+        self.flush_pending_exits(np.iinfo(np.int64).max)
+
+        # Stretches that haven't ended by the end of the curve last until its last point
+        in_stretch = self.stretch_starts != missing_time
+        self.max_durations[in_stretch] = np.maximum(self.max_durations[in_stretch],
+                                                    (self.last_times[in_stretch] - self.stretch_starts[in_stretch]) / NANOSECONDS_PER_DAY)
+
+        month_list = calc_total_months(pd.DataFrame({"Entry time": [self.min_entry_time], "Exit time": [self.max_exit_time]}))
+        pair_count = len(self.pair_list)
+
+        # Pair x month matrices over month_list
+        monthly_net_profits = np.zeros((pair_count, len(month_list)))
+        monthly_position_counts = np.zeros((pair_count, len(month_list)))
+        if len(self.monthly_net_profits) > 0:
+            pair_codes = self.monthly_net_profits.index.get_level_values(0).to_numpy()
+            month_indices = self.monthly_net_profits.index.get_level_values(1).to_numpy() - calc_month_codes(month_list[:1])[0]
+            in_month_list = (month_indices >= 0) & (month_indices < len(month_list))
+
+            monthly_net_profits[pair_codes[in_month_list], month_indices[in_month_list]] = self.monthly_net_profits.to_numpy()[in_month_list]
+            monthly_position_counts[pair_codes[in_month_list], month_indices[in_month_list]] = self.monthly_position_counts.to_numpy()[in_month_list]
+
+        streak_averages = {
+            streak_type: np.divide(self.win_counts if streak_type == "wins" else self.loss_counts, streak_state["counts"], out=np.zeros(pair_count),
+                                   where=streak_state["counts"] > 0)
+            for streak_type, streak_state in self.streak_states.items()
+        }
+
+        pair_metrics_df = pd.DataFrame({
+            "Pair name": self.pair_list,
+            "Number of positions - total": self.position_counts,
+            "Performance - total": calc_monthly_performance(monthly_net_profits),
+            "Winrate - total": self.win_counts / np.maximum(self.position_counts, 1) * 100,
+            "Net profit - total": self.net_profit_totals,
+            "Gross profit - total": self.gross_profits,
+            "Gross loss - total": self.gross_losses,
+            "Largest profit in a trade - total": self.largest_profits,
+            "Average profit per trade - total": self.net_profit_totals / np.maximum(self.position_counts, 1),
+            "Total months": len(month_list),
+            "Missing months": calc_monthly_missing_months(monthly_position_counts),
+            "Max drawdown - total": self.max_drawdowns,
+            "Max drawdown duration (days)": self.max_durations,
+            "Max drawdown recovery (days)": self.recovery_times,
+            "Average consecutive wins": streak_averages["wins"],
+            "Max consecutive wins": self.streak_states["wins"]["max"],
+            f"Consecutive wins P{streak_quantile * 100:g}": self.calc_streak_quantiles("wins", streak_quantile),
+            "Average consecutive losses": streak_averages["losses"],
+            "Max consecutive losses": self.streak_states["losses"]["max"],
+            f"Consecutive losses P{streak_quantile * 100:g}": self.calc_streak_quantiles("losses", streak_quantile),
+            "Average loss per position - total": np.divide(self.gross_losses, self.loss_counts, out=np.full(pair_count, np.nan), where=self.loss_counts > 0),
+            "Max drawdown - trade order": self.trade_drawdowns
+        })
+
+        # Pairs without closed positions are left out, like in create_pair_metrics
+        pair_order = self.get_pair_order()
+        return pair_metrics_df.iloc[pair_order][self.position_counts[pair_order] > 0].reset_index(drop=True)
+
+
+@instrumented("stage")
+def create_streaming_pair_metrics(file_path: str, position_type: str | None = None, chunk_size: int = 100_000) -> pd.DataFrame:
+    """
+    Calculate the BaseReport metrics of a CSV or Parquet positions file chunk by chunk, see StreamingPairMetrics. The rows of the file have to be sorted by
+    "Entry time".
+
+    Args:
+        file_path (str): The path of the positions file.
+        position_type (str | None): Only use the positions of this type, matched in any case, if given.
+        chunk_size (int): The number of rows read at a time.
+
+    Returns:
+        pd.DataFrame: One row per pair with closed positions, without the Score column.
+    """
+    streaming_pair_metrics = StreamingPairMetrics()
+
+    for positions_chunk in iter_positions_chunks(file_path, chunk_size=chunk_size):
+        if position_type:
+            positions_chunk = positions_chunk[positions_chunk["Type"].str.lower() == position_type.lower()]
+
+        streaming_pair_metrics.add_chunk(positions_chunk)
+
+    return streaming_pair_metrics.create_pair_metrics()
@@ -0,0 +1,246 @@
+import numpy as np
+import pandas as pd
+
+from reports.instrumentation import instrumented
+
+# The quantile of the streak lengths reported next to their average and max
+streak_quantile = 0.9
+
+
+def calc_segment_equity_curves(net_profits: np.ndarray, segment_codes: np.ndarray) -> np.ndarray:
+    # The cumulative net profit of every segment's trades, restarting at each segment, from a single cumulative sum over all of them
+    cumulative_net_profits = np.cumsum(net_profits)
+    segment_starts = np.append(True, segment_codes[1:] != segment_codes[:-1])
+    segment_start_positions = np.maximum.accumulate(np.where(segment_starts, np.arange(len(net_profits)), 0))
+
+    return cumulative_net_profits - (cumulative_net_profits - net_profits)[segment_start_positions]
+
+
+def calc_run_quantiles(run_segments: np.ndarray, run_lengths: np.ndarray, segment_count: int, quantile: float) -> np.ndarray:
+    # The quantile of the run lengths of every segment, the shortest length that at least that share of the runs are no longer than, 0 with no runs
+    run_counts = np.bincount(run_segments, minlength=segment_count)
+    if len(run_lengths) == 0:
+        return np.zeros(segment_count, dtype=int)
+
+    sorted_lengths = run_lengths[np.lexsort((run_lengths, run_segments))]
+    quantile_positions = np.cumsum(run_counts) - run_counts + np.maximum(np.ceil(quantile * run_counts).astype(int) - 1, 0)
+
+    return np.where(run_counts > 0, sorted_lengths[np.minimum(quantile_positions, len(sorted_lengths) - 1)], 0)
+
+
+@instrumented()
+def calc_segment_trade_stats(net_profits: np.ndarray, segment_codes: np.ndarray, segment_count: int) -> dict:
+    """
+    Calculate the trade sequence statistics of many groups of trades at once, e.g. the positions of every pair, in one segmented pass. The groups are laid
+    end to end, in the order the trades are counted in, and the trades are run-length encoded by their outcome, win, loss or flat, so that every run of
+    wins or losses is a streak and a streak never crosses from one group into the next. The equity curves are cumulative sums restarting at every group,
+    and their drawdowns are measured from the running peak from the first trade on, like calc_path_stats.
+
+    Args:
+        net_profits (np.ndarray): The net profits of the trades.
+        segment_codes (np.ndarray): The group code of every trade, sorted, from 0 to segment_count - 1.
+        segment_count (int): The number of groups.
+
+    Returns:
+        dict: The streak, loss and drawdown columns of the BaseReport and FinalReport, each an array with one value per group. Groups without trades,
+            or without streaks of a kind, get 0, and the average loss is NaN for groups without losses.
+    """
+    net_profits = np.asarray(net_profits, dtype=float)
+    segment_codes = np.asarray(segment_codes)
+    outcomes = np.sign(net_profits).astype(np.int8)
+
+    # Every run of trades with the same outcome within a group
+    run_starts = np.flatnonzero(np.append(True, (outcomes[1:] != outcomes[:-1]) | (segment_codes[1:] != segment_codes[:-1]))) if len(outcomes) > 0 \
+        else np.zeros(0, dtype=int)
+    run_lengths = np.diff(np.append(run_starts, len(outcomes)))
+    run_outcomes = outcomes[run_starts]
+    run_segments = segment_codes[run_starts]
+
+    streak_columns = {}
+    for outcome, streak_name in ((1, "wins"), (-1, "losses")):
+        is_streak = run_outcomes == outcome
+        streak_segments, streak_lengths = run_segments[is_streak], run_lengths[is_streak]
+
+        streak_counts = np.bincount(streak_segments, minlength=segment_count)
+        streak_length_sums = np.bincount(streak_segments, weights=streak_lengths, minlength=segment_count)
+        max_streaks = np.zeros(segment_count, dtype=int)
+        np.maximum.at(max_streaks, streak_segments, streak_lengths)
+
+        streak_columns[f"Average consecutive {streak_name}"] = np.divide(streak_length_sums, streak_counts, out=np.zeros(segment_count),
+                                                                         where=streak_counts > 0)
+        streak_columns[f"Max consecutive {streak_name}"] = max_streaks
+        streak_columns[f"Consecutive {streak_name} P{streak_quantile * 100:g}"] = calc_run_quantiles(streak_segments, streak_lengths, segment_count,
+                                                                                                     streak_quantile)
+
+    # The average loss of the losing trades
+    is_loss = outcomes < 0
+    loss_counts = np.bincount(segment_codes[is_loss], minlength=segment_count)
+    gross_losses = np.bincount(segment_codes[is_loss], weights=net_profits[is_loss], minlength=segment_count)
+
+    # Drawdowns of the equity curves in trade order, the first trade of a group always being at its peak
+    equity_curves = calc_segment_equity_curves(net_profits, segment_codes)
+    trade_drawdowns = np.zeros(segment_count)
+    if segment_count == 1 and len(equity_curves) > 0:
+        # A single sequence, e.g. a FinalReport row, doesn't need the grouping
+        trade_drawdowns[0] = (np.maximum.accumulate(equity_curves) - equity_curves).max()
+    elif len(equity_curves) > 0:
+        np.maximum.at(trade_drawdowns, segment_codes, pd.Series(equity_curves).groupby(segment_codes).cummax().to_numpy() - equity_curves)
+
+    return {
+        **streak_columns,
+        "Average loss per position - total": np.divide(gross_losses, loss_counts, out=np.full(segment_count, np.nan), where=loss_counts > 0),
+        "Max drawdown - trade order": trade_drawdowns
+    }
+
+
+class TradeSequenceTree:
+    """
+    The trade sequence statistics of a growing subset of a fixed sequence of trades, e.g. of the positions of the pairs merged so far in entry time order,
+    kept up to date as trades are added instead of being recounted over the whole subset. Every node of a segment tree over the sequence combines the
+    trades under it that were added: their number, the sum, highest and lowest point of their equity curve and its max drawdown, and the runs of wins
+    and losses at its start and end. Adding trades only recombines the nodes above them. The streaks need every run length, so the tree also keeps a
+    histogram of them, which adding trades only changes at the runs they join, split or end.
+
+    The equity curve and streaks are the same as those of calc_segment_trade_stats over the added trades in sequence order.
+    """
+
+    def __init__(self, net_profits: np.ndarray):
+        self.net_profits = np.asarray(net_profits, dtype=float)
+        self.outcome_columns = np.where(self.net_profits > 0, 0, np.where(self.net_profits < 0, 1, -1))
+
+        # The leaves start at leaf_offset, node n having the children 2n and 2n + 1 and the root being node 1
+        self.depth = max(int(len(self.net_profits) - 1).bit_length(), 1)
+        self.leaf_offset = 1 << self.depth
+        node_count = 2 * self.leaf_offset
+
+        self.counts = np.zeros(node_count, dtype=np.int64)
+        self.sums = np.zeros(node_count)
+        self.highs = np.full(node_count, -np.inf)
+        self.lows = np.full(node_count, np.inf)
+        self.drawdowns = np.zeros(node_count)
+
+        # The runs of wins (column 0) and losses (column 1) at the start and end of every node
+        self.leading_runs = np.zeros((node_count, 2), dtype=np.int64)
+        self.trailing_runs = np.zeros((node_count, 2), dtype=np.int64)
+
+        # The number of wins and losses, and of their runs by length
+        self.outcome_counts = np.zeros(2, dtype=np.int64)
+        self.run_length_counts = np.zeros((2, len(self.net_profits) + 1), dtype=np.int64)
+        self.run_counts = np.zeros(2, dtype=np.int64)
+        self.max_runs = np.zeros(2, dtype=np.int64)
+
+    def update_nodes(self, nodes: np.ndarray):
+        # Combine the nodes from their children, the left one holding the earlier trades
+        left, right = 2 * nodes, 2 * nodes + 1
+        left_counts, right_counts = self.counts[left], self.counts[right]
+        left_sums, left_highs = self.sums[left], self.highs[left]
+
+        self.counts[nodes] = left_counts + right_counts
+        self.sums[nodes] = left_sums + self.sums[right]
+        self.highs[nodes] = np.maximum(left_highs, left_sums + self.highs[right])
+        self.drawdowns[nodes] = np.maximum(np.maximum(self.drawdowns[left], self.drawdowns[right]), left_highs - (left_sums + self.lows[right]))
+        self.lows[nodes] = np.minimum(self.lows[left], left_sums + self.lows[right])
+
+        left_leading_runs, right_trailing_runs = self.leading_runs[left], self.trailing_runs[right]
+        self.leading_runs[nodes] = left_leading_runs + np.where(left_leading_runs == left_counts[:, np.newaxis], self.leading_runs[right], 0)
+        self.trailing_runs[nodes] = right_trailing_runs + np.where(right_trailing_runs == right_counts[:, np.newaxis], self.trailing_runs[left], 0)
+
+    def calc_neighbour_runs(self, trades: np.ndarray) -> (np.ndarray, np.ndarray, np.ndarray):
+        """
+        The number of added trades before every trade, and the runs of wins and losses among them that end right before it and start right after it, as
+        trades x 2 arrays, leaving the trade itself out. The siblings on the way up from the leaf of a trade hold the trades on either side of it, which
+        extend a run as long as it covers every trade passed so far on that side.
+        """
+        nodes = trades + self.leaf_offset
+        before_counts, after_counts = np.zeros(len(trades), dtype=np.int64), np.zeros(len(trades), dtype=np.int64)
+        trailing_runs, leading_runs = np.zeros((len(trades), 2), dtype=np.int64), np.zeros((len(trades), 2), dtype=np.int64)
+
+        for _ in range(self.depth):
+            siblings = nodes ^ 1
+            sibling_counts = self.counts[siblings]
+            is_before = nodes & 1 == 1
+
+            extends_trailing_run = is_before[:, np.newaxis] & (trailing_runs == before_counts[:, np.newaxis])
+            extends_leading_run = ~is_before[:, np.newaxis] & (leading_runs == after_counts[:, np.newaxis])
+            trailing_runs += np.where(extends_trailing_run, self.trailing_runs[siblings], 0)
+            leading_runs += np.where(extends_leading_run, self.leading_runs[siblings], 0)
+            before_counts += np.where(is_before, sibling_counts, 0)
+            after_counts += np.where(is_before, 0, sibling_counts)
+            nodes >>= 1
+
+        return before_counts, trailing_runs, leading_runs
+
+    def count_runs(self, outcome_columns: np.ndarray, run_starts: np.ndarray, run_lengths: np.ndarray, sign: int):
+        # Add runs to the histogram with the given sign, i.e. remove them with -1. The same run can be listed more than once, so they're told apart by
+        # their outcome and the number of added trades before them.
+        is_run = run_lengths > 0
+        outcome_columns, run_starts, run_lengths = outcome_columns[is_run], run_starts[is_run], run_lengths[is_run]
+        _, run_indices = np.unique(outcome_columns * (len(self.net_profits) + 1) + run_starts, return_index=True)
+        outcome_columns, run_lengths = outcome_columns[run_indices], run_lengths[run_indices]
+
+        np.add.at(self.run_length_counts, (outcome_columns, run_lengths), sign)
+        self.run_counts += sign * np.bincount(outcome_columns, minlength=2)
+
+        # The longest runs only grow by the added ones, and otherwise shrink to the longest length still counted
+        for outcome_column in range(2):
+            if sign > 0 and (outcome_columns == outcome_column).any():
+                self.max_runs[outcome_column] = max(self.max_runs[outcome_column], run_lengths[outcome_columns == outcome_column].max())
+            while self.max_runs[outcome_column] > 0 and self.run_length_counts[outcome_column, self.max_runs[outcome_column]] == 0:
+                self.max_runs[outcome_column] -= 1
+
+    def add(self, trades: np.ndarray):
+        """
+        Add trades, sorted and not added before, to the statistics. The runs that change are the ones next to the added trades or running on through
+        them, so the histogram drops the lengths of the runs on both sides of every added trade and takes those of the runs next to it and through it
+        once the trades are in.
+        """
+        trades = np.asarray(trades, dtype=np.int64)
+        if len(trades) == 0:
+            return
+
+        # A run with trades on both sides of an added trade is split or joined by it, and one on either side is ended or extended
+        before_counts, trailing_runs, leading_runs = self.calc_neighbour_runs(trades)
+        before_counts = before_counts[:, np.newaxis]
+        run_columns = np.broadcast_to(np.arange(2), trailing_runs.shape).ravel()
+        self.count_runs(run_columns, (before_counts - trailing_runs).ravel(), (trailing_runs + leading_runs).ravel(), -1)
+
+        leaves = trades + self.leaf_offset
+        net_profits, outcome_columns = self.net_profits[trades], self.outcome_columns[trades]
+        self.counts[leaves] = 1
+        self.sums[leaves] = self.highs[leaves] = self.lows[leaves] = net_profits
+        is_outcome = outcome_columns[:, np.newaxis] == np.arange(2)
+        self.leading_runs[leaves] = self.trailing_runs[leaves] = is_outcome
+        self.outcome_counts += is_outcome.sum(axis=0)
+
+        # The parents of the sorted nodes of a level are sorted as well, with the siblings next to each other
+        nodes = leaves
+        for _ in range(self.depth):
+            nodes = nodes >> 1
+            nodes = nodes[np.append(True, nodes[1:] != nodes[:-1])]
+            self.update_nodes(nodes)
+
+        # Every added trade is in the run of its outcome, between the runs of the other outcome that end right before it and start right after it
+        before_counts, trailing_runs, leading_runs = self.calc_neighbour_runs(trades)
+        before_counts = before_counts[:, np.newaxis]
+        run_starts = np.r_[(before_counts - trailing_runs).ravel(), np.broadcast_to(before_counts + 1, leading_runs.shape).ravel()]
+        run_lengths = np.r_[np.where(is_outcome, trailing_runs + 1 + leading_runs, trailing_runs).ravel(), np.where(is_outcome, 0, leading_runs).ravel()]
+        self.count_runs(np.r_[run_columns, run_columns], run_starts, run_lengths, 1)
+
+    def calc_stats(self) -> dict:
+        # The streak and trade order drawdown columns of calc_segment_trade_stats for the added trades, as single values
+        trade_stats = {}
+        for outcome_column, streak_name in ((0, "wins"), (1, "losses")):
+            run_count = self.run_counts[outcome_column]
+
+            # The first length whose cumulative count passes the position of the quantile, see calc_run_quantiles
+            cumulative_counts = np.cumsum(self.run_length_counts[outcome_column, :self.max_runs[outcome_column] + 1])
+            quantile_position = max(int(np.ceil(streak_quantile * run_count)) - 1, 0)
+
+            trade_stats[f"Average consecutive {streak_name}"] = self.outcome_counts[outcome_column] / run_count if run_count > 0 else 0.0
+            trade_stats[f"Max consecutive {streak_name}"] = self.max_runs[outcome_column]
+            trade_stats[f"Consecutive {streak_name} P{streak_quantile * 100:g}"] = \
+                int(np.argmax(cumulative_counts > quantile_position)) if run_count > 0 else 0
+
+        trade_stats["Max drawdown - trade order"] = self.drawdowns[1]
+
+        return trade_stats
@@ -0,0 +1,315 @@
+import numpy as np
+import pandas as pd
+
+from reports.base_report_utils import rank_base_report
+from reports.equity_utils import build_segment_equity_curves
+from reports.instrumentation import instrumented
+from reports.month_matrix import calc_month_codes
+from reports.pair_metrics import calc_pair_metric_arrays
+from reports.positions_store import PositionsStore
+
+
+def calc_month_streak_summaries(flags: np.ndarray, group_codes: np.ndarray, group_count: int) -> dict:
+    """
+    Summarize the streaks of True values in many groups of positions, e.g. the wins of every pair in every month, so that the streaks of consecutive groups
+    can be combined without going back to the positions. A group's summary holds its number of positions, whether they're all True, the lengths of its
+    leading and trailing streaks and of its longest one, its number of streaks and its number of True values.
+
+    Args:
+        flags (np.ndarray): Boolean array, e.g. whether each position was a win, in the order the streaks are counted in within each group.
+        group_codes (np.ndarray): The sorted group code of every value, from 0 to group_count - 1.
+        group_count (int): The number of groups.
+
+    Returns:
+        dict: The "positions", "all_flagged", "leading_run", "trailing_run", "max_run", "run_count" and "flagged" of every group.
+    """
+    position_counts = np.bincount(group_codes, minlength=group_count)
+    group_ends = np.cumsum(position_counts)
+    group_starts = group_ends - position_counts
+    positions = np.arange(len(flags))
+
+    # The leading streak ends at the first False value of a group and the trailing one starts after its last one
+    first_unflagged = group_ends.copy()
+    np.minimum.at(first_unflagged, group_codes[~flags], positions[~flags])
+    last_unflagged = group_starts - 1
+    np.maximum.at(last_unflagged, group_codes[~flags], positions[~flags])
+
+    # A streak starts at a True value that is either the first of its group or follows a False value
+    streak_starts = flags & np.append(True, ~flags[:-1] | (group_codes[1:] != group_codes[:-1]))
+    streak_ids = np.cumsum(streak_starts) - 1
+    streak_lengths = np.bincount(streak_ids[flags], minlength=streak_starts.sum())
+
+    max_runs = np.zeros(group_count, dtype=int)
+    np.maximum.at(max_runs, group_codes[streak_starts], streak_lengths)
+
+    return {
+        "positions": position_counts,
+        "all_flagged": first_unflagged == group_ends,
+        "leading_run": first_unflagged - group_starts,
+        "trailing_run": group_ends - 1 - last_unflagged,
+        "max_run": max_runs,
+        "run_count": np.bincount(group_codes[streak_starts], minlength=group_count),
+        "flagged": np.bincount(group_codes, weights=flags, minlength=group_count).astype(int)
+    }
+
+
+def combine_streak_summaries(first: dict, second: dict) -> dict:
+    # The streak summary of the positions of first followed by those of second. The trailing streak of first and the leading one of second join up.
+    joined_run = first["trailing_run"] + second["leading_run"]
+    runs_join = (first["trailing_run"] > 0) & (second["leading_run"] > 0)
+
+    return {
+        "positions": first["positions"] + second["positions"],
+        "all_flagged": first["all_flagged"] & second["all_flagged"],
+        "leading_run": np.where(first["all_flagged"], joined_run, first["leading_run"]),
+        "trailing_run": np.where(second["all_flagged"], joined_run, second["trailing_run"]),
+        "max_run": np.maximum(np.maximum(first["max_run"], second["max_run"]), joined_run),
+        "run_count": first["run_count"] + second["run_count"] - runs_join,
+        "flagged": first["flagged"] + second["flagged"]
+    }
+
+
+def calc_month_drawdown_summaries(curve_groups: np.ndarray, equity_curves: np.ndarray, segment_codes: np.ndarray, group_count: int) -> dict:
+    """
+    Summarize the stretches of many equity curves that fall in each group, e.g. every pair's curve in every month, so that the max drawdown of consecutive
+    groups can be combined without going back to the curves. Relative to the equity before the stretch, a group's summary holds its total change, its
+    highest and lowest points and its max drawdown from a peak within the stretch. Groups without points get the identity of combine_drawdown_summaries.
+
+    Args:
+        curve_groups (np.ndarray): The sorted group code of every curve point.
+        equity_curves (np.ndarray): The cumulative equity at each of the points, restarting from each curve's own first point.
+        segment_codes (np.ndarray): The curve code of every point, so that a stretch at the start of a curve starts from zero equity.
+        group_count (int): The number of groups.
+
+    Returns:
+        dict: The "change", "peak", "trough" and "max_drawdown" of every group.
+    """
+    is_group_start = np.append(True, curve_groups[1:] != curve_groups[:-1])
+    continues_curve = np.append(False, segment_codes[1:] == segment_codes[:-1])
+
+    # The equity of every point relative to the equity before its group's first point, which is zero for a group starting a curve
+    group_starts = np.flatnonzero(is_group_start)
+    base_equities = np.where(continues_curve[group_starts], equity_curves[np.maximum(group_starts - 1, 0)], 0)
+    relative_equity = equity_curves - base_equities[np.cumsum(is_group_start) - 1]
+    relative_groups = pd.Series(relative_equity).groupby(curve_groups)
+
+    changes = np.zeros(group_count)
+    peaks = np.full(group_count, -np.inf)
+    troughs = np.full(group_count, np.inf)
+    max_drawdowns = np.zeros(group_count)
+
+    if len(curve_groups) > 0:
+        group_codes = curve_groups[is_group_start]
+        changes[group_codes] = relative_groups.last().to_numpy()
+        peaks[group_codes] = relative_groups.max().to_numpy()
+        troughs[group_codes] = relative_groups.min().to_numpy()
+        np.maximum.at(max_drawdowns, curve_groups, relative_groups.cummax().to_numpy() - relative_equity)
+
+    return {"change": changes, "peak": peaks, "trough": troughs, "max_drawdown": max_drawdowns}
+
+
+def combine_drawdown_summaries(first: dict, second: dict) -> dict:
+    # The drawdown summary of the stretch of first followed by that of second, the drawdowns across them running from a peak of first to a trough of second
+    return {
+        "change": first["change"] + second["change"],
+        "peak": np.maximum(first["peak"], first["change"] + second["peak"]),
+        "trough": np.minimum(first["trough"], first["change"] + second["trough"]),
+        "max_drawdown": np.maximum(np.maximum(first["max_drawdown"], second["max_drawdown"]), first["peak"] - (first["change"] + second["trough"]))
+    }
+
+
+class PairMonthSummaries:
+    """
+    The per-pair metrics of every month, kept so that the BaseReport metrics of any window of months come from them instead of the positions. The totals
+    are prefix sums over the months, so that a window's totals are the difference of two rows. The largest profits are per-month maxima, and the
+    streaks and drawdowns are month summaries folded across the window.
+
+    The positions of a window are the ones exiting in its months, and the streaks are counted in entry order within every exit month. The drawdowns are
+    measured on the exact exit time equity curves, like the default equity_curve_timeframe.
+    """
+
+    def __init__(self, closed_positions: PositionsStore, pair_list: list):
+        """
+        Args:
+            closed_positions (PositionsStore): The closed positions, sorted by entry time.
+            pair_list (list): The pairs to summarize, positions of other pairs are left out.
+        """
+        self.pair_list = list(pair_list)
+        self.month_list = closed_positions.month_list
+        pair_count = len(self.pair_list)
+        month_count = len(self.month_list)
+
+        pair_ranks = closed_positions.get_pair_ranks(self.pair_list)
+        month_indices = closed_positions.exit_month_indices
+        in_window = (pair_ranks >= 0) & (month_indices >= 0) & (month_indices < month_count)
+
+        # The positions grouped by pair and exit month, keeping their entry time order within each group
+        group_codes = pair_ranks[in_window].astype(np.int64) * month_count + month_indices[in_window]
+        order = np.argsort(group_codes, kind="stable")
+        group_codes = group_codes[order]
+        net_profits = closed_positions.net_profits[in_window].astype(float)[order]
+        exit_times = closed_positions.exit_datetimes[in_window][order]
+        group_count = pair_count * month_count
+
+        is_win = net_profits > 0
+        is_loss = net_profits < 0
+
+        def sum_by_month(values=None) -> np.ndarray:
+            # A pair x month matrix of the sums of values in every month
+            return np.bincount(group_codes, weights=values, minlength=group_count).reshape(pair_count, month_count)
+
+        monthly_position_counts = sum_by_month()
+        monthly_net_profits = sum_by_month(net_profits)
+
+        # Every total is summed over the months with a zero column in front, so that column i holds the total of the months before month i
+        self.prefix_sums = {name: np.concatenate([np.zeros((pair_count, 1)), np.cumsum(monthly_values, axis=1)], axis=1) for name, monthly_values in {
+            "positions": monthly_position_counts,
+            "net_profit": monthly_net_profits,
+            "gross_profit": sum_by_month(np.where(is_win, net_profits, 0)),
+            "gross_loss": sum_by_month(np.where(is_loss, net_profits, 0)),
+            "wins": sum_by_month(is_win),
+            "active_months": monthly_position_counts > 0,
+            "positive_months": monthly_net_profits > 0,
+            "negative_months": monthly_net_profits < 0
+        }.items()}
+
+        largest_profits = np.zeros(group_count)
+        np.maximum.at(largest_profits, group_codes, np.where(is_win, net_profits, 0))
+        self.largest_profits = largest_profits.reshape(pair_count, month_count)
+
+        self.win_streaks = {name: summary.reshape(pair_count, month_count)
+                            for name, summary in calc_month_streak_summaries(is_win, group_codes, group_count).items()}
+        self.loss_streaks = {name: summary.reshape(pair_count, month_count)
+                             for name, summary in calc_month_streak_summaries(is_loss, group_codes, group_count).items()}
+
+        # The per-pair equity curves, cut into months by the exit time of every point
+        pair_codes = group_codes // month_count if month_count > 0 else group_codes
+        curve_codes, curve_times, equity_curves = build_segment_equity_curves(pair_codes, exit_times, net_profits)
+        first_month_code = calc_month_codes(self.month_list[:1])[0] if month_count > 0 else 0
+        curve_groups = curve_codes * month_count + (calc_month_codes(curve_times) - first_month_code)
+        self.drawdowns = {name: summary.reshape(pair_count, month_count)
+                          for name, summary in calc_month_drawdown_summaries(curve_groups, equity_curves, curve_codes, group_count).items()}
+
+    def fold_months(self, month_summaries: dict, first_month: int, last_month: int, combine) -> dict:
+        # The summaries of every pair over the months first_month..last_month - 1, combined in month order
+        window_summaries = {name: summary[:, first_month] for name, summary in month_summaries.items()}
+        for month_index in range(first_month + 1, last_month):
+            window_summaries = combine(window_summaries, {name: summary[:, month_index] for name, summary in month_summaries.items()})
+
+        return window_summaries
+
+    @instrumented()
+    def calc_window_pair_metrics(self, first_month: int, last_month: int) -> pd.DataFrame:
+        """
+        Calculate the BaseReport metrics of every pair over the months first_month..last_month - 1 of month_list.
+
+        Returns:
+            pd.DataFrame: One row per pair with positions exiting in the window, in the order of pair_list, without the Score column.
+        """
+        totals = {name: prefix_sums[:, last_month] - prefix_sums[:, first_month] for name, prefix_sums in self.prefix_sums.items()}
+        win_streaks = self.fold_months(self.win_streaks, first_month, last_month, combine_streak_summaries)
+        loss_streaks = self.fold_months(self.loss_streaks, first_month, last_month, combine_streak_summaries)
+        drawdowns = self.fold_months(self.drawdowns, first_month, last_month, combine_drawdown_summaries)
+
+        has_positions = totals["positions"] > 0
+        position_counts = np.where(has_positions, totals["positions"], 1)
+        traded_months = totals["positive_months"] + totals["negative_months"]
+
+        window_metrics_df = pd.DataFrame({
+            "Pair name": self.pair_list,
+            "Number of positions - total": totals["positions"].astype(int),
+            "Performance - total": np.divide(totals["positive_months"] * 100, traded_months, out=np.full(len(self.pair_list), np.nan),
+                                             where=traded_months > 0),
+            "Winrate - total": totals["wins"] / position_counts * 100,
+            "Net profit - total": totals["net_profit"],
+            "Gross profit - total": totals["gross_profit"],
+            "Gross loss - total": totals["gross_loss"],
+            "Largest profit in a trade - total": self.largest_profits[:, first_month:last_month].max(axis=1, initial=0),
+            "Average profit per trade - total": totals["net_profit"] / position_counts,
+            "Total months": last_month - first_month,
+            "Missing months": (last_month - first_month - totals["active_months"]).astype(int),
+            "Max drawdown - total": drawdowns["max_drawdown"],
+            "Average consecutive wins": np.divide(win_streaks["flagged"], win_streaks["run_count"], out=np.zeros(len(self.pair_list)),
+                                                  where=win_streaks["run_count"] > 0),
+            "Max consecutive wins": win_streaks["max_run"],
+            "Average consecutive losses": np.divide(loss_streaks["flagged"], loss_streaks["run_count"], out=np.zeros(len(self.pair_list)),
+                                                    where=loss_streaks["run_count"] > 0),
+            "Max consecutive losses": loss_streaks["max_run"]
+        })
+
+        return window_metrics_df[has_positions].reset_index(drop=True)
+
+
+def iter_walk_forward_windows(month_count: int, train_months: int, test_months: int, step_months: int):
+    # The (train start, test start, test end) month indices of every window that fits in month_count months
+    for train_start in range(0, month_count - train_months - test_months + 1, step_months):
+        yield train_start, train_start + train_months, train_start + train_months + test_months
+
+
+@instrumented()
+def create_walk_forward_report(closed_positions: PositionsStore, pair_list: list, train_months: int, test_months: int = 1, step_months: int = 1,
+                               top_n: int = 30) -> pd.DataFrame:
+    """
+    Select pairs walking forward through the months: at every step the pairs are ranked like the BaseReport on the train_months months of the train
+    window, and the combined positions of the top_n of them are measured like a FinalReport row on the test_months months right after it. The windows then
+    move on by step_months. The ranking metrics of a window come from PairMonthSummaries, so the positions are only grouped once however many windows
+    there are.
+
+    Args:
+        closed_positions (PositionsStore): The closed positions, sorted by entry time.
+        pair_list (list): The pairs to choose from.
+        train_months (int): The length of the train windows, in months.
+        test_months (int): The length of the test windows, in months.
+        step_months (int): The number of months the windows move by.
+        top_n (int): The number of pairs selected in every window.
+
+    Returns:
+        pd.DataFrame: One row per window, with its months, the selected pairs, their net profit in the train window and the unscaled out-of-sample
+            metrics of their combined positions in the test window.
+    """
+    if train_months <= 0 or test_months <= 0 or step_months <= 0:
+        raise ValueError("The walk-forward train, test and step lengths have to be at least one month")
+
+    month_list = closed_positions.month_list
+    pair_month_summaries = PairMonthSummaries(closed_positions, pair_list)
+
+    # The positions ordered by exit month, so that the positions of a test window are a slice, keeping their entry time order within each month
+    exit_month_indices = closed_positions.exit_month_indices
+    exit_month_order = np.argsort(exit_month_indices, kind="stable")
+    month_offsets = np.searchsorted(exit_month_indices[exit_month_order], np.arange(len(month_list) + 1))
+    pair_ranks = closed_positions.get_pair_ranks(pair_list)
+
+    walk_forward_rows = []
+
+    for train_start, test_start, test_end in iter_walk_forward_windows(len(month_list), train_months, test_months, step_months):
+        train_metrics_df = pair_month_summaries.calc_window_pair_metrics(train_start, test_start)
+        if len(train_metrics_df) > 0:
+            train_metrics_df = rank_base_report(train_metrics_df)
+        selected_pairs = train_metrics_df["Pair name"][:top_n].tolist()
+
+        # The positions of the selected pairs exiting in the test window, back in entry time order
+        is_selected = np.zeros(len(pair_list) + 1, dtype=bool)
+        is_selected[pd.Index(pair_list).get_indexer(selected_pairs)] = True
+        test_positions = exit_month_order[month_offsets[test_start]:month_offsets[test_end]]
+        test_positions = np.sort(test_positions[is_selected[pair_ranks[test_positions]]])
+
+        window_row = {
+            "Train start": month_list[train_start].strftime("%Y-%m"),
+            "Train end": month_list[test_start - 1].strftime("%Y-%m"),
+            "Test start": month_list[test_start].strftime("%Y-%m"),
+            "Test end": month_list[test_end - 1].strftime("%Y-%m"),
+            "Selected pairs": len(selected_pairs),
+            "Pairs": ", ".join(selected_pairs),
+            "Net profit - train": float(train_metrics_df["Net profit - total"][:top_n].sum())
+        }
+
+        if len(test_positions) > 0:
+            test_metrics = calc_pair_metric_arrays(np.zeros(len(test_positions), dtype=int), closed_positions.net_profits[test_positions].astype(float),
+                                                   closed_positions.exit_datetimes[test_positions], 1, month_list[test_start:test_end])
+            window_row.update({column: values[0] for column, values in test_metrics.items()})
+        else:
+            window_row.update({"Number of positions - total": 0, "Total months": test_end - test_start, "Missing months": test_end - test_start})
+
+        walk_forward_rows.append(window_row)
+
+    return pd.DataFrame.from_dict(walk_forward_rows)
@@ -0,0 +1,101 @@
+import numpy as np
+import pandas as pd
+
+from reports.base_report_utils import calc_missing_month_penalties, normalize_metric_matrix
+from reports.instrumentation import instrumented
+
+
+def sample_weight_vectors(weights: dict, sample_count: int, spread: float = 0.5, seed: int | None = 0) -> np.ndarray:
+    """
+    Draw candidate weight vectors around the given weights, by multiplying every weight with an independent random factor between 1 - spread and
+    1 + spread. The signs of the weights, i.e. which columns are maximized and which minimized, are kept. The first vector is the weights themselves.
+
+    Args:
+        weights (dict): The weights of the score columns, as used by calculate_score.
+        sample_count (int): The number of weight vectors, including the original one.
+        spread (float): The largest relative change of a weight.
+        seed (int | None): The seed of the random generator, so the same report is reproduced on every run.
+
+    Returns:
+        np.ndarray: A sample_count x columns matrix of weight vectors, with the columns in the order of weights.
+    """
+    base_weights = np.array(list(weights.values()), dtype=float)
+    random_generator = np.random.default_rng(seed)
+
+    weight_vectors = base_weights * random_generator.uniform(1 - spread, 1 + spread, size=(max(sample_count, 1), len(base_weights)))
+    weight_vectors[0] = base_weights
+
+    return weight_vectors
+
+
+def calc_score_ranks(scores: np.ndarray) -> np.ndarray:
+    # The 1-based rank of every row in every column of a pairs x samples score matrix, the highest score ranking first and NaN scores last, as in the
+    # sorting of the BaseReport
+    order = np.argsort(-np.nan_to_num(scores, nan=-np.inf), axis=0, kind="stable")
+
+    ranks = np.empty(scores.shape, dtype=np.int64)
+    np.put_along_axis(ranks, order, np.arange(1, len(scores) + 1)[:, np.newaxis], axis=0)
+
+    return ranks
+
+
+@instrumented()
+def create_ranking_stability_report(pair_metrics_df: pd.DataFrame, weights: dict, sample_count: int = 1000, top_n: int = 30, spread: float = 0.5,
+                                    seed: int | None = 0, sample_chunk_size: int = 1000) -> pd.DataFrame:
+    """
+    Rank the pairs under many candidate weight vectors and report how stable every pair's ranking is. The metric columns are normalized once, and the
+    scores of all the weight vectors of a chunk are a single pairs x columns by columns x samples matrix multiply, followed by the same missing months
+    penalty as adjust_score_for_missing_months.
+
+    Args:
+        pair_metrics_df (pd.DataFrame): The BaseReport rows before they are scored, as returned by create_pair_metrics.
+        weights (dict): The weights the candidates are sampled around.
+        sample_count (int): The number of weight vectors, see sample_weight_vectors.
+        top_n (int): The size of the top of the ranking counted in the "Top N frequency (%)" column, e.g. the number of FinalReport pairs.
+        spread (float): The largest relative change of a weight, see sample_weight_vectors.
+        seed (int | None): The seed of the random generator.
+        sample_chunk_size (int): The number of weight vectors scored per matrix multiply, which bounds the size of the score matrix.
+
+    Returns:
+        pd.DataFrame: One row per pair with its rank under the original weights, how often it lands in the top N and the mean, standard deviation, best
+        and worst of its ranks, sorted by the original rank.
+    """
+    pair_count = len(pair_metrics_df)
+
+    normalized_metrics = normalize_metric_matrix(pair_metrics_df, list(weights.keys()))
+    missing_month_penalties = calc_missing_month_penalties(pair_metrics_df["Missing months"])[:, np.newaxis]
+    weight_vectors = sample_weight_vectors(weights, sample_count, spread=spread, seed=seed)
+
+    top_n_counts = np.zeros(pair_count, dtype=np.int64)
+    rank_sums = np.zeros(pair_count)
+    rank_square_sums = np.zeros(pair_count)
+    best_ranks = np.full(pair_count, pair_count, dtype=np.int64)
+    worst_ranks = np.ones(pair_count, dtype=np.int64)
+    original_ranks = np.zeros(pair_count, dtype=np.int64)
+
+    for chunk_start in range(0, len(weight_vectors), sample_chunk_size):
+        scores = normalized_metrics @ weight_vectors[chunk_start:chunk_start + sample_chunk_size].T * missing_month_penalties
+        ranks = calc_score_ranks(scores)
+
+        if chunk_start == 0:
+            original_ranks = ranks[:, 0]
+
+        top_n_counts += (ranks <= top_n).sum(axis=1)
+        rank_sums += ranks.sum(axis=1)
+        rank_square_sums += (ranks.astype(float) ** 2).sum(axis=1)
+        best_ranks = np.minimum(best_ranks, ranks.min(axis=1, initial=pair_count))
+        worst_ranks = np.maximum(worst_ranks, ranks.max(axis=1, initial=1))
+
+    mean_ranks = rank_sums / len(weight_vectors)
+
+    ranking_stability_df = pd.DataFrame({
+        "Pair name": pair_metrics_df["Pair name"].to_numpy(),
+        "Rank": original_ranks,
+        f"Top {top_n} frequency (%)": top_n_counts / len(weight_vectors) * 100,
+        "Mean rank": mean_ranks,
+        "Rank std": np.sqrt(np.maximum(rank_square_sums / len(weight_vectors) - mean_ranks ** 2, 0)),
+        "Best rank": best_ranks,
+        "Worst rank": worst_ranks
+    })
+
+    return ranking_stability_df.sort_values("Rank").reset_index(drop=True).round(4)
@@ -0,0 +1,31 @@
+import argparse
+
+import constants
+from reports.report_config import ReportConfig
+from reports.report_service import ReportService, create_report_server
+
+parser = argparse.ArgumentParser(description='Serve the reports of a positions file over HTTP, loading the positions once.')
+parser.add_argument('--pl', type=str, help='File name of the positions to process')
+parser.add_argument('--host', type=str, default=constants.service_host, help='Address to listen on')
+parser.add_argument('--port', type=int, default=constants.service_port, help='Port to listen on')
+parser.add_argument('--socket', type=str, help='Listen on this Unix socket instead of a port')
+parser.add_argument('--cache_size', type=int, default=constants.service_cache_size, help='Number of computed reports to keep')
+parser.add_argument('--no_cache', action='store_true', help='Always parse the positions file instead of reading its cached copy')
+
+args = parser.parse_args()
+
+base_config = ReportConfig(positions_cache_dir=None if args.no_cache else constants.positions_cache_dir)
+service = ReportService(constants.get_positions_file_name(args.pl), base_config=base_config, cache_size=max(args.cache_size, 1))
+
+# The default BaseReport is calculated before the first query, which also encodes the positions and calculates the per-pair metrics of all of them
+service.get_report("BaseReport")
+
+server = create_report_server(service, host=args.host, port=args.port, socket_path=args.socket)
+print('Serving reports on', args.socket if args.socket else f"http://{args.host}:{args.port}")
+
+try:
+    server.serve_forever()
+except KeyboardInterrupt:
+    pass
+finally:
+    server.server_close()
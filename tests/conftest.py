@@ -0,0 +1,46 @@
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic_positions import generate_positions
+
+# A hand-made positions sheet covering the cases the engines have to agree on: open positions, flat trades, ties in entry and exit time, a pair without
+# losses, a pair that only trades in one month and a month in which no pair trades
+hand_made_rows = [
+    ("AAAUSDT", "long", "CLOSED", "2022-01-03 10:00", "2022-01-03 12:00", 5.0),
+    ("AAAUSDT", "long", "CLOSED", "2022-01-05 09:00", "2022-01-06 09:00", -2.0),
+    ("AAAUSDT", "short", "STOPPED", "2022-01-05 09:00", "2022-01-07 09:00", -3.0),
+    ("AAAUSDT", "long", "CLOSED", "2022-01-20 00:00", "2022-02-02 00:00", 4.0),
+    ("AAAUSDT", "short", "CLOSED", "2022-02-10 08:00", "2022-02-10 09:00", 0.0),
+    ("AAAUSDT", "long", "CLOSED", "2022-02-11 08:00", "2022-02-12 09:00", 1.5),
+    ("AAAUSDT", "long", "ACTIVE", "2022-02-20 08:00", None, -1.0),
+    ("AAAUSDT", "short", "CLOSED", "2022-04-02 08:00", "2022-04-03 08:00", -6.0),
+    ("BBBUSDT", "short", "CLOSED", "2022-01-04 10:00", "2022-01-04 18:00", -1.0),
+    ("BBBUSDT", "short", "CLOSED", "2022-01-06 10:00", "2022-01-09 18:00", -1.5),
+    ("BBBUSDT", "long", "STOPPED", "2022-01-08 10:00", "2022-01-09 18:00", -0.5),
+    ("BBBUSDT", "long", "CLOSED", "2022-02-01 10:00", "2022-02-03 18:00", 7.0),
+    ("BBBUSDT", "short", "CLOSED", "2022-02-15 10:00", "2022-02-16 18:00", 2.0),
+    ("BBBUSDT", "long", "ENTERED", "2022-04-01 10:00", None, 0.0),
+    ("BBBUSDT", "long", "CLOSED", "2022-04-05 10:00", "2022-04-06 18:00", 3.0),
+    ("CCCUSDT", "long", "CLOSED", "2022-01-10 00:00", "2022-01-11 00:00", 1.0),
+    ("CCCUSDT", "short", "CLOSED", "2022-01-12 00:00", "2022-01-13 00:00", 2.0),
+    ("CCCUSDT", "long", "CLOSED", "2022-01-12 00:00", "2022-01-14 00:00", 0.5),
+    ("DDDUSDT", "short", "CLOSED", "2022-02-05 12:00", "2022-02-06 12:00", -4.0),
+    ("DDDUSDT", "short", "STOPPED", "2022-02-07 12:00", "2022-02-08 12:00", 6.0),
+    ("DDDUSDT", "long", "CLOSED", "2022-04-10 12:00", "2022-04-12 12:00", -2.5),
+    ("DDDUSDT", "short", "CLOSED", "2022-04-11 12:00", "2022-04-12 12:00", -0.5)
+]
+
+
+@pytest.fixture
+def positions_df() -> pd.DataFrame:
+    positions_df = pd.DataFrame(hand_made_rows, columns=["Pair name", "Type", "Status", "Entry time", "Exit time", "Net profit"])
+    positions_df["Entry time"] = pd.to_datetime(positions_df["Entry time"]).astype("datetime64[ns]")
+    positions_df["Exit time"] = pd.to_datetime(positions_df["Exit time"]).astype("datetime64[ns]")
+    positions_df["Capital used"] = 50.0
+
+    return positions_df
+
+
+@pytest.fixture
+def synthetic_positions_df() -> pd.DataFrame:
+    return generate_positions(pair_count=12, positions_per_pair=40, span_days=200, seed=7)
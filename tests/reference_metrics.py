@@ -0,0 +1,108 @@
+import numpy as np
+import pandas as pd
+
+# Direct pandas and plain Python versions of the report metrics, one group of positions at a time, which the vectorized engines are checked against
+
+NANOSECONDS_PER_DAY = 86_400 * 10 ** 9
+
+
+def calc_reference_drawdown(curve_times: pd.Series, equity_curve: pd.Series) -> (float, float, float):
+    # The max drawdown, its duration and its recovery time, walking the curve one point at a time
+    max_drawdown, max_duration, recovery_time = 0.0, 0.0, 0.0
+    peak, stretch_start, trough_time = -np.inf, None, None
+
+    for point_time, equity in zip(pd.to_datetime(curve_times), equity_curve):
+        peak = max(peak, equity)
+        drawdown = peak - equity
+
+        if drawdown <= 1e-9 * (1 + abs(peak)):
+            if stretch_start is not None:
+                max_duration = max(max_duration, (point_time - stretch_start).value / NANOSECONDS_PER_DAY)
+                stretch_start = None
+            if trough_time is not None:
+                recovery_time = (point_time - trough_time).value / NANOSECONDS_PER_DAY
+                trough_time = None
+        else:
+            stretch_start = point_time if stretch_start is None else stretch_start
+            if drawdown > max_drawdown:
+                max_drawdown, trough_time, recovery_time = drawdown, point_time, np.nan
+
+    if stretch_start is not None:
+        max_duration = max(max_duration, (point_time - stretch_start).value / NANOSECONDS_PER_DAY)
+
+    return max_drawdown, max_duration, recovery_time
+
+
+def build_reference_curve(positions: pd.DataFrame, timeframe: str | None = None) -> (pd.Series, pd.Series):
+    # The equity curve at every distinct exit time, or on the legacy date_range grid where only the exits on a grid point count
+    exit_profits = positions.groupby("Exit time")["Net profit"].sum()
+    if timeframe is None:
+        return pd.Series(exit_profits.index), exit_profits.cumsum().reset_index(drop=True)
+
+    grid = pd.date_range(start=positions["Exit time"].min(), end=positions["Exit time"].max(), freq=timeframe)
+    return pd.Series(grid), exit_profits.reindex(grid, fill_value=0).cumsum().reset_index(drop=True)
+
+
+def calc_reference_streaks(net_profits: pd.Series, sign: int) -> (float, int, int):
+    # The average, max and 90th percentile length of the runs of wins (sign 1) or losses (sign -1)
+    outcomes = np.sign(net_profits).reset_index(drop=True)
+    run_lengths = outcomes.groupby((outcomes != outcomes.shift()).cumsum()).agg(["first", "size"])
+    streak_lengths = run_lengths.loc[run_lengths["first"] == sign, "size"].to_numpy()
+    if len(streak_lengths) == 0:
+        return 0.0, 0, 0
+
+    return streak_lengths.mean(), streak_lengths.max(), int(np.quantile(streak_lengths, 0.9, method="inverted_cdf"))
+
+
+def calc_reference_metrics(positions: pd.DataFrame, month_list: pd.DatetimeIndex, timeframe: str | None = None) -> dict:
+    """
+    The BaseReport metrics of a group of closed positions, e.g. one pair or the first pairs of a FinalReport, in the order of the positions.
+    """
+    net_profits = positions["Net profit"]
+    monthly_net_profits = net_profits.groupby(positions["Exit time"].dt.to_period("M")).sum()
+    traded_months = (monthly_net_profits != 0).sum()
+    exit_months = set(positions["Exit time"].dt.to_period("M"))
+    drawdown, duration, recovery = calc_reference_drawdown(*build_reference_curve(positions, timeframe))
+    trade_equity = net_profits.cumsum()
+    average_wins, max_wins, wins_p90 = calc_reference_streaks(net_profits, 1)
+    average_losses, max_losses, losses_p90 = calc_reference_streaks(net_profits, -1)
+
+    return {
+        "Number of positions - total": len(positions),
+        "Performance - total": (monthly_net_profits > 0).sum() / traded_months * 100 if traded_months > 0 else np.nan,
+        "Winrate - total": (net_profits > 0).mean() * 100,
+        "Net profit - total": net_profits.sum(),
+        "Gross profit - total": net_profits[net_profits > 0].sum(),
+        "Gross loss - total": net_profits[net_profits < 0].sum(),
+        "Largest profit in a trade - total": max(net_profits.max(), 0),
+        "Average profit per trade - total": net_profits.mean(),
+        "Total months": len(month_list),
+        "Missing months": sum(month.to_period("M") not in exit_months for month in month_list),
+        "Max drawdown - total": drawdown,
+        "Max drawdown duration (days)": duration,
+        "Max drawdown recovery (days)": recovery,
+        "Average consecutive wins": average_wins,
+        "Max consecutive wins": max_wins,
+        "Consecutive wins P90": wins_p90,
+        "Average consecutive losses": average_losses,
+        "Max consecutive losses": max_losses,
+        "Consecutive losses P90": losses_p90,
+        "Average loss per position - total": net_profits[net_profits < 0].mean() if (net_profits < 0).any() else np.nan,
+        "Max drawdown - trade order": (trade_equity.cummax() - trade_equity).max()
+    }
+
+
+def get_closed_positions(positions_df: pd.DataFrame) -> pd.DataFrame:
+    # The closed positions in entry time order, keeping the file order of equal entry times
+    closed_df = positions_df[~positions_df["Status"].isin(["ACTIVE", "ENTERED"])]
+    return closed_df.sort_values("Entry time", kind="stable").reset_index(drop=True)
+
+
+def get_month_list(positions_df: pd.DataFrame) -> pd.DatetimeIndex:
+    return pd.date_range(positions_df["Entry time"].min().to_period("M").to_timestamp(), positions_df["Exit time"].max().to_period("M").to_timestamp(),
+                         freq="MS")
+
+
+def assert_metrics_equal(metrics: dict, reference_metrics: dict):
+    for column, reference_value in reference_metrics.items():
+        np.testing.assert_allclose(float(metrics[column]), float(reference_value), rtol=1e-9, atol=1e-9, err_msg=column)
@@ -0,0 +1,41 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from reports.concurrency import calc_position_concurrency
+from tests.reference_metrics import get_closed_positions
+
+
+def calc_reference_concurrency(positions: pd.DataFrame, threshold: int) -> (float, int, float, float):
+    # The open positions and engaged capital at every entry or exit, counting a position as open from its entry until its exit
+    event_times = pd.Series(np.sort(pd.concat([positions["Entry time"], positions["Exit time"]]).unique()))
+    is_open = [(positions["Entry time"] <= event_time) & (positions["Exit time"] > event_time) for event_time in event_times]
+    open_positions = pd.Series([open_mask.sum() for open_mask in is_open])
+    engaged_capital = pd.Series([positions.loc[open_mask, "Capital used"].sum() for open_mask in is_open])
+
+    durations = event_times.diff().shift(-1).dt.total_seconds().fillna(0)
+    if durations.sum() == 0:
+        return float(open_positions[0]), open_positions.max(), 100.0 if open_positions[0] > threshold else 0.0, engaged_capital.max()
+
+    return ((open_positions * durations).sum() / durations.sum(), open_positions.max(), durations[open_positions > threshold].sum() / durations.sum() * 100,
+            engaged_capital.max())
+
+
+@pytest.mark.parametrize("threshold", [0, 2])
+@pytest.mark.parametrize("frame_name", ["positions_df", "synthetic_positions_df"])
+def test_concurrency_matches_the_open_positions_at_every_event(request, frame_name, threshold):
+    closed_df = get_closed_positions(request.getfixturevalue(frame_name))
+
+    for positions in [closed_df, *(pair_df for _, pair_df in closed_df.groupby("Pair name"))]:
+        concurrency_stats = calc_position_concurrency(positions["Entry time"].to_numpy(), positions["Exit time"].to_numpy(),
+                                                      positions["Capital used"].to_numpy(), threshold)
+        np.testing.assert_allclose(concurrency_stats, calc_reference_concurrency(positions, threshold), rtol=1e-9, atol=1e-9)
+
+
+def test_positions_entering_and_exiting_together():
+    positions = pd.DataFrame({"Entry time": pd.to_datetime(["2022-01-01", "2022-01-01"]), "Exit time": pd.to_datetime(["2022-01-01", "2022-01-01"]),
+                              "Capital used": [50.0, 50.0]})
+
+    assert calc_position_concurrency(positions["Entry time"].to_numpy(), positions["Exit time"].to_numpy(), positions["Capital used"].to_numpy(),
+                                     1) == (0.0, 0, 0.0, 0.0)
+    assert calc_position_concurrency(np.zeros(0, dtype="datetime64[ns]"), np.zeros(0, dtype="datetime64[ns]"), np.zeros(0), 1) == (0, 0, 0, 0)
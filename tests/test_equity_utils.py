@@ -0,0 +1,43 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from reports.equity_utils import build_equity_curve, build_segment_equity_curves, calc_curve_drawdown, calc_segment_drawdowns
+from tests.reference_metrics import build_reference_curve, calc_reference_drawdown, get_closed_positions
+
+
+@pytest.mark.parametrize("timeframe", [None, "15min", "1h", "1D"])
+@pytest.mark.parametrize("frame_name", ["positions_df", "synthetic_positions_df"])
+def test_equity_curve_matches_the_reference_curve(request, frame_name, timeframe):
+    closed_df = get_closed_positions(request.getfixturevalue(frame_name))
+
+    curve_times, equity_curve = build_equity_curve(closed_df["Exit time"].to_numpy(), closed_df["Net profit"].to_numpy(), timeframe=timeframe)
+    reference_times, reference_curve = build_reference_curve(closed_df, timeframe)
+
+    np.testing.assert_array_equal(curve_times, reference_times.to_numpy(dtype="datetime64[ns]"))
+    np.testing.assert_allclose(equity_curve, reference_curve.to_numpy(), rtol=1e-9, atol=1e-9)
+    np.testing.assert_allclose(calc_curve_drawdown(curve_times, equity_curve), calc_reference_drawdown(reference_times, reference_curve),
+                               rtol=1e-9, atol=1e-9)
+
+
+@pytest.mark.parametrize("timeframe", [None, "1h"])
+@pytest.mark.parametrize("frame_name", ["positions_df", "synthetic_positions_df"])
+def test_segment_curves_match_the_curve_of_every_pair(request, frame_name, timeframe):
+    closed_df = get_closed_positions(request.getfixturevalue(frame_name))
+    pair_codes, pair_names = pd.factorize(closed_df["Pair name"])
+
+    segment_codes, curve_times, equity_curves = build_segment_equity_curves(pair_codes, closed_df["Exit time"].to_numpy(),
+                                                                            closed_df["Net profit"].to_numpy(), timeframe=timeframe)
+    max_drawdowns, max_durations, recovery_times = calc_segment_drawdowns(segment_codes, curve_times, equity_curves, len(pair_names))
+
+    for pair_code, pair_name in enumerate(pair_names):
+        pair_df = closed_df[closed_df["Pair name"] == pair_name]
+        reference_drawdown = calc_reference_drawdown(*build_reference_curve(pair_df, timeframe))
+
+        # The segment curves only keep the grid points an exit moved, which leaves the drawdowns of the full grid curve unchanged
+        if timeframe is None:
+            reference_times, reference_curve = build_reference_curve(pair_df)
+            np.testing.assert_array_equal(curve_times[segment_codes == pair_code], reference_times.to_numpy(dtype="datetime64[ns]"))
+            np.testing.assert_allclose(equity_curves[segment_codes == pair_code], reference_curve.to_numpy(), rtol=1e-9, atol=1e-9)
+        np.testing.assert_allclose((max_drawdowns[pair_code], max_durations[pair_code], recovery_times[pair_code]), reference_drawdown,
+                                   rtol=1e-9, atol=1e-9, err_msg=pair_name)
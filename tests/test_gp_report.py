@@ -0,0 +1,35 @@
+import pandas as pd
+
+from reports.gp_report import Report
+from reports.report_config import ReportConfig
+
+
+def create_report(positions_df: pd.DataFrame, shared_state: dict | None = None, **settings) -> Report:
+    return Report("positions.csv", config=ReportConfig(positions_cache_dir=None, **settings), positions_df=positions_df, shared_state=shared_state,
+                  create_reports=False)
+
+
+def test_position_type_filter_matches_filtered_positions(positions_df):
+    short_df = positions_df[positions_df["Type"] == "short"].reset_index(drop=True)
+
+    pd.testing.assert_frame_equal(create_report(positions_df, position_type="Short").base_report_df, create_report(short_df).base_report_df)
+
+
+def test_source_filter_matches_source_positions(positions_df, synthetic_positions_df):
+    combined_df = pd.concat([positions_df, synthetic_positions_df], ignore_index=True)
+    combined_df["Source"] = pd.Categorical(["hand-made"] * len(positions_df) + ["synthetic"] * len(synthetic_positions_df))
+
+    pd.testing.assert_frame_equal(create_report(combined_df, source="synthetic").final_report_df, create_report(synthetic_positions_df).final_report_df)
+
+
+def test_stages_are_lazy_and_shared(positions_df):
+    shared_state = {}
+    report = create_report(positions_df, shared_state=shared_state, max_final_report_pairs=2)
+    report.base_report_df
+
+    assert "create_base_report" in shared_state
+    assert "final_report_df" not in report.__dict__
+
+    other_report = create_report(positions_df, shared_state=shared_state, max_final_report_pairs=3)
+    assert other_report.pair_metrics_df is report.pair_metrics_df
+    assert len(other_report.final_report_df) == 3
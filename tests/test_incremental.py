@@ -0,0 +1,85 @@
+import pandas as pd
+import pytest
+
+from reports.gp_report import Report
+from reports.incremental import create_incremental_report, read_positions_rows
+from reports.positions_io import cast_position_columns
+from reports.report_config import ReportConfig
+
+
+def write_positions(positions_df: pd.DataFrame, file_path: str):
+    if file_path.endswith(".xlsx"):
+        positions_df.to_excel(file_path, index=False)
+    else:
+        positions_df.to_csv(file_path, index=False)
+
+
+@pytest.mark.parametrize("first_row", [0, 5, 21, 22])
+def test_excel_rows_match_read_excel(tmp_path, positions_df, first_row):
+    positions_df.to_excel(tmp_path / "positions.xlsx", index=False)
+
+    expected_df = cast_position_columns(pd.read_excel(tmp_path / "positions.xlsx", skiprows=range(1, first_row + 1)))
+
+    pd.testing.assert_frame_equal(read_positions_rows(str(tmp_path / "positions.xlsx"), first_row), expected_df)
+
+
+@pytest.mark.parametrize("extension", ["csv", "xlsx"])
+@pytest.mark.parametrize("position_type, type_case", [(None, str.lower), ("long", str.lower), ("long", str.capitalize)])
+def test_appended_rows_give_the_full_reports(tmp_path, synthetic_positions_df, extension, position_type, type_case):
+    positions_df = synthetic_positions_df.sort_values("Entry time", kind="stable").reset_index(drop=True)
+    positions_df["Type"] = positions_df["Type"].map(type_case)
+    file_path = str(tmp_path / f"positions.{extension}")
+    config = ReportConfig(output_dir=str(tmp_path / "reports"), position_type=position_type, positions_cache_dir=None, formats=("csv",),
+                          reports=("BaseReport", "FinalReport"))
+
+    write_positions(positions_df.iloc[:300], file_path)
+    create_incremental_report(file_path, config, str(tmp_path / "state"))
+    write_positions(positions_df, file_path)
+    incremental_report = create_incremental_report(file_path, config, str(tmp_path / "state"))
+
+    full_report = Report(file_path, config=config, positions_df=positions_df, create_reports=False)
+    pd.testing.assert_frame_equal(incremental_report.base_report_df, full_report.base_report_df, check_dtype=False)
+    pd.testing.assert_frame_equal(incremental_report.final_report_df, full_report.final_report_df, check_dtype=False)
+
+
+def test_edited_rows_rebuild_the_state(tmp_path, synthetic_positions_df):
+    positions_df = synthetic_positions_df.sort_values("Entry time", kind="stable").reset_index(drop=True)
+    file_path = str(tmp_path / "positions.csv")
+    config = ReportConfig(output_dir=str(tmp_path / "reports"), positions_cache_dir=None, formats=("csv",), reports=("BaseReport",))
+
+    write_positions(positions_df.iloc[:300], file_path)
+    create_incremental_report(file_path, config, str(tmp_path / "state"))
+    positions_df.loc[299, "Net profit"] += 100
+    write_positions(positions_df, file_path)
+    incremental_report = create_incremental_report(file_path, config, str(tmp_path / "state"))
+
+    full_report = Report(file_path, config=config, positions_df=positions_df, create_reports=False)
+    pd.testing.assert_frame_equal(incremental_report.base_report_df, full_report.base_report_df, check_dtype=False)
+
+
+@pytest.mark.parametrize("position_type", [None, "long"])
+@pytest.mark.parametrize("row_order", ["exit time", "shuffled"])
+def test_unordered_rows_give_the_full_reports(tmp_path, monkeypatch, synthetic_positions_df, position_type, row_order):
+    # Exports in exit time order only put positions of a pair out of order when they overlap, shuffled rows also exit before ingested ones
+    positions_df = synthetic_positions_df.sort_values("Exit time", kind="stable") if row_order == "exit time" else \
+        synthetic_positions_df.sample(frac=1, random_state=3)
+    positions_df = positions_df.reset_index(drop=True)
+    file_path = str(tmp_path / "positions.csv")
+    config = ReportConfig(output_dir=str(tmp_path / "reports"), position_type=position_type, positions_cache_dir=None, formats=("csv",),
+                          reports=("BaseReport", "FinalReport"))
+
+    write_positions(positions_df.iloc[:200], file_path)
+    create_incremental_report(file_path, config, str(tmp_path / "state"))
+
+    # Only the first run reads the whole file, the later ones take in rows entering before the ingested ones without rebuilding the state
+    def load_positions(*args, **kwargs):
+        raise AssertionError("The incremental state was rebuilt from the whole file")
+    monkeypatch.setattr("reports.incremental.load_positions", load_positions)
+
+    for row_count in [320, 321, len(positions_df)]:
+        write_positions(positions_df.iloc[:row_count], file_path)
+        incremental_report = create_incremental_report(file_path, config, str(tmp_path / "state"))
+
+        full_report = Report(file_path, config=config, positions_df=positions_df.iloc[:row_count], create_reports=False)
+        pd.testing.assert_frame_equal(incremental_report.base_report_df, full_report.base_report_df, check_dtype=False)
+        pd.testing.assert_frame_equal(incremental_report.final_report_df, full_report.final_report_df, check_dtype=False)
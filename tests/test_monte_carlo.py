@@ -0,0 +1,68 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from reports.monte_carlo import create_robustness_report, draw_resample_indices
+from reports.positions_store import PositionsStore
+from tests.reference_metrics import calc_reference_metrics, get_closed_positions, get_month_list
+
+
+def calc_reference_path_stats(trade_profits: pd.Series) -> (float, float, float):
+    # The net profit, trade order max drawdown and winrate of one trade sequence
+    equity = trade_profits.cumsum()
+    return equity.iloc[-1], (equity.cummax() - equity).max(), (trade_profits > 0).mean() * 100
+
+
+@pytest.mark.parametrize("method", ["bootstrap", "shuffle"])
+@pytest.mark.parametrize("frame_name", ["positions_df", "synthetic_positions_df"])
+def test_robustness_rows_match_the_resampled_trades(request, frame_name, method):
+    positions_df = request.getfixturevalue(frame_name)
+    closed_df = get_closed_positions(positions_df)
+    month_list = get_month_list(positions_df)
+    sorted_pair_list = sorted(positions_df["Pair name"].unique(), reverse=True)
+    path_count, quantiles, seed = 25, (0.05, 0.5, 0.95), 3
+
+    closed_positions = PositionsStore.from_positions_df(positions_df).closed().sort_by_entry_time().with_months()
+    robustness_df = create_robustness_report(closed_positions, sorted_pair_list, path_count=path_count, method=method, quantiles=quantiles, seed=seed)
+
+    assert robustness_df["Pair count"].tolist() == list(range(1, len(sorted_pair_list) + 1))
+    for row in robustness_df.to_dict("records"):
+        merged_df = closed_df[closed_df["Pair name"].isin(sorted_pair_list[:row["Pair count"]])]
+        reference_metrics = calc_reference_metrics(merged_df, month_list)
+
+        assert row["Number of positions - total"] == len(merged_df)
+        for column in ["Net profit - total", "Max drawdown - trade order", "Winrate - total"]:
+            assert row[column] == pytest.approx(reference_metrics[column])
+
+        # The same paths, drawn by the generator of the pair count's only chunk and measured one sequence at a time
+        resample_indices = draw_resample_indices(len(merged_df), path_count, method, np.random.default_rng([seed, row["Pair count"], 0]))
+        path_stats = pd.DataFrame([calc_reference_path_stats(merged_df["Net profit"].iloc[path_indices].reset_index(drop=True))
+                                   for path_indices in resample_indices], columns=["Net profit", "Max drawdown", "Winrate"])
+
+        assert row["Probability of a loss (%)"] == pytest.approx((path_stats["Net profit"] < 0).mean() * 100)
+        for column_name, path_values in path_stats.items():
+            assert row[f"{column_name} mean"] == pytest.approx(path_values.mean())
+            for quantile in quantiles:
+                assert row[f"{column_name} P{quantile * 100:g}"] == pytest.approx(path_values.quantile(quantile))
+
+        # A shuffled sequence holds the same trades, only in another order
+        if method == "shuffle":
+            assert row["Net profit P5"] == pytest.approx(row["Net profit P95"]) == pytest.approx(row["Net profit - total"])
+            assert row["Winrate mean"] == pytest.approx(row["Winrate - total"])
+
+
+def test_robustness_report_is_the_same_in_workers(synthetic_positions_df):
+    closed_positions = PositionsStore.from_positions_df(synthetic_positions_df).closed().sort_by_entry_time().with_months()
+    sorted_pair_list = list(synthetic_positions_df["Pair name"].unique())
+
+    robustness_df = create_robustness_report(closed_positions, sorted_pair_list, path_count=50, seed=1)
+
+    pd.testing.assert_frame_equal(create_robustness_report(closed_positions, sorted_pair_list, path_count=50, seed=1, workers=2), robustness_df)
+    assert not robustness_df.equals(create_robustness_report(closed_positions, sorted_pair_list, path_count=50, seed=2))
+
+
+def test_unknown_resampling_method_is_rejected(positions_df):
+    closed_positions = PositionsStore.from_positions_df(positions_df).closed().sort_by_entry_time().with_months()
+
+    with pytest.raises(ValueError, match="Unknown resampling method"):
+        create_robustness_report(closed_positions, ["AAAUSDT"], method="jackknife")
@@ -0,0 +1,49 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from reports.month_matrix import calc_monthly_performance, create_month_coverage
+from reports.positions_store import PositionsStore
+from tests.reference_metrics import get_closed_positions, get_month_list
+
+
+def calc_reference_performance(monthly_net_profits: pd.Series) -> float:
+    traded_months = monthly_net_profits[monthly_net_profits != 0]
+    return (traded_months > 0).sum() / len(traded_months) * 100 if len(traded_months) > 0 else np.nan
+
+
+@pytest.mark.parametrize("frame_name", ["positions_df", "synthetic_positions_df"])
+def test_coverage_matches_a_pivot_by_exit_month(request, frame_name):
+    positions_df = request.getfixturevalue(frame_name)
+    closed_df = get_closed_positions(positions_df)
+    month_list = get_month_list(positions_df)
+    pair_list = sorted(positions_df["Pair name"].unique(), reverse=True)
+
+    closed_positions = PositionsStore.from_positions_df(positions_df).closed().sort_by_entry_time().with_months()
+    month_coverage = create_month_coverage(closed_positions, pair_list)
+
+    exit_months = closed_df["Exit time"].dt.to_period("M").dt.to_timestamp()
+    pair_months = closed_df.groupby([closed_df["Pair name"], exit_months])["Net profit"]
+    monthly_net_profits = pair_months.sum().unstack(fill_value=0).reindex(index=pair_list, columns=month_list, fill_value=0)
+    position_counts = pair_months.count().unstack(fill_value=0).reindex(index=pair_list, columns=month_list, fill_value=0)
+
+    np.testing.assert_allclose(month_coverage.monthly_net_profits, monthly_net_profits.to_numpy(), rtol=1e-9, atol=1e-9)
+    np.testing.assert_array_equal(month_coverage.calc_pair_missing_months(), (position_counts == 0).sum(axis=1).to_numpy())
+    np.testing.assert_allclose(month_coverage.calc_pair_performances(), monthly_net_profits.apply(calc_reference_performance, axis=1).to_numpy())
+
+    # Every prefix of the pairs, and a set of pairs out of their order
+    for pair_count in range(1, len(pair_list) + 1):
+        prefix_net_profits = monthly_net_profits.iloc[:pair_count].sum()
+        assert month_coverage.calc_prefix_missing_months()[pair_count - 1] == (position_counts.iloc[:pair_count].sum() == 0).sum()
+        assert month_coverage.calc_prefix_performances()[pair_count - 1] == pytest.approx(calc_reference_performance(prefix_net_profits), nan_ok=True)
+
+    pair_rows = np.array([len(pair_list) - 1, 0])
+    assert month_coverage.calc_missing_months(pair_rows) == (position_counts.iloc[pair_rows].sum() == 0).sum()
+    assert month_coverage.calc_performance(pair_rows) == pytest.approx(calc_reference_performance(monthly_net_profits.iloc[pair_rows].sum()), nan_ok=True)
+    assert month_coverage.calc_signed_months(pair_rows) == ((monthly_net_profits.iloc[pair_rows].sum() > 0).sum(),
+                                                           (monthly_net_profits.iloc[pair_rows].sum() < 0).sum())
+
+
+def test_performance_without_traded_months_is_nan():
+    assert np.isnan(calc_monthly_performance(np.zeros(3)))
+    np.testing.assert_array_equal(calc_monthly_performance(np.array([[1.0, -1.0, 0.0], [0.0, 0.0, 0.0]])), [50.0, np.nan])
@@ -0,0 +1,31 @@
+import pandas as pd
+import pytest
+
+from reports.pair_metrics import create_pair_metrics
+from reports.positions_store import PositionsStore
+from tests.reference_metrics import assert_metrics_equal, calc_reference_metrics, get_closed_positions, get_month_list
+
+
+@pytest.mark.parametrize("timeframe", [None, "15min", "1D"])
+@pytest.mark.parametrize("frame_name", ["positions_df", "synthetic_positions_df"])
+def test_pair_metrics_match_filtered_positions(request, frame_name, timeframe):
+    positions_df = request.getfixturevalue(frame_name)
+    closed_df = get_closed_positions(positions_df)
+    month_list = get_month_list(positions_df)
+
+    # A pair without positions is left out, the others keep the order of the pair list
+    pair_list = ["ZZZUSDT", *sorted(positions_df["Pair name"].unique(), reverse=True)]
+
+    closed_positions = PositionsStore.from_positions_df(positions_df).closed().sort_by_entry_time().with_months()
+    pair_metrics_df = create_pair_metrics(closed_positions, pair_list, timeframe=timeframe)
+
+    assert pair_metrics_df["Pair name"].tolist() == pair_list[1:]
+    for row in pair_metrics_df.to_dict("records"):
+        assert_metrics_equal(row, calc_reference_metrics(closed_df[closed_df["Pair name"] == row["Pair name"]], month_list, timeframe=timeframe))
+
+
+def test_pair_metrics_are_the_same_in_workers(synthetic_positions_df):
+    closed_positions = PositionsStore.from_positions_df(synthetic_positions_df).closed().sort_by_entry_time().with_months()
+    pair_list = list(synthetic_positions_df["Pair name"].unique())
+
+    pd.testing.assert_frame_equal(create_pair_metrics(closed_positions, pair_list, workers=2), create_pair_metrics(closed_positions, pair_list))
@@ -0,0 +1,148 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from reports.pair_overlap import (calc_correlation_matrix, calc_overlap_matrix, create_pair_correlation_report, create_pair_open_time_matrix,
+                                  merge_pair_intervals, select_neighbours)
+from reports.positions_store import PositionsStore
+
+minute_nanos = 60 * 10 ** 9
+
+
+def generate_interval_positions(seed: int, position_count: int = 60, pair_names: tuple = ("AAAUSDT", "BBBUSDT", "CCCUSDT")) -> pd.DataFrame:
+    # Positions entering and exiting on whole minutes over about a day, many of them overlapping within their pair, some lasting no time at all
+    random_generator = np.random.default_rng(seed)
+    entry_minutes = random_generator.integers(0, 1500, size=position_count)
+    durations = random_generator.choice([0, 1, 5, 30, 90, 400], size=position_count)
+
+    return pd.DataFrame({
+        "Pair name": random_generator.choice(pair_names, size=position_count),
+        "Status": "CLOSED",
+        "Entry time": pd.Timestamp("2022-01-01 00:00") + pd.to_timedelta(entry_minutes, unit="min"),
+        "Exit time": pd.Timestamp("2022-01-01 00:00") + pd.to_timedelta(entry_minutes + durations, unit="min"),
+        "Net profit": 1.0,
+        "Capital used": 50.0
+    })
+
+
+def calc_reference_open_minutes(positions_df: pd.DataFrame, pair_list: list) -> np.ndarray:
+    # Whether every pair had a position open in every minute from the first entry to the last exit of the pairs, marking the minutes of every position
+    positions_df = positions_df[positions_df["Pair name"].isin(pair_list)]
+    first_time, last_time = positions_df["Entry time"].min(), positions_df["Exit time"].max()
+    open_minutes = np.zeros((len(pair_list), (last_time - first_time) // pd.Timedelta("1min")), dtype=bool)
+
+    for pair_name, entry_time, exit_time in zip(positions_df["Pair name"], positions_df["Entry time"], positions_df["Exit time"]):
+        open_minutes[pair_list.index(pair_name), (entry_time - first_time) // pd.Timedelta("1min"):(exit_time - first_time) // pd.Timedelta("1min")] = True
+
+    return open_minutes
+
+
+def calc_reference_intervals(pair_codes: np.ndarray, entry_times: np.ndarray, exit_times: np.ndarray) -> list:
+    # The merged intervals of every pair, extending the last interval while the next position enters before or at its end
+    intervals = []
+    for pair_code, entry_time, exit_time in sorted(zip(pair_codes.tolist(), entry_times.tolist(), exit_times.tolist())):
+        if intervals and intervals[-1][0] == pair_code and entry_time <= intervals[-1][2]:
+            intervals[-1][2] = max(intervals[-1][2], exit_time)
+        else:
+            intervals.append([pair_code, entry_time, exit_time])
+
+    return intervals
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_merged_intervals_match_a_sequential_merge(seed):
+    positions_df = generate_interval_positions(seed)
+    pair_codes = pd.factorize(positions_df["Pair name"])[0]
+    entry_times = positions_df["Entry time"].to_numpy(dtype="datetime64[ns]").view(np.int64)
+    exit_times = positions_df["Exit time"].to_numpy(dtype="datetime64[ns]").view(np.int64)
+
+    merged_intervals = np.column_stack(merge_pair_intervals(pair_codes, entry_times, exit_times))
+
+    np.testing.assert_array_equal(merged_intervals, np.array(calc_reference_intervals(pair_codes, entry_times, exit_times)))
+
+
+def test_no_positions_merge_into_no_intervals():
+    merged_intervals = merge_pair_intervals(np.zeros(0, dtype=int), np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64))
+
+    assert all(len(interval_values) == 0 for interval_values in merged_intervals)
+
+
+@pytest.mark.parametrize("bucket", ["1min", "7min", "1h", "1D"])
+@pytest.mark.parametrize("seed", range(3))
+def test_open_times_and_overlaps_match_a_minute_grid(seed, bucket):
+    positions_df = generate_interval_positions(seed, pair_names=("AAAUSDT", "BBBUSDT", "CCCUSDT", "DDDUSDT"))
+    # DDDUSDT is left out of the rows and EEEUSDT has no positions
+    pair_list = ["CCCUSDT", "EEEUSDT", "AAAUSDT", "BBBUSDT"]
+    open_minutes = calc_reference_open_minutes(positions_df, pair_list)
+    bucket_minutes = pd.Timedelta(bucket) // pd.Timedelta("1min")
+
+    open_time_matrix, span = create_pair_open_time_matrix(PositionsStore.from_positions_df(positions_df), pair_list, bucket=bucket)
+
+    assert span == open_minutes.shape[1] * minute_nanos
+    assert open_time_matrix.shape[1] == open_minutes.shape[1] // bucket_minutes + 1
+    bucket_open_minutes = np.add.reduceat(open_minutes, np.arange(0, open_minutes.shape[1], bucket_minutes), axis=1)
+    np.testing.assert_allclose(open_time_matrix[:, :bucket_open_minutes.shape[1]], bucket_open_minutes * minute_nanos, rtol=1e-6)
+    assert (open_time_matrix[:, bucket_open_minutes.shape[1]:] == 0).all()
+
+    # On minute buckets every overlap is exact, on longer ones only the time of every pair itself
+    overlaps = calc_overlap_matrix(open_time_matrix, bucket, span)
+    minutes_both_open = open_minutes.astype(float) @ open_minutes.T.astype(float)
+    np.testing.assert_allclose(np.diag(overlaps), np.diag(minutes_both_open) / open_minutes.shape[1] * 100, rtol=1e-6)
+    if bucket == "1min":
+        np.testing.assert_allclose(overlaps, minutes_both_open / open_minutes.shape[1] * 100, rtol=1e-5, atol=1e-9)
+
+
+def test_correlations_match_pandas():
+    random_generator = np.random.default_rng(0)
+    # The last pair has the same net profit every month, so its correlations are NaN
+    monthly_net_profits = np.vstack([random_generator.normal(size=(4, 12)), np.full((1, 12), 3.0)])
+
+    correlations = calc_correlation_matrix(monthly_net_profits)
+
+    np.testing.assert_allclose(correlations, pd.DataFrame(monthly_net_profits.T).corr().to_numpy(), rtol=1e-9, atol=1e-12)
+    assert np.isnan(correlations[-1]).all() and np.isnan(correlations[:, -1]).all()
+
+
+@pytest.mark.parametrize("top_k", [0, 2, 10])
+def test_neighbours_are_the_most_correlated_other_pairs(top_k):
+    correlations = np.array([[1.0, 0.2, np.nan, 0.9, 0.2],
+                             [0.2, 1.0, np.nan, -0.5, 0.7],
+                             [np.nan, np.nan, np.nan, np.nan, np.nan],
+                             [0.9, -0.5, np.nan, 1.0, 0.0],
+                             [0.2, 0.7, np.nan, 0.0, 1.0]])
+
+    # Highest first, ties in pair order and NaN last, a top_k above the number of other pairs keeping all of them
+    expected_neighbours = np.array([[3, 1, 4, 2], [4, 0, 3, 2], [0, 1, 3, 4], [0, 4, 1, 2], [1, 0, 3, 2]])
+    np.testing.assert_array_equal(select_neighbours(correlations, top_k), expected_neighbours[:, :top_k or None])
+
+
+def test_a_single_pair_has_no_neighbours(positions_df):
+    closed_positions = PositionsStore.from_positions_df(positions_df).closed().with_months()
+
+    assert select_neighbours(np.ones((1, 1)), top_k=5).shape == (1, 0)
+    assert len(create_pair_correlation_report(closed_positions, ["AAAUSDT"], np.ones((1, len(closed_positions.month_list))), top_k=5)) == 0
+
+
+def test_an_empty_selection_has_no_open_time(positions_df):
+    closed_positions = PositionsStore.from_positions_df(positions_df).closed().with_months()
+
+    open_time_matrix, span = create_pair_open_time_matrix(closed_positions, ["ZZZUSDT", "YYYUSDT"])
+    assert open_time_matrix.shape == (2, 0) and span == 0
+    np.testing.assert_array_equal(calc_overlap_matrix(open_time_matrix, "1h", span), np.zeros((2, 2)))
+
+    correlation_df = create_pair_correlation_report(closed_positions, [], np.zeros((0, len(closed_positions.month_list))))
+    assert len(correlation_df) == 0 and "Neighbour" in correlation_df.columns
+
+
+def test_report_rows_list_every_neighbour(positions_df):
+    closed_positions = PositionsStore.from_positions_df(positions_df).closed().with_months()
+    ranked_pair_list = ["BBBUSDT", "AAAUSDT", "DDDUSDT", "CCCUSDT"]
+    monthly_net_profits = np.array([[1.0, 2.0, 0.0, -1.0], [2.0, 4.0, 0.0, -2.0], [1.0, 1.0, 1.0, 1.0], [-1.0, -2.0, 0.0, 1.0]])
+
+    correlation_df = create_pair_correlation_report(closed_positions, ranked_pair_list, monthly_net_profits, top_k=10)
+
+    assert len(correlation_df) == 4 * 3
+    assert correlation_df.groupby("Pair name", sort=False)["Neighbour"].apply(list).to_dict() == {
+        "BBBUSDT": ["AAAUSDT", "CCCUSDT", "DDDUSDT"], "AAAUSDT": ["BBBUSDT", "CCCUSDT", "DDDUSDT"], "DDDUSDT": ["BBBUSDT", "AAAUSDT", "CCCUSDT"],
+        "CCCUSDT": ["BBBUSDT", "AAAUSDT", "DDDUSDT"]}
+    assert correlation_df.loc[correlation_df["Pair name"] == "DDDUSDT", "Monthly net profit correlation"].isna().all()
@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from reports.portfolio_search import create_bucket_net_profit_matrix, create_diversified_pair_list, search_diversified_pairs
+from reports.positions_store import PositionsStore
+
+
+def create_daily_positions(daily_net_profits: dict) -> pd.DataFrame:
+    # One position per pair and day, exiting at noon of the day
+    return pd.DataFrame([{"Pair name": pair_name, "Status": "CLOSED", "Entry time": pd.Timestamp("2022-01-01 08:00") + pd.Timedelta(days=day),
+                          "Exit time": pd.Timestamp("2022-01-01 12:00") + pd.Timedelta(days=day), "Net profit": net_profit, "Capital used": 50.0}
+                         for pair_name, net_profits in daily_net_profits.items() for day, net_profit in enumerate(net_profits)])
+
+
+def calc_reference_objective(bucket_net_profits: pd.Series, drawdown_weight: float) -> float:
+    equity_curve = bucket_net_profits.cumsum()
+    return equity_curve.iloc[-1] - drawdown_weight * (equity_curve.cummax() - equity_curve).max()
+
+
+# BBBUSDT, ranked second, loses on the same day as AAAUSDT, while the lower ranked CCCUSDT makes its profit on that day
+hedged_positions = {"AAAUSDT": [10.0, -5.0, 10.0], "BBBUSDT": [9.0, -5.0, 10.0], "CCCUSDT": [0.0, 5.0, 0.0]}
+
+
+def test_hedge_is_chosen_over_a_pair_with_the_same_drawdown():
+    closed_positions = PositionsStore.from_positions_df(create_daily_positions(hedged_positions))
+
+    assert create_diversified_pair_list(closed_positions, ["AAAUSDT", "BBBUSDT", "CCCUSDT"], 3) == ["AAAUSDT", "CCCUSDT", "BBBUSDT"]
+
+
+def test_no_drawdown_weight_picks_by_net_profit(synthetic_positions_df):
+    closed_positions = PositionsStore.from_positions_df(create_daily_positions(hedged_positions))
+    assert create_diversified_pair_list(closed_positions, ["AAAUSDT", "BBBUSDT", "CCCUSDT"], 3, drawdown_weight=0) == ["AAAUSDT", "BBBUSDT",
+                                                                                                                        "CCCUSDT"]
+
+    closed_df = synthetic_positions_df[~synthetic_positions_df["Status"].isin(["ACTIVE", "ENTERED"])]
+    ranked_pair_list = sorted(closed_df["Pair name"].unique())
+    net_profits = closed_df.groupby("Pair name")["Net profit"].sum()[ranked_pair_list]
+
+    closed_positions = PositionsStore.from_positions_df(closed_df)
+    assert create_diversified_pair_list(closed_positions, ranked_pair_list, 5, bucket="4h", drawdown_weight=0) == \
+        net_profits.sort_values(ascending=False, kind="stable").index[:5].tolist()
+
+
+@pytest.mark.parametrize("drawdown_weight", [0.5, 1.0, 3.0])
+def test_every_step_adds_the_best_candidate(synthetic_positions_df, drawdown_weight):
+    closed_df = synthetic_positions_df[~synthetic_positions_df["Status"].isin(["ACTIVE", "ENTERED"])]
+    ranked_pair_list = sorted(closed_df["Pair name"].unique())
+    closed_positions = PositionsStore.from_positions_df(closed_df)
+
+    bucket_net_profits = create_bucket_net_profit_matrix(closed_positions, ranked_pair_list, bucket="1D")
+    exit_days = (closed_df["Exit time"] - closed_df["Exit time"].min()) // pd.Timedelta("1D")
+    np.testing.assert_allclose(bucket_net_profits, closed_df.groupby([closed_df["Pair name"], exit_days])["Net profit"].sum().unstack(fill_value=0)
+                               .reindex(index=ranked_pair_list, columns=range(bucket_net_profits.shape[1]), fill_value=0).to_numpy(), atol=1e-9)
+
+    # Every candidate's merged curve rebuilt from the bucket net profits of the chosen pairs, the first of the best ones being chosen
+    chosen_rows = []
+    for _ in range(6):
+        candidate_objectives = pd.Series({candidate_row: calc_reference_objective(pd.Series(bucket_net_profits[chosen_rows + [candidate_row]].sum(axis=0)),
+                                                                                  drawdown_weight)
+                                          for candidate_row in range(len(ranked_pair_list)) if candidate_row not in chosen_rows})
+        chosen_rows.append(candidate_objectives.idxmax())
+
+    assert search_diversified_pairs(bucket_net_profits, 6, drawdown_weight=drawdown_weight, candidate_chunk_size=4) == chosen_rows
+    assert create_diversified_pair_list(closed_positions, ranked_pair_list, 6, drawdown_weight=drawdown_weight) == \
+        [ranked_pair_list[chosen_row] for chosen_row in chosen_rows]
+
+
+def test_search_stops_at_the_number_of_pairs():
+    assert search_diversified_pairs(np.ones((2, 3)), 5) == [0, 1]
+    assert search_diversified_pairs(np.zeros((0, 0)), 3) == []
@@ -0,0 +1,53 @@
+import pandas as pd
+
+from reports.positions_io import cast_position_columns, iter_positions_chunks, load_positions, read_positions_file
+
+
+def test_tz_aware_csv_keeps_wall_times(tmp_path, positions_df):
+    # The wall times of a timezone aware export, as the reports read them before the loader cast the columns
+    aware_df = positions_df.copy()
+    for column in ("Entry time", "Exit time"):
+        aware_df[column] = aware_df[column].dt.tz_localize("Europe/Berlin")
+    aware_df.to_csv(tmp_path / "positions.csv", index=False)
+
+    loaded_df = read_positions_file(str(tmp_path / "positions.csv"))
+
+    for column in ("Entry time", "Exit time"):
+        assert loaded_df[column].dtype == "datetime64[ns]"
+        pd.testing.assert_series_equal(loaded_df[column], positions_df[column])
+
+
+def test_tz_aware_utc_offsets_in_chunks(tmp_path, positions_df):
+    csv_df = positions_df.copy()
+    for column in ("Entry time", "Exit time"):
+        csv_df[column] = csv_df[column].dt.strftime("%Y-%m-%d %H:%M:%S+00:00")
+    csv_df.to_csv(tmp_path / "positions.csv", index=False)
+
+    chunks = list(iter_positions_chunks(str(tmp_path / "positions.csv"), chunk_size=5))
+
+    pd.testing.assert_frame_equal(pd.concat(chunks, ignore_index=True), positions_df)
+
+
+def test_tz_aware_parquet(tmp_path, positions_df):
+    aware_df = positions_df.copy()
+    aware_df["Entry time"] = aware_df["Entry time"].dt.tz_localize("UTC")
+    aware_df.to_parquet(tmp_path / "positions.parquet", index=False)
+
+    pd.testing.assert_frame_equal(load_positions(str(tmp_path / "positions.parquet")), positions_df)
+
+
+def test_cached_copy_matches_parsed_file(tmp_path, positions_df):
+    positions_df.to_csv(tmp_path / "positions.csv", index=False)
+    file_path, cache_dir = str(tmp_path / "positions.csv"), str(tmp_path / "cache")
+
+    parsed_df = load_positions(file_path, cache_dir=cache_dir)
+    cached_df = load_positions(file_path, cache_dir=cache_dir)
+
+    pd.testing.assert_frame_equal(parsed_df, positions_df)
+    pd.testing.assert_frame_equal(cached_df, positions_df)
+
+
+def test_float_columns_are_cast(positions_df):
+    positions_df["Net profit"] = positions_df["Net profit"].astype(str)
+
+    assert cast_position_columns(positions_df)["Net profit"].dtype == float
@@ -0,0 +1,77 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from reports.base_report_utils import calc_total_months
+from reports.positions_store import PositionsStore
+from tests.reference_metrics import get_closed_positions
+
+
+def decode_positions(positions: PositionsStore) -> pd.DataFrame:
+    # The positions of a store as the columns they were encoded from
+    return pd.DataFrame({
+        "Pair name": positions.pair_names[positions.pair_codes],
+        "Type": positions.type_names[positions.type_codes],
+        "Status": positions.status_names[positions.status_codes],
+        "Entry time": positions.entry_datetimes,
+        "Exit time": positions.exit_datetimes,
+        "Net profit": positions.net_profits,
+        "Capital used": positions.capital_used
+    })
+
+
+def assert_positions_equal(positions: PositionsStore, positions_df: pd.DataFrame):
+    pd.testing.assert_frame_equal(decode_positions(positions), positions_df[["Pair name", "Type", "Status", "Entry time", "Exit time", "Net profit",
+                                                                             "Capital used"]].reset_index(drop=True), check_dtype=False)
+
+
+@pytest.mark.parametrize("frame_name", ["positions_df", "synthetic_positions_df"])
+def test_store_round_trips_the_positions(request, frame_name):
+    positions_df = request.getfixturevalue(frame_name)
+    positions = PositionsStore.from_positions_df(positions_df)
+
+    assert_positions_equal(positions, positions_df)
+    assert list(positions.pair_names) == list(positions_df["Pair name"].unique())
+    assert list(positions.month_list) == list(calc_total_months(positions_df))
+
+
+@pytest.mark.parametrize("position_type", [None, "long", "SHORT"])
+def test_selections_match_pandas(positions_df, position_type):
+    positions = PositionsStore.from_positions_df(positions_df).filter_type(position_type).closed().sort_by_entry_time()
+
+    expected_df = positions_df[positions_df["Type"] == position_type.lower()] if position_type else positions_df
+    assert_positions_equal(positions, get_closed_positions(expected_df))
+
+
+def test_sources_are_filtered_by_name(positions_df, synthetic_positions_df):
+    source_df = pd.concat([positions_df.assign(Source="a.csv"), synthetic_positions_df.assign(Source="b.csv")], ignore_index=True)
+    positions = PositionsStore.from_positions_df(source_df)
+
+    assert_positions_equal(positions.filter_source("a.csv"), positions_df)
+    assert_positions_equal(positions.filter_source("b.csv"), synthetic_positions_df)
+    assert len(positions.filter_source(None)) == len(source_df)
+
+
+def test_exit_months_and_pair_ranks_match_pandas(positions_df):
+    # A month list that leaves out the first and last months of the positions
+    month_list = pd.date_range("2022-02-01", "2022-03-01", freq="MS")
+    positions = PositionsStore.from_positions_df(positions_df, month_list=month_list)
+
+    exit_months = positions_df["Exit time"].dt.to_period("M").dt.to_timestamp()
+    expected_indices = np.select([exit_months.isna(), exit_months < month_list[0], exit_months > month_list[-1]],
+                                 [-1, -1, len(month_list)], default=pd.Index(month_list).get_indexer(exit_months))
+    np.testing.assert_array_equal(positions.exit_month_indices, expected_indices)
+    np.testing.assert_array_equal(positions.with_months().exit_month_indices,
+                                  pd.Index(calc_total_months(positions_df)).get_indexer(exit_months))
+
+    pair_list = ["CCCUSDT", "ZZZUSDT", "AAAUSDT"]
+    np.testing.assert_array_equal(positions.get_pair_ranks(pair_list),
+                                  positions_df["Pair name"].map({pair: rank for rank, pair in enumerate(pair_list)}).fillna(-1).to_numpy())
+
+
+def test_float32_store_keeps_the_values(synthetic_positions_df):
+    positions = PositionsStore.from_positions_df(synthetic_positions_df, float_dtype=np.float32)
+
+    assert positions.net_profits.dtype == np.float32
+    assert positions.nbytes < PositionsStore.from_positions_df(synthetic_positions_df).nbytes
+    np.testing.assert_allclose(positions.net_profits, synthetic_positions_df["Net profit"].to_numpy(), rtol=1e-6)
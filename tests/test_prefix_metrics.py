@@ -0,0 +1,32 @@
+import pandas as pd
+import pytest
+
+from reports.positions_store import PositionsStore
+from reports.prefix_metrics import create_prefix_metrics
+from tests.reference_metrics import assert_metrics_equal, calc_reference_metrics, get_closed_positions, get_month_list
+
+
+@pytest.mark.parametrize("timeframe", [None, "15min", "1D"])
+@pytest.mark.parametrize("frame_name", ["positions_df", "synthetic_positions_df"])
+def test_prefix_rows_match_filtered_positions(request, frame_name, timeframe):
+    positions_df = request.getfixturevalue(frame_name)
+    closed_df = get_closed_positions(positions_df)
+    month_list = get_month_list(positions_df)
+    sorted_pair_list = sorted(positions_df["Pair name"].unique(), reverse=True)
+
+    closed_positions = PositionsStore.from_positions_df(positions_df).closed().sort_by_entry_time().with_months()
+    prefix_metrics_df = create_prefix_metrics(closed_positions, sorted_pair_list, timeframe=timeframe)
+
+    assert prefix_metrics_df["Pair count"].tolist() == list(range(1, len(sorted_pair_list) + 1))
+    for pair_count, row in zip(prefix_metrics_df["Pair count"], prefix_metrics_df.to_dict("records")):
+        merged_df = closed_df[closed_df["Pair name"].isin(sorted_pair_list[:pair_count])]
+        assert_metrics_equal(row, calc_reference_metrics(merged_df, month_list, timeframe=timeframe))
+        assert row["Capital used per trade"] == merged_df["Capital used"].iloc[0]
+
+
+def test_prefix_rows_are_the_same_in_workers(synthetic_positions_df):
+    closed_positions = PositionsStore.from_positions_df(synthetic_positions_df).closed().sort_by_entry_time().with_months()
+    sorted_pair_list = list(synthetic_positions_df["Pair name"].unique())
+
+    pd.testing.assert_frame_equal(create_prefix_metrics(closed_positions, sorted_pair_list, workers=2),
+                                  create_prefix_metrics(closed_positions, sorted_pair_list))
@@ -0,0 +1,84 @@
+import json
+import threading
+import urllib.error
+import urllib.request
+
+import pandas as pd
+import pytest
+
+from reports.gp_report import Report
+from reports.report_config import ReportConfig
+from reports.report_service import ReportService, create_report_server, parse_query_settings
+
+
+@pytest.fixture
+def service(tmp_path, positions_df) -> ReportService:
+    positions_df.to_csv(tmp_path / "positions.csv", index=False)
+
+    return ReportService(str(tmp_path / "positions.csv"), base_config=ReportConfig(positions_cache_dir=None, output_dir=str(tmp_path / "reports")))
+
+
+@pytest.fixture
+def server_url(service):
+    server = create_report_server(service, host="127.0.0.1", port=0)
+    server_thread = threading.Thread(target=server.serve_forever, daemon=True)
+    server_thread.start()
+
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+
+    server.shutdown()
+    server.server_close()
+
+
+def get(url: str) -> (int, bytes):
+    try:
+        with urllib.request.urlopen(url) as response:
+            return response.status, response.read()
+    except urllib.error.HTTPError as error:
+        return error.code, error.read()
+
+
+def test_query_matches_report(service, tmp_path):
+    settings = parse_query_settings({"position_type": ["short"], "max_final_report_pairs": ["2"]})
+    config = service.base_config.updated(settings)
+    report = Report(service.all_positions_file, config=config, positions_df=service.positions_df, create_reports=False)
+
+    pd.testing.assert_frame_equal(service.get_report("FinalReport", settings), report.final_report_df)
+    assert service.get_report("FinalReport", settings) is service.get_report("FinalReport", settings)
+
+
+@pytest.mark.parametrize("settings", [{"max_final_report_pairs": 0}, {"capital_per_trade": -1.0}, {"walk_forward_test_months": 0},
+                                      {"monte_carlo_method": "jackknife"}])
+def test_invalid_settings_are_rejected(service, settings):
+    with pytest.raises(ValueError, match="Invalid"):
+        service.get_report("FinalReport", settings)
+
+
+def test_settings_without_pairs_are_rejected(service):
+    with pytest.raises(ValueError, match="No pairs"):
+        service.get_report("FinalReport", {"position_type": "neither"})
+
+
+def test_invalid_query_is_answered_with_400(server_url):
+    status, body = get(f"{server_url}/FinalReport?max_final_report_pairs=0")
+
+    assert status == 400
+    assert b"max_final_report_pairs" in body
+
+
+def test_failing_report_is_answered_with_500(server_url, service, monkeypatch):
+    def fail(report_name, settings=None):
+        raise KeyError("Pair count")
+
+    monkeypatch.setattr(service, "get_report", fail)
+    status, body = get(f"{server_url}/FinalReport")
+
+    assert status == 500
+    assert b"KeyError" in body
+
+
+def test_report_is_served_as_json(server_url, service):
+    status, body = get(f"{server_url}/BaseReport?position_type=long")
+
+    assert status == 200
+    assert [row["Pair name"] for row in json.loads(body)] == service.get_report("BaseReport", {"position_type": "long"})["Pair name"].tolist()
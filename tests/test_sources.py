@@ -0,0 +1,83 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from reports.gp_report import Report
+from reports.report_config import ReportConfig
+from reports.sources import create_source_reports, create_source_summary, expand_positions_files, get_source_names, load_source_positions
+
+
+@pytest.fixture
+def exports_dir(tmp_path, positions_df, synthetic_positions_df) -> str:
+    # A folder of exports with the same file name in two subfolders, next to a file that isn't a positions file
+    for folder in ["2022", "2023"]:
+        os.makedirs(tmp_path / "exports" / folder)
+    positions_df.to_csv(tmp_path / "exports" / "2022" / "long.csv", index=False)
+    synthetic_positions_df.to_csv(tmp_path / "exports" / "2023" / "long.csv", index=False)
+    synthetic_positions_df.to_parquet(tmp_path / "exports" / "short.parquet")
+    (tmp_path / "exports" / "notes.txt").write_text("not positions")
+
+    return str(tmp_path / "exports")
+
+
+def test_folders_and_patterns_expand_to_their_positions_files(exports_dir):
+    assert expand_positions_files(exports_dir) == [os.path.join(exports_dir, "short.parquet")]
+    assert expand_positions_files(os.path.join(exports_dir, "*", "*.csv")) == [os.path.join(exports_dir, "2022", "long.csv"),
+                                                                              os.path.join(exports_dir, "2023", "long.csv")]
+    assert expand_positions_files(os.path.join(exports_dir, "short.parquet")) == [os.path.join(exports_dir, "short.parquet")]
+
+    with pytest.raises(FileNotFoundError):
+        expand_positions_files(os.path.join(exports_dir, "*.xlsx"))
+    with pytest.raises(FileNotFoundError):
+        expand_positions_files(os.path.join(exports_dir, "2022", "*.parquet"))
+
+
+def test_source_names_are_unique():
+    assert get_source_names(["exports/long.csv", "exports/short.parquet"]) == ["long", "short"]
+    assert get_source_names(["exports/2022/long.csv", "exports/2023/long.csv", "exports/short.csv"]) == [os.path.join("2022", "long"),
+                                                                                                         os.path.join("2023", "long"), "short"]
+    assert get_source_names(["exports/long.csv", "exports/long.parquet"]) == ["long.csv", "long.parquet"]
+
+
+def test_sources_are_loaded_with_their_names(exports_dir, positions_df, synthetic_positions_df):
+    file_paths = expand_positions_files(os.path.join(exports_dir, "*", "*.csv"))
+
+    source_positions_df = load_source_positions(file_paths, cache_dir=None, workers=1)
+
+    assert source_positions_df["Source"].value_counts().to_dict() == {os.path.join("2022", "long"): len(positions_df),
+                                                                      os.path.join("2023", "long"): len(synthetic_positions_df)}
+    assert source_positions_df["Source"].iloc[0] == os.path.join("2022", "long")
+
+
+def test_source_summary_skips_the_sources_a_pair_is_missing_from():
+    source_base_reports = {
+        "long": pd.DataFrame({"Pair name": ["AAAUSDT", "BBBUSDT", "CCCUSDT"], "Score": [0.9, 0.5, 0.1]}),
+        "short": pd.DataFrame({"Pair name": ["BBBUSDT", "AAAUSDT"], "Score": [0.8, 0.2]})
+    }
+
+    source_summary_df = create_source_summary(source_base_reports)
+
+    expected_df = pd.DataFrame({"Sources": [2, 2, 1], "Mean rank": [1.5, 1.5, 3.0], "Best rank": [1.0, 1.0, 3.0], "Worst rank": [2.0, 2.0, 3.0],
+                                "Rank - long": [1.0, 2.0, 3.0], "Score - long": [0.9, 0.5, 0.1], "Rank - short": [2.0, 1.0, np.nan],
+                                "Score - short": [0.2, 0.8, np.nan]},
+                               index=pd.Index(["AAAUSDT", "BBBUSDT", "CCCUSDT"], name="Pair name"))
+    pd.testing.assert_frame_equal(source_summary_df, expected_df, check_dtype=False)
+
+
+def test_source_reports_match_a_run_on_every_file(tmp_path, exports_dir):
+    file_paths = expand_positions_files(os.path.join(exports_dir, "*", "*.csv"))
+    config = ReportConfig(output_dir=str(tmp_path / "reports"), positions_cache_dir=None, formats=("csv",), reports=("BaseReport",))
+
+    source_reports = create_source_reports(file_paths, config, workers=1)
+
+    assert list(source_reports) == [os.path.join("2022", "long"), os.path.join("2023", "long")]
+    for source_report, file_path in zip(source_reports.values(), file_paths):
+        file_report = Report(file_path, config=config, positions_df=pd.read_csv(file_path, parse_dates=["Entry time", "Exit time"]),
+                             create_reports=False)
+        pd.testing.assert_frame_equal(source_report.base_report_df.reset_index(drop=True), file_report.base_report_df.reset_index(drop=True))
+
+    source_summary_df = pd.read_csv(tmp_path / "reports" / "SourceSummary.csv", index_col="Pair name")
+    assert (source_summary_df["Sources"] == source_summary_df.filter(like="Rank - ").notna().sum(axis=1)).all()
+    assert source_summary_df.loc["DDDUSDT", "Sources"] == 1
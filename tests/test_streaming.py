@@ -0,0 +1,91 @@
+import pandas as pd
+import pytest
+
+from reports.pair_metrics import create_pair_metrics
+from reports.positions_store import PositionsStore
+from reports.streaming import StreamingPairMetrics, create_streaming_pair_metrics
+from tests.reference_metrics import assert_metrics_equal, calc_reference_metrics, get_closed_positions, get_month_list
+
+
+@pytest.fixture(params=["positions_df", "synthetic_positions_df"])
+def positions_file(request, tmp_path) -> (str, pd.DataFrame):
+    positions_df = request.getfixturevalue(request.param).sort_values("Entry time", kind="stable").reset_index(drop=True)
+    positions_df.to_csv(tmp_path / "positions.csv", index=False)
+
+    return str(tmp_path / "positions.csv"), positions_df
+
+
+@pytest.mark.parametrize("chunk_size", [3, 40, 1000])
+def test_streamed_metrics_match_reference(positions_file, chunk_size):
+    file_path, positions_df = positions_file
+    closed_df = get_closed_positions(positions_df)
+    month_list = get_month_list(positions_df)
+
+    streamed_metrics_df = create_streaming_pair_metrics(file_path, chunk_size=chunk_size)
+
+    assert streamed_metrics_df["Pair name"].tolist() == closed_df["Pair name"].unique().tolist()
+    for row in streamed_metrics_df.to_dict("records"):
+        assert_metrics_equal(row, calc_reference_metrics(closed_df[closed_df["Pair name"] == row["Pair name"]], month_list))
+
+
+@pytest.mark.parametrize("position_type", [None, "short"])
+def test_streamed_metrics_match_in_memory_metrics(positions_file, position_type):
+    file_path, positions_df = positions_file
+    closed_positions = PositionsStore.from_positions_df(positions_df).filter_type(position_type).closed().sort_by_entry_time().with_months()
+
+    streamed_metrics_df = create_streaming_pair_metrics(file_path, position_type=position_type, chunk_size=25)
+    pair_metrics_df = create_pair_metrics(closed_positions, streamed_metrics_df["Pair name"].tolist())
+
+    pd.testing.assert_frame_equal(streamed_metrics_df, pair_metrics_df[streamed_metrics_df.columns], check_dtype=False, rtol=1e-9)
+
+
+def test_unsorted_chunks_are_rejected(positions_df):
+    streaming_pair_metrics = StreamingPairMetrics()
+    sorted_df = positions_df.sort_values("Entry time", kind="stable")
+    streaming_pair_metrics.add_chunk(sorted_df.iloc[10:])
+
+    with pytest.raises(ValueError, match="sorted by Entry time"):
+        streaming_pair_metrics.add_chunk(sorted_df.iloc[:10])
+
+
+def test_unordered_pairs_are_the_ones_entering_or_exiting_too_early(positions_df):
+    streaming_pair_metrics = StreamingPairMetrics()
+    sorted_df = positions_df.sort_values("Entry time", kind="stable")
+    streaming_pair_metrics.add_chunk(sorted_df[sorted_df["Entry time"] < "2023-02-01"])
+
+    late_df = sorted_df[sorted_df["Entry time"] >= "2023-02-01"]
+    assert len(streaming_pair_metrics.get_unordered_pairs(late_df)) == 0
+    early_df = sorted_df[sorted_df["Pair name"] == "AAAUSDT"].iloc[:1]
+    assert streaming_pair_metrics.get_unordered_pairs(early_df).tolist() == ["AAAUSDT"]
+
+
+@pytest.mark.parametrize("pair_name", ["AAAUSDT", "DDDUSDT"])
+def test_replaced_pairs_match_metrics_streamed_in_order(synthetic_positions_df, pair_name):
+    sorted_df = synthetic_positions_df.sort_values("Entry time", kind="stable")
+    is_pair = sorted_df["Pair name"] == pair_name
+
+    # The pair is missing its last positions until its accumulators are replaced by ones streamed from all of them
+    streaming_pair_metrics = StreamingPairMetrics()
+    streaming_pair_metrics.add_chunk(sorted_df.drop(sorted_df[is_pair].index[-10:]))
+    pair_metrics = StreamingPairMetrics()
+    pair_metrics.add_chunk(sorted_df[is_pair])
+    streaming_pair_metrics.replace_pairs(pair_metrics)
+
+    expected_metrics = StreamingPairMetrics()
+    expected_metrics.add_chunk(sorted_df)
+
+    pd.testing.assert_frame_equal(streaming_pair_metrics.create_pair_metrics(), expected_metrics.create_pair_metrics(), rtol=1e-9)
+
+
+def test_position_types_are_matched_in_any_case(tmp_path, synthetic_positions_df):
+    # Exports with capitalized types keep the same positions as the in-memory reports, which match the types in any case
+    positions_df = synthetic_positions_df.sort_values("Entry time", kind="stable").reset_index(drop=True)
+    positions_df["Type"] = positions_df["Type"].str.capitalize()
+    positions_df.to_csv(tmp_path / "positions.csv", index=False)
+    closed_positions = PositionsStore.from_positions_df(positions_df).filter_type("short").closed().sort_by_entry_time().with_months()
+
+    streamed_metrics_df = create_streaming_pair_metrics(str(tmp_path / "positions.csv"), position_type="SHORT", chunk_size=100)
+    pair_metrics_df = create_pair_metrics(closed_positions, streamed_metrics_df["Pair name"].tolist())
+
+    assert len(streamed_metrics_df) > 0
+    pd.testing.assert_frame_equal(streamed_metrics_df, pair_metrics_df[streamed_metrics_df.columns], check_dtype=False, rtol=1e-9)
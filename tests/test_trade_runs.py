@@ -0,0 +1,88 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from reports.trade_runs import TradeSequenceTree, calc_segment_trade_stats
+from tests.reference_metrics import calc_reference_streaks
+
+
+def calc_reference_trade_stats(net_profits: pd.Series) -> dict:
+    # The streak, average loss and trade order drawdown columns of one group of trades, 0 and NaN for a group without trades
+    if len(net_profits) == 0:
+        return {"Average consecutive wins": 0, "Max consecutive wins": 0, "Consecutive wins P90": 0, "Average consecutive losses": 0,
+                "Max consecutive losses": 0, "Consecutive losses P90": 0, "Average loss per position - total": np.nan, "Max drawdown - trade order": 0}
+
+    average_wins, max_wins, wins_p90 = calc_reference_streaks(net_profits, 1)
+    average_losses, max_losses, losses_p90 = calc_reference_streaks(net_profits, -1)
+    equity = net_profits.cumsum()
+
+    return {
+        "Average consecutive wins": average_wins,
+        "Max consecutive wins": max_wins,
+        "Consecutive wins P90": wins_p90,
+        "Average consecutive losses": average_losses,
+        "Max consecutive losses": max_losses,
+        "Consecutive losses P90": losses_p90,
+        "Average loss per position - total": net_profits[net_profits < 0].mean() if (net_profits < 0).any() else np.nan,
+        "Max drawdown - trade order": (equity.cummax() - equity).max()
+    }
+
+
+def assert_trade_stats_equal(trade_stats: dict, net_profits: pd.Series, segment_codes: np.ndarray, segment_count: int):
+    for segment_code in range(segment_count):
+        for column, reference_value in calc_reference_trade_stats(net_profits[segment_codes == segment_code]).items():
+            np.testing.assert_allclose(trade_stats[column][segment_code], reference_value, rtol=1e-9, atol=1e-9, err_msg=f"{column} of {segment_code}")
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_segment_stats_match_each_segment(seed):
+    # Whole-number profits, so that flat trades break the streaks, with segments 3 and 7 left empty
+    random_generator = np.random.default_rng(seed)
+    segment_codes = np.sort(random_generator.choice([0, 1, 2, 4, 5, 6, 8], size=300))
+    net_profits = pd.Series(random_generator.integers(-3, 4, size=300).astype(float))
+
+    assert_trade_stats_equal(calc_segment_trade_stats(net_profits.to_numpy(), segment_codes, 10), net_profits, segment_codes, 10)
+
+
+def test_single_segment_matches_the_sequence(positions_df):
+    net_profits = positions_df["Net profit"]
+    segment_codes = np.zeros(len(net_profits), dtype=int)
+
+    assert_trade_stats_equal(calc_segment_trade_stats(net_profits.to_numpy(), segment_codes, 1), net_profits, segment_codes, 1)
+
+
+def test_segments_without_trades_get_zeros():
+    trade_stats = calc_segment_trade_stats(np.zeros(0), np.zeros(0, dtype=int), 2)
+
+    assert_trade_stats_equal(trade_stats, pd.Series(dtype=float), np.zeros(0, dtype=int), 2)
+    assert all(len(column_values) == 2 for column_values in trade_stats.values())
+
+
+@pytest.mark.parametrize("seed", range(4))
+@pytest.mark.parametrize("profit_kind", ["whole", "wins only", "continuous"])
+def test_tree_matches_the_added_trades(seed, profit_kind):
+    # Groups of trades added in a random order land in between the earlier ones, joining, splitting and ending their runs
+    random_generator = np.random.default_rng(seed)
+    trade_count = int(random_generator.integers(1, 200))
+    net_profits = {"whole": random_generator.integers(-2, 3, size=trade_count).astype(float),
+                   "wins only": random_generator.integers(1, 3, size=trade_count).astype(float),
+                   "continuous": random_generator.normal(size=trade_count)}[profit_kind]
+    group_codes = random_generator.integers(0, 8, size=trade_count)
+
+    trade_sequence = TradeSequenceTree(net_profits)
+    is_added = np.zeros(trade_count, dtype=bool)
+    for group_code in random_generator.permutation(np.unique(group_codes)):
+        trade_sequence.add(np.flatnonzero(group_codes == group_code))
+        is_added |= group_codes == group_code
+
+        added_net_profits = pd.Series(net_profits[is_added])
+        reference_stats = calc_reference_trade_stats(added_net_profits)
+        for column, value in trade_sequence.calc_stats().items():
+            np.testing.assert_allclose(value, reference_stats[column], rtol=1e-9, atol=1e-9, err_msg=column)
+        assert (trade_sequence.run_length_counts.sum(axis=1) == trade_sequence.run_counts).all()
+
+
+def test_tree_without_trades_gets_zeros():
+    trade_stats = TradeSequenceTree(np.array([1.0, -1.0])).calc_stats()
+
+    assert all(value == 0 for value in trade_stats.values())
@@ -0,0 +1,88 @@
+import pandas as pd
+import pytest
+
+from reports.base_report_utils import rank_base_report
+from reports.positions_store import PositionsStore
+from reports.walk_forward import PairMonthSummaries, create_walk_forward_report
+from tests.reference_metrics import assert_metrics_equal, calc_reference_metrics, get_closed_positions, get_month_list
+
+# The columns of the train window metrics the pairs are ranked by
+window_columns = ["Number of positions - total", "Performance - total", "Winrate - total", "Net profit - total", "Gross profit - total",
+                  "Gross loss - total", "Largest profit in a trade - total", "Average profit per trade - total", "Total months", "Missing months",
+                  "Max drawdown - total", "Average consecutive wins", "Max consecutive wins", "Average consecutive losses", "Max consecutive losses"]
+
+
+def get_window_positions(closed_df: pd.DataFrame, month_list: pd.DatetimeIndex, first_month: int, last_month: int) -> pd.DataFrame:
+    # The positions exiting in the months first_month..last_month - 1, in entry order within each exit month
+    exit_months = closed_df["Exit time"].dt.to_period("M").dt.to_timestamp()
+    window_df = closed_df[(exit_months >= month_list[first_month]) & (exit_months <= month_list[last_month - 1])]
+    return window_df.assign(exit_month=exit_months).sort_values("exit_month", kind="stable").drop(columns="exit_month")
+
+
+def calc_reference_window_metrics(closed_df: pd.DataFrame, month_list: pd.DatetimeIndex, pair_list: list, first_month: int,
+                                  last_month: int) -> pd.DataFrame:
+    window_df = get_window_positions(closed_df, month_list, first_month, last_month)
+    return pd.DataFrame([{"Pair name": pair, **{column: value for column, value in calc_reference_metrics(
+        window_df[window_df["Pair name"] == pair], month_list[first_month:last_month]).items() if column in window_columns}}
+                         for pair in pair_list if (window_df["Pair name"] == pair).any()], columns=["Pair name", *window_columns])
+
+
+@pytest.mark.parametrize("frame_name", ["positions_df", "synthetic_positions_df"])
+def test_window_metrics_match_the_window_positions(request, frame_name):
+    positions_df = request.getfixturevalue(frame_name)
+    closed_df = get_closed_positions(positions_df)
+    month_list = get_month_list(positions_df)
+    pair_list = sorted(positions_df["Pair name"].unique())
+
+    closed_positions = PositionsStore.from_positions_df(positions_df).closed().sort_by_entry_time().with_months()
+    pair_month_summaries = PairMonthSummaries(closed_positions, pair_list)
+
+    for first_month in range(len(month_list)):
+        for last_month in range(first_month + 1, len(month_list) + 1):
+            window_metrics_df = pair_month_summaries.calc_window_pair_metrics(first_month, last_month)
+            reference_metrics_df = calc_reference_window_metrics(closed_df, month_list, pair_list, first_month, last_month)
+
+            assert window_metrics_df["Pair name"].tolist() == reference_metrics_df["Pair name"].tolist()
+            for row, reference_row in zip(window_metrics_df.to_dict("records"), reference_metrics_df.to_dict("records")):
+                assert_metrics_equal(row, {column: reference_row[column] for column in window_columns})
+
+
+@pytest.mark.parametrize("train_months, test_months, step_months", [(1, 1, 1), (2, 2, 1), (3, 1, 2)])
+def test_walk_forward_rows_match_the_window_positions(synthetic_positions_df, train_months, test_months, step_months):
+    closed_df = get_closed_positions(synthetic_positions_df)
+    month_list = get_month_list(synthetic_positions_df)
+    pair_list = sorted(synthetic_positions_df["Pair name"].unique())
+    top_n = 4
+
+    closed_positions = PositionsStore.from_positions_df(synthetic_positions_df).closed().sort_by_entry_time().with_months()
+    walk_forward_df = create_walk_forward_report(closed_positions, pair_list, train_months, test_months=test_months, step_months=step_months,
+                                                 top_n=top_n)
+
+    window_starts = list(range(0, len(month_list) - train_months - test_months + 1, step_months))
+    assert len(walk_forward_df) == len(window_starts)
+
+    for train_start, row in zip(window_starts, walk_forward_df.to_dict("records")):
+        test_start, test_end = train_start + train_months, train_start + train_months + test_months
+        assert (row["Train start"], row["Test start"], row["Test end"]) == (month_list[train_start].strftime("%Y-%m"),
+                                                                           month_list[test_start].strftime("%Y-%m"),
+                                                                           month_list[test_end - 1].strftime("%Y-%m"))
+
+        # The pairs ranked like the BaseReport on their positions in the train window
+        train_metrics_df = rank_base_report(calc_reference_window_metrics(closed_df, month_list, pair_list, train_start, test_start))
+        selected_pairs = train_metrics_df["Pair name"][:top_n].tolist()
+        assert row["Pairs"] == ", ".join(selected_pairs)
+        assert row["Net profit - train"] == pytest.approx(train_metrics_df["Net profit - total"][:top_n].sum())
+
+        # The FinalReport metrics of their combined positions in the test window, in entry time order
+        test_df = closed_df.loc[get_window_positions(closed_df, month_list, test_start, test_end).index.sort_values()]
+        test_df = test_df[test_df["Pair name"].isin(selected_pairs)]
+        assert row["Number of positions - total"] == len(test_df)
+        if len(test_df) > 0:
+            assert_metrics_equal(row, calc_reference_metrics(test_df, month_list[test_start:test_end]))
+
+
+def test_walk_forward_rejects_empty_windows(synthetic_positions_df):
+    closed_positions = PositionsStore.from_positions_df(synthetic_positions_df).closed().sort_by_entry_time().with_months()
+
+    with pytest.raises(ValueError, match="at least one month"):
+        create_walk_forward_report(closed_positions, ["AAAUSDT"], 0)
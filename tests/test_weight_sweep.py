@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from reports.base_report_utils import adjust_score_for_missing_months, calculate_score, rank_base_report, weights
+from reports.gp_report import Report
+from reports.pair_metrics import create_pair_metrics
+from reports.positions_store import PositionsStore
+from reports.report_config import ReportConfig
+from reports.weight_sweep import create_ranking_stability_report, sample_weight_vectors
+
+
+@pytest.fixture
+def pair_metrics_df(synthetic_positions_df) -> pd.DataFrame:
+    closed_positions = PositionsStore.from_positions_df(synthetic_positions_df).closed().sort_by_entry_time().with_months()
+    return create_pair_metrics(closed_positions, list(synthetic_positions_df["Pair name"].unique()))
+
+
+def calc_reference_ranks(pair_metrics_df: pd.DataFrame, sample_weights: dict) -> pd.Series:
+    # The 1-based rank of every pair when the BaseReport is scored with sample_weights
+    scored_df = adjust_score_for_missing_months(calculate_score(pair_metrics_df, sample_weights))
+    ranked_pairs = scored_df.sort_values("Score", ascending=False, kind="stable")["Pair name"]
+    return pd.Series(np.arange(1, len(ranked_pairs) + 1), index=ranked_pairs.to_numpy())
+
+
+def test_ranks_without_spread_are_the_base_report_ranks(pair_metrics_df):
+    ranking_stability_df = create_ranking_stability_report(pair_metrics_df, weights, sample_count=50, top_n=5, spread=0)
+
+    assert ranking_stability_df["Pair name"].tolist() == rank_base_report(pair_metrics_df.copy())["Pair name"].tolist()
+    assert ranking_stability_df["Rank"].tolist() == list(range(1, len(pair_metrics_df) + 1))
+    assert (ranking_stability_df["Mean rank"] == ranking_stability_df["Rank"]).all()
+    assert (ranking_stability_df["Best rank"] == ranking_stability_df["Worst rank"]).all()
+    assert (ranking_stability_df["Rank std"] == 0).all()
+    assert ranking_stability_df["Top 5 frequency (%)"].tolist() == [100.0] * 5 + [0.0] * (len(pair_metrics_df) - 5)
+
+
+@pytest.mark.parametrize("sample_chunk_size", [7, 1000])
+def test_sampled_ranks_match_rescoring_with_every_sample(pair_metrics_df, sample_chunk_size):
+    sample_count, top_n = 40, 4
+    ranking_stability_df = create_ranking_stability_report(pair_metrics_df, weights, sample_count=sample_count, top_n=top_n, seed=5,
+                                                            sample_chunk_size=sample_chunk_size).set_index("Pair name")
+
+    sample_ranks = pd.DataFrame([calc_reference_ranks(pair_metrics_df, dict(zip(weights, weight_vector)))
+                                 for weight_vector in sample_weight_vectors(weights, sample_count, seed=5)])
+
+    pd.testing.assert_series_equal(ranking_stability_df["Rank"], sample_ranks.iloc[0], check_names=False, check_dtype=False)
+    np.testing.assert_allclose(ranking_stability_df[f"Top {top_n} frequency (%)"], (sample_ranks <= top_n).mean()[ranking_stability_df.index] * 100)
+    np.testing.assert_allclose(ranking_stability_df["Mean rank"], sample_ranks.mean()[ranking_stability_df.index].round(4))
+    np.testing.assert_allclose(ranking_stability_df["Rank std"], sample_ranks.std(ddof=0)[ranking_stability_df.index].round(4))
+    np.testing.assert_array_equal(ranking_stability_df["Best rank"], sample_ranks.min()[ranking_stability_df.index])
+    np.testing.assert_array_equal(ranking_stability_df["Worst rank"], sample_ranks.max()[ranking_stability_df.index])
+
+
+def test_ranking_stability_report_is_opt_in(synthetic_positions_df):
+    config = ReportConfig(positions_cache_dir=None, reports=("RankingStabilityReport",))
+
+    assert Report("synthetic", config=config, positions_df=synthetic_positions_df, create_reports=False).ranking_stability_df is None
+    assert len(Report("synthetic", config=config.updated({"weight_sweep_samples": 10}), positions_df=synthetic_positions_df,
+                      create_reports=False).ranking_stability_df) == synthetic_positions_df["Pair name"].nunique()